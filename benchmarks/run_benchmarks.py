@@ -0,0 +1,282 @@
+"""
+Benchmarks of the pipeline's hot paths on synthetic NDIC data.
+
+Each case is timed on data from `synthetic_ndic.py` at every requested well count
+(generated once under data/synthetic/ and reused): reading the production CSV, the
+processing that builds final_df, Arps fits with one `curve_fit` per well against the
+batched solver, forecasting to the economic limit, change-point detection, parsing
+completion pages and downloading a well file from the local stub server. Results are
+appended to a JSON-lines file with the commit they ran on, and `--compare` fails when
+a case got slower than a saved baseline run.
+
+Usage:
+    python benchmarks/run_benchmarks.py --wells 100 1000 10000
+    python benchmarks/run_benchmarks.py --wells 1000 --out baseline.jsonl
+    python benchmarks/run_benchmarks.py --wells 1000 --compare baseline.jsonl --threshold 1.2
+"""
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import curve_fit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "src", "get_data"))
+sys.path.append(os.path.join(ROOT, "src", "forecasting"))
+
+from build_final_df import build_final_df, derive_production_columns
+from change_points import detect_all_wells
+from completion_parser import parse_completions, per_file_frames
+from decline_curves import PARAM_BOUNDS, fit_arps_wells, mod_hyperbolic_arps
+from download_wellfiles import download_pdf
+from eur_rollup import forecast_chunk
+from ndic_stub_server import serve
+from schema import read_production_csv
+from synthetic_ndic import FIRST_FILE_NUMBER, generate, read_completion_pages
+
+DEFAULT_WELLS = [100, 1000]
+DEFAULT_DATA_DIR = "data/synthetic"
+DEFAULT_RESULTS_PATH = "benchmarks/results.jsonl"
+DEFAULT_REPEAT = 3
+# Cases that run one Python call per well are timed on a sample of wells
+DEFAULT_SAMPLE_WELLS = 500
+DEFAULT_THRESHOLD = 1.2
+WELL_COL = "File Number"
+
+
+class BenchmarkData:
+    """Synthetic files of one well count and the frames derived from them, built on first use."""
+
+    def __init__(self, n_wells, data_dir=DEFAULT_DATA_DIR, sample_wells=DEFAULT_SAMPLE_WELLS, seed=0):
+        self.n_wells = n_wells
+        self.dir = os.path.join(data_dir, f"bench_{n_wells}_wells")
+        self.sample_wells = sample_wells
+        self.paths = {
+            "header": os.path.join(self.dir, "ndic_wellheader_data.csv"),
+            "production": os.path.join(self.dir, "ndic_production_data.csv"),
+            "completion": os.path.join(self.dir, "completion_pages.jsonl"),
+        }
+        if not all(os.path.exists(path) for path in self.paths.values()):
+            generate(n_wells, self.dir, seed)
+        self._cache = {}
+
+    def _get(self, name, build):
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    @property
+    def raw(self):
+        return self._get("raw", lambda: pd.read_csv(self.paths["production"]))
+
+    @property
+    def daily(self):
+        return self._get("daily", lambda: derive_production_columns(self.raw))
+
+    @property
+    def sample(self):
+        def build():
+            wells = self.daily[WELL_COL].unique()[:self.sample_wells]
+            return self.daily[self.daily[WELL_COL].isin(wells)]
+        return self._get("sample", build)
+
+    @property
+    def fit_input(self):
+        # Producing months only, as the dashboard fits
+        return self._get("fit_input", lambda: self.daily[self.daily["Days"] > 0].dropna(subset=["rolling_oil_mean"]))
+
+    @property
+    def params(self):
+        def build():
+            param_df = fit_arps_wells(self.fit_input, well_col=WELL_COL)
+            last_day = self.fit_input.groupby(WELL_COL)["producing_days"].max()
+            return param_df.assign(t_start=param_df[WELL_COL].map(last_day))
+        return self._get("params", build)
+
+    @property
+    def pages(self):
+        return self._get("pages", lambda: read_completion_pages(self.paths["completion"]))
+
+    @property
+    def stub_server(self):
+        return self._get("stub_server", serve)
+
+    def close(self):
+        if "stub_server" in self._cache:
+            self._cache.pop("stub_server")[0].shutdown()
+
+
+def curve_fit_wells(df):
+    """Fits one well at a time with `curve_fit`, as the dashboard does for a single well."""
+    results = {}
+    for well, group in df.groupby(WELL_COL, sort=False):
+        try:
+            results[well], _ = curve_fit(mod_hyperbolic_arps, group["producing_days"].to_numpy(float),
+                                         group["rolling_oil_mean"].to_numpy(float), bounds=PARAM_BOUNDS)
+        except (RuntimeError, ValueError):
+            continue
+    return results
+
+
+def _build_final_df(data):
+    with tempfile.TemporaryDirectory() as tmp:
+        build_final_df(data.paths["production"], data.paths["header"], os.path.join(tmp, "store"),
+                       n_buckets=8, work_dir=os.path.join(tmp, "buckets"))
+
+
+def download_stub_well_file(data):
+    """Downloads one well file PDF from the stub server, as download_wellfiles.py does."""
+    _, base_url = data.stub_server
+    with tempfile.TemporaryDirectory() as tmp:
+        download_pdf(FIRST_FILE_NUMBER, tmp, base_url=f"{base_url}/oilgas/basic/bwfiles", retries=0)
+
+
+# name -> (function of BenchmarkData returning the callable to time, rows the case processes)
+CASES = {
+    "csv_load_default": (lambda data: lambda: pd.read_csv(data.paths["production"]), lambda data: len(data.raw)),
+    "csv_load_schema": (lambda data: lambda: read_production_csv(data.paths["production"]),
+                        lambda data: len(data.raw)),
+    "derive_production_columns": (lambda data: lambda: derive_production_columns(data.raw),
+                                  lambda data: len(data.raw)),
+    "build_final_df": (lambda data: lambda: _build_final_df(data), lambda data: len(data.raw)),
+    "arps_curve_fit_sample": (
+        lambda data: lambda: curve_fit_wells(data.fit_input[data.fit_input[WELL_COL].isin(data.sample[WELL_COL])]),
+        lambda data: min(data.n_wells, data.sample_wells)),
+    "arps_batch_fit_sample": (
+        lambda data: lambda: fit_arps_wells(data.fit_input[data.fit_input[WELL_COL].isin(data.sample[WELL_COL])],
+                                            well_col=WELL_COL),
+        lambda data: min(data.n_wells, data.sample_wells)),
+    "arps_batch_fit": (lambda data: lambda: fit_arps_wells(data.fit_input, well_col=WELL_COL),
+                       lambda data: data.n_wells),
+    "forecast_economic_limit": (
+        lambda data: lambda: forecast_chunk(data.params["qi"], data.params["Di"], data.params["b"],
+                                            data.params["t_start"]),
+        lambda data: len(data.params)),
+    "change_points_sample": (
+        lambda data: lambda: detect_all_wells(data.sample, well_col=WELL_COL, workers=1),
+        lambda data: min(data.n_wells, data.sample_wells)),
+    "completion_parse_per_file": (lambda data: lambda: per_file_frames(data.pages), lambda data: len(data.pages)),
+    "completion_parse_bulk": (lambda data: lambda: parse_completions(data.pages), lambda data: len(data.pages)),
+    "stub_well_file_download": (lambda data: lambda: download_stub_well_file(data), lambda data: 1),
+}
+
+
+def time_case(func, repeat=DEFAULT_REPEAT):
+    """Best and mean wall time of `repeat` calls in seconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return min(durations), float(np.mean(durations))
+
+
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(well_counts=DEFAULT_WELLS, cases=None, repeat=DEFAULT_REPEAT, data_dir=DEFAULT_DATA_DIR,
+                   sample_wells=DEFAULT_SAMPLE_WELLS):
+    """
+    Times every case at every well count.
+
+    Parameters:
+        well_counts (list of int): Synthetic basin sizes.
+        cases (list of str, optional): Names in CASES to run, all by default.
+        repeat (int): Calls per case, the best is reported.
+        data_dir (str): Directory the synthetic data is generated in.
+        sample_wells (int): Wells used by the per-well cases.
+
+    Returns:
+        list of dict: One record per case and well count.
+    """
+    commit = current_commit()
+    timestamp = datetime.datetime.now().isoformat(timespec="seconds")
+    records = []
+    for n_wells in well_counts:
+        data = BenchmarkData(n_wells, data_dir, sample_wells)
+        for name in cases or CASES:
+            setup, rows = CASES[name]
+            func = setup(data)
+            # Warm-up call, so lazily built inputs and imports are not timed
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                func()
+                best, mean = time_case(func, repeat)
+            record = {"case": name, "wells": n_wells, "rows": int(rows(data)), "best_seconds": best,
+                      "mean_seconds": mean, "repeat": repeat, "commit": commit, "timestamp": timestamp}
+            records.append(record)
+            print(f"{name:<28}{n_wells:>8} wells{record['rows']:>10} rows{best:>10.3f} s")
+        data.close()
+    return records
+
+
+def compare(records, baseline_path, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares records with the latest baseline record of each case and well count.
+
+    Returns:
+        list of dict: Cases whose best time is more than `threshold` times the baseline's.
+    """
+    baseline = {}
+    with open(baseline_path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                baseline[(record["case"], record["wells"])] = record
+    regressions = []
+    for record in records:
+        previous = baseline.get((record["case"], record["wells"]))
+        if previous is None:
+            continue
+        ratio = record["best_seconds"] / previous["best_seconds"]
+        print(f"{record['case']:<28}{record['wells']:>8} wells  {previous['best_seconds']:.3f} s -> "
+              f"{record['best_seconds']:.3f} s ({ratio:.2f}x)")
+        if ratio > threshold:
+            regressions.append({**record, "baseline_seconds": previous["best_seconds"], "ratio": ratio})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic NDIC data.")
+    parser.add_argument("--wells", type=int, nargs="+", default=DEFAULT_WELLS, help="Synthetic basin sizes.")
+    parser.add_argument("--only", nargs="+", choices=list(CASES), help="Cases to run, all by default.")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Timed calls per case.")
+    parser.add_argument("--sample-wells", type=int, default=DEFAULT_SAMPLE_WELLS,
+                        help="Wells used by the per-well curve_fit and change-point cases.")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Directory for the synthetic data.")
+    parser.add_argument("--out", default=DEFAULT_RESULTS_PATH, help="JSON-lines file the results are appended to.")
+    parser.add_argument("--compare", default=None, help="Baseline results file to check for regressions.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown ratio against the baseline that counts as a regression.")
+    args = parser.parse_args()
+
+    records = run_benchmarks(args.wells, args.only, args.repeat, args.data_dir, args.sample_wells)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    print(f"Appended {len(records)} results to {args.out}")
+
+    if args.compare:
+        regressions = compare(records, args.compare, args.threshold)
+        for record in regressions:
+            print(f"Regression: {record['case']} at {record['wells']} wells is {record['ratio']:.2f}x slower")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
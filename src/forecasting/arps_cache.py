@@ -0,0 +1,224 @@
+"""
+Persistent, content-addressed cache of fitted Arps parameters.
+
+Entries are keyed by a hash of a well's (producing_days, rolling_oil_mean) arrays
+plus the parameter bounds, so a well is only refit when its monthly data actually
+changes. The cache is a single SQLite file, which lets the Streamlit dashboard and
+batch jobs share it across processes. Least recently used entries are evicted once
+the cache grows past `max_entries`.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from decline_curves import PARAM_BOUNDS, fit_arps_batch, pad_wells, parameter_covariance
+
+DEFAULT_CACHE_PATH = "data/cache/arps_params.sqlite"
+
+# Bump when the model, solver or stored payload changes in a way that invalidates stored fits.
+# 2: fits carry their parameter covariance
+CACHE_VERSION = 2
+
+
+def fit_key(time, rate, bounds=PARAM_BOUNDS):
+    """
+    Builds the cache key for one well's production history.
+
+    Parameters:
+        time (array-like): Producing days used for the fit.
+        rate (array-like): Rates used for the fit (rolling_oil_mean).
+        bounds (tuple): Lower and upper bounds for (qi, Di, b).
+
+    Returns:
+        str: Hex digest identifying the fit inputs.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_VERSION}".encode())
+    digest.update(np.ascontiguousarray(time, dtype=np.float64).tobytes())
+    digest.update(b"|")
+    digest.update(np.ascontiguousarray(rate, dtype=np.float64).tobytes())
+    digest.update(repr([[float(v) for v in side] for side in bounds]).encode())
+    return digest.hexdigest()
+
+
+class ArpsParamCache:
+    """SQLite-backed LRU cache mapping fit keys to fitted Arps parameters."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=200_000):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS arps_params (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON arps_params (last_used)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # A short-lived connection per call keeps the cache safe to share between
+        # Streamlit sessions (threads) and batch jobs (processes).
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        """Returns the cached parameter dict for `key`, or None on a miss."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """
+        Looks up several keys at once and refreshes their LRU timestamps.
+
+        Parameters:
+            keys (list of str): Fit keys to look up.
+
+        Returns:
+            dict: Mapping of key to parameter dict for the keys that were found.
+        """
+        found = {}
+        keys = list(keys)
+        now = time.time()
+        with self._connect() as conn:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, payload FROM arps_params WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                found.update({key: json.loads(payload) for key, payload in rows})
+                conn.executemany(
+                    "UPDATE arps_params SET last_used = ? WHERE key = ?",
+                    [(now, key) for key, _ in rows],
+                )
+        return found
+
+    def put(self, key, params):
+        """Stores one parameter dict."""
+        self.put_many({key: params})
+
+    def put_many(self, entries):
+        """
+        Stores several parameter dicts and evicts old entries if the cache is full.
+
+        Parameters:
+            entries (dict): Mapping of key to a JSON-serialisable parameter dict.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO arps_params (key, payload, created, last_used) VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(params), now, now) for key, params in entries.items()],
+            )
+        self.evict()
+
+    def evict(self):
+        """Drops the least recently used entries beyond `max_entries`."""
+        with self._connect() as conn:
+            (count,) = conn.execute("SELECT COUNT(*) FROM arps_params").fetchone()
+            excess = count - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM arps_params WHERE key IN "
+                    "(SELECT key FROM arps_params ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM arps_params").fetchone()[0]
+
+
+def fit_wells_cached(df, cache, well_col="current_well_name", time_col="producing_days",
+                     rate_col="rolling_oil_mean", bounds=PARAM_BOUNDS, **solver_kwargs):
+    """
+    Returns fitted parameters for every well, refitting only wells whose data changed.
+
+    Parameters:
+        df (pd.DataFrame): Production data with one row per well and month.
+        cache (ArpsParamCache): Cache used to look up and store fits.
+        well_col (str): Column identifying the well.
+        time_col (str): Column with producing days.
+        rate_col (str): Column with the rate to fit.
+        bounds (tuple): Lower and upper bounds for (qi, Di, b).
+        **solver_kwargs: Passed through to `fit_arps_batch`.
+
+    Returns:
+        pd.DataFrame: One row per well with qi, Di, b, RMSE, converged, covariance and a `cached` flag.
+    """
+    wells, t, q, mask = pad_wells(df, well_col, time_col, rate_col)
+    keys = [fit_key(t[i][mask[i]], q[i][mask[i]], bounds) for i in range(len(wells))]
+    hits = cache.get_many(keys)
+
+    misses = np.array([i for i, key in enumerate(keys) if key not in hits], dtype=int)
+    if misses.size:
+        print(f"Refitting {misses.size} of {len(wells)} wells with changed production data.")
+        result = fit_arps_batch(t[misses], q[misses], mask[misses], bounds=bounds, **solver_kwargs)
+        # Kept with the fit so the dashboard can sample P10/P50/P90 without refitting
+        covariance = parameter_covariance(t[misses], q[misses], mask[misses], result["qi"], result["Di"], result["b"])
+        new_entries = {}
+        for j, i in enumerate(misses):
+            params = {name: _to_json(values[j]) for name, values in result.items()}
+            params["covariance"] = covariance[j].tolist() if np.isfinite(covariance[j]).all() else None
+            new_entries[keys[i]] = params
+        cache.put_many(new_entries)
+        hits.update(new_entries)
+
+    refit = set(misses.tolist())
+    rows = [{well_col: well, **hits[keys[i]], "cached": i not in refit} for i, well in enumerate(wells)]
+    return pd.DataFrame(rows)
+
+
+def _to_json(value):
+    """Converts NumPy scalars to plain Python values, mapping NaN to None."""
+    value = value.item() if hasattr(value, "item") else value
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def main():
+    """Nightly refit: fits every active well in final_df, reusing cached fits for unchanged wells."""
+    import argparse
+    from data_store import DEFAULT_STORE_PATH, ensure_store, load_daily
+
+    parser = argparse.ArgumentParser(description="Refit Arps parameters for wells whose production changed.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Parquet store of the processed dataset.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite cache file.")
+    parser.add_argument("--out", default=None, help="Optional CSV path for the parameter table.")
+    args = parser.parse_args()
+
+    ensure_store(args.store)
+    daily_df = load_daily(root=args.store, filters=[("well_status", "==", "A")])
+    daily_df = daily_df.rename(columns={'y': 'daily_oil_rate'})
+    daily_df = daily_df[daily_df['daily_oil_rate'].notna()].copy()
+    daily_df['rolling_oil_mean'] = daily_df['rolling_oil_mean'].fillna(daily_df['daily_oil_rate'])
+
+    param_df = fit_wells_cached(daily_df, ArpsParamCache(args.cache))
+    print(f"{(~param_df['cached']).sum()} wells refit, {param_df['cached'].sum()} served from cache.")
+    if args.out:
+        param_df.to_csv(args.out, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Out-of-core build of the processed dataset (final_df) for the whole state.
+
+The data exploration notebook loads `ndic_production_data.csv` whole, adds the derived
+columns and merges the Prophet forecasts and well header in memory. Every derived
+column is computed per well, so here the production CSV is streamed in chunks and
+hash-partitioned by file number into buckets of whole wells. Each bucket is then
+processed with the notebook's steps on its own and appended to the Parquet store,
+so memory is bounded by the chunk size and the largest bucket, not the state.
+
+Usage:
+    python src/forecasting/build_final_df.py --buckets 64
+"""
+import argparse
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_store import DEFAULT_STORE_PATH, PARTITION_COLS, prepare_final_df, write_store
+from outliers import rolling_outliers
+from schema import read_header_csv
+
+DEFAULT_PRODUCTION_CSV = "data/raw/ndic_production_data.csv"
+DEFAULT_HEADER_CSV = "data/raw/ndic_wellheader_data.csv"
+DEFAULT_WORK_DIR = "data/interim/production_buckets"
+DEFAULT_BUCKETS = 64
+DEFAULT_CHUNK_ROWS = 500_000
+ROLLING_WINDOW = 12
+STD_ACCEPTABLE_WINDOW = 3
+FORECAST_COLS = ['ds', 'trend', 'yhat', 'yhat_lower', 'yhat_upper']
+
+# Production CSV columns (as written by scrape_production_data.py) and their types,
+# so every chunk and bucket file shares one schema
+PRODUCTION_SCHEMA = pa.schema([
+    ("File Number", pa.int64()),
+    ("Pool", pa.string()),
+    ("Date", pa.string()),
+    ("Days", pa.float64()),
+    ("BBLS Oil", pa.float64()),
+    ("Runs", pa.float64()),
+    ("BBLS Water", pa.float64()),
+    ("MCF Prod", pa.float64()),
+    ("MCF Sold", pa.float64()),
+    ("Vent/Flare", pa.float64()),
+])
+
+
+def bucket_of(file_numbers, n_buckets):
+    """Bucket of each well, all rows of a well land in the same bucket."""
+    return np.asarray(file_numbers, dtype=np.int64) % n_buckets
+
+
+def bucket_path(work_dir, bucket):
+    return os.path.join(work_dir, f"bucket-{bucket:04d}.parquet")
+
+
+def partition_production(csv_path=DEFAULT_PRODUCTION_CSV, work_dir=DEFAULT_WORK_DIR, n_buckets=DEFAULT_BUCKETS,
+                         chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Streams the production CSV into one Parquet file per bucket of wells.
+
+    Parameters:
+        csv_path (str): Production CSV.
+        work_dir (str): Directory for the bucket files, replaced if it exists.
+        n_buckets (int): Number of buckets.
+        chunk_rows (int): CSV rows read at a time.
+
+    Returns:
+        int: Rows written (rows without a file number are dropped).
+    """
+    if os.path.isdir(work_dir):
+        shutil.rmtree(work_dir)
+    os.makedirs(work_dir)
+
+    writers = {}
+    rows = 0
+    numeric_cols = [field.name for field in PRODUCTION_SCHEMA if pa.types.is_floating(field.type)]
+    try:
+        reader = pd.read_csv(csv_path, chunksize=chunk_rows, usecols=PRODUCTION_SCHEMA.names,
+                             dtype={"Pool": "string", "Date": "string"})
+        for chunk in reader:
+            chunk["File Number"] = pd.to_numeric(chunk["File Number"], errors="coerce")
+            chunk = chunk.dropna(subset=["File Number"])
+            chunk["File Number"] = chunk["File Number"].astype("int64")
+            for col in numeric_cols:
+                chunk[col] = pd.to_numeric(chunk[col], errors="coerce").astype("float64")
+
+            for bucket, part in chunk.groupby(bucket_of(chunk["File Number"], n_buckets)):
+                table = pa.Table.from_pandas(part[PRODUCTION_SCHEMA.names], schema=PRODUCTION_SCHEMA,
+                                             preserve_index=False)
+                if bucket not in writers:
+                    writers[bucket] = pq.ParquetWriter(bucket_path(work_dir, bucket), PRODUCTION_SCHEMA)
+                writers[bucket].write_table(table)
+            rows += len(chunk)
+            print(f"Partitioned {rows} production rows into {len(writers)} buckets")
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows
+
+
+def derive_production_columns(production_df):
+    """
+    Adds the notebook's per-well columns to the production rows of whole wells.
+
+    Parameters:
+        production_df (pd.DataFrame): Raw production rows, all rows of each well present.
+
+    Returns:
+        pd.DataFrame: Rows sorted by file number and producing days with producing_days,
+        daily rates, cumulative volumes, rolling oil mean/std and is_outlier.
+    """
+    production_df = production_df.copy()
+    production_df['Date'] = pd.to_datetime(production_df['Date'], format='%m-%Y')
+
+    # Producing days since first production, rounded to the nearest 30-day increment
+    min_dates = production_df.groupby('File Number')['Date'].transform('min')
+    production_df['producing_days'] = (production_df['Date'] - min_dates).dt.days
+    production_df['producing_days'] = (production_df['producing_days'] / 30).round() * 30
+
+    production_df['daily_oil_rate'] = production_df['BBLS Oil'] / production_df['Days']
+    production_df['daily_gas_rate'] = production_df['MCF Prod'] / production_df['Days']
+    production_df['daily_water_rate'] = production_df['BBLS Water'] / production_df['Days']
+    production_df = production_df.sort_values(by=['File Number', 'producing_days'], ascending=[True, True])
+
+    production_df['Cumulative_Oil_BBLS'] = production_df.groupby('File Number')['BBLS Oil'].cumsum()
+    production_df['Cumulative_Gas_MCF'] = production_df.groupby('File Number')['MCF Prod'].cumsum()
+    production_df['Cumulative_Wtr_BBLS'] = production_df.groupby('File Number')['BBLS Water'].cumsum()
+
+    # Centered rolling mean/std and outlier flags of all wells in one pass
+    stats, _ = rolling_outliers(production_df, window=ROLLING_WINDOW, std_acceptable_window=STD_ACCEPTABLE_WINDOW)
+    production_df['rolling_oil_mean'] = stats['rolling_mean']
+    production_df['rolling_oil_std'] = stats['rolling_std']
+    production_df['is_outlier'] = stats['is_outlier']
+    return production_df
+
+
+def build_bucket(production_df, wellhead_df, forecasts_df):
+    """
+    Builds the final_df rows of one bucket of wells.
+
+    Parameters:
+        production_df (pd.DataFrame): Raw production rows of the bucket's wells.
+        wellhead_df (pd.DataFrame): Header rows of the bucket's wells.
+        forecasts_df (pd.DataFrame): Prophet forecasts of the bucket's wells, with `well_id`.
+
+    Returns:
+        pd.DataFrame: Header left-joined to production outer-joined with forecasts, as in the notebook.
+    """
+    actual_data = derive_production_columns(production_df)
+    actual_data = actual_data.rename(columns={'Date': 'ds', 'File Number': 'well_id', 'daily_oil_rate': 'y'})
+    merged = pd.merge(actual_data, forecasts_df[['well_id'] + FORECAST_COLS], on=['ds', 'well_id'], how='outer')
+    return pd.merge(wellhead_df, merged, left_on='NDIC File No', right_on='well_id', how='left')
+
+
+def empty_forecasts():
+    """Typed empty forecast table for buckets without saved forecasts."""
+    return pd.DataFrame({'well_id': pd.Series(dtype='int64'), 'ds': pd.Series(dtype='datetime64[ns]'),
+                         **{col: pd.Series(dtype='float64') for col in FORECAST_COLS[1:]}})
+
+
+def build_final_df(production_csv=DEFAULT_PRODUCTION_CSV, header_csv=DEFAULT_HEADER_CSV, root=DEFAULT_STORE_PATH,
+                   model_dir=None, n_buckets=DEFAULT_BUCKETS, chunk_rows=DEFAULT_CHUNK_ROWS,
+                   work_dir=DEFAULT_WORK_DIR, partition_cols=PARTITION_COLS, csv_path=None):
+    """
+    Builds final_df bucket by bucket and writes it to the partitioned Parquet store.
+
+    Parameters:
+        production_csv (str): Raw production CSV.
+        header_csv (str): Well header CSV, small enough to read whole.
+        root (str): Parquet store to (re)build.
+        model_dir (str, optional): Model directory of `model_farm.py`, Prophet forecasts are
+            merged in when given.
+        n_buckets (int): Buckets of wells processed one at a time.
+        chunk_rows (int): CSV rows read at a time while partitioning.
+        work_dir (str): Directory for the intermediate bucket files.
+        partition_cols (tuple of str): Columns the store is partitioned by.
+        csv_path (str, optional): Also write final_df.csv here, appended bucket by bucket.
+
+    Returns:
+        int: Rows written to the store.
+    """
+    from model_farm import load_forecasts
+
+    partition_production(production_csv, work_dir, n_buckets, chunk_rows)
+    wellhead_df = read_header_csv(header_csv)
+    header_buckets = bucket_of(pd.to_numeric(wellhead_df['NDIC File No'], errors='coerce').fillna(-1), n_buckets)
+
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+    if csv_path and os.path.exists(csv_path):
+        os.remove(csv_path)
+
+    rows = 0
+    for bucket in range(n_buckets):
+        path = bucket_path(work_dir, bucket)
+        bucket_header = wellhead_df[header_buckets == bucket]
+        if bucket_header.empty:
+            continue
+        # Header wells without production are kept by the left join, as in the notebook
+        production_df = pd.read_parquet(path) if os.path.exists(path) else PRODUCTION_SCHEMA.empty_table().to_pandas()
+
+        wells = bucket_header['NDIC File No'].dropna().unique()
+        forecasts_df = load_forecasts('prophet', model_dir, FORECAST_COLS, wells=wells) if model_dir else None
+        if forecasts_df is None or forecasts_df.empty:
+            forecasts_df = empty_forecasts()
+
+        final_df = build_bucket(production_df, bucket_header, forecasts_df)
+        if csv_path:
+            final_df.to_csv(csv_path, mode='a', header=not os.path.exists(csv_path))
+        write_store(prepare_final_df(final_df, partition_cols), root, partition_cols,
+                    basename_template=f"part-{bucket:04d}-{{i}}.parquet",
+                    existing_data_behavior="overwrite_or_ignore")
+        rows += len(final_df)
+        print(f"Bucket {bucket + 1}/{n_buckets}: {len(final_df)} rows")
+
+    shutil.rmtree(work_dir)
+    print(f"Wrote {rows} rows to {root}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build final_df with bounded memory, one bucket of wells at a time.")
+    parser.add_argument("--production", default=DEFAULT_PRODUCTION_CSV, help="Raw production CSV.")
+    parser.add_argument("--header", default=DEFAULT_HEADER_CSV, help="Well header CSV.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Output Parquet dataset directory.")
+    parser.add_argument("--model-dir", default=None, help="Merge Prophet forecasts saved by model_farm.py.")
+    parser.add_argument("--buckets", type=int, default=DEFAULT_BUCKETS, help="Buckets of wells.")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="CSV rows read at a time.")
+    parser.add_argument("--work-dir", default=DEFAULT_WORK_DIR, help="Directory for intermediate bucket files.")
+    parser.add_argument("--csv", default=None, help="Also write final_df.csv to this path.")
+    parser.add_argument("--by-operator", action="store_true", help="Also partition by current_operator.")
+    args = parser.parse_args()
+
+    partition_cols = PARTITION_COLS + ("current_operator",) if args.by_operator else PARTITION_COLS
+    build_final_df(args.production, args.header, args.store, args.model_dir, args.buckets, args.chunk_rows,
+                   args.work_dir, partition_cols, args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Batched change-point detection of flow regimes on the log-log decline.
+
+This is the `change_point_detection` routine of the model bakeoff notebook without
+the plotting: each well's signal starts at its IP (the highest daily oil rate in the
+first 180 producing days), and ruptures' C-backed `KernelCPD` finds the breakpoints
+in (log time, log rate). Wells are processed in parallel in chunks, results are
+cached by a hash of each well's signal, and the output is a tidy table with one row
+per segment, ready for segment-wise Arps fits.
+
+Usage:
+    python src/forecasting/change_points.py --workers 8 --out data/processed/change_point_df.csv
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_PATH = "data/cache/change_points.sqlite"
+DEFAULT_OUTPUT_PATH = "data/processed/change_point_df.csv"
+DEFAULT_N_BKPS = 2
+DEFAULT_MIN_SIZE = 2
+IP_WINDOW_DAYS = 180
+
+
+def log_signal(producing_days, rate):
+    """Log time and log rate, with zeros replaced by 1e-6 as in the notebook."""
+    producing_days = np.asarray(producing_days, dtype=float)
+    rate = np.asarray(rate, dtype=float)
+    return np.column_stack([
+        np.log(np.where(producing_days == 0, 1e-6, producing_days)),
+        np.log(np.where(rate == 0, 1e-6, rate)),
+    ])
+
+
+def ip_start(producing_days, daily_oil_rate, ip_window=IP_WINDOW_DAYS):
+    """
+    Position of the IP row, the highest daily oil rate within the first `ip_window` days.
+
+    Returns:
+        int: Row position the detection signal starts at (0 if the well has no early rates).
+    """
+    early = np.where(np.asarray(producing_days) < ip_window, np.asarray(daily_oil_rate, dtype=float), np.nan)
+    if np.all(np.isnan(early)):
+        return 0
+    return int(np.nanargmax(early))
+
+
+def signal_key(signal, n_bkps, min_size):
+    """Cache key of a well's detection signal and settings."""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(signal, dtype=np.float64).tobytes())
+    digest.update(json.dumps([n_bkps, min_size, "KernelCPD-linear"]).encode())
+    return digest.hexdigest()
+
+
+def detect_change_points(signal, n_bkps=DEFAULT_N_BKPS, min_size=DEFAULT_MIN_SIZE):
+    """
+    Runs KernelCPD with a linear kernel on one signal.
+
+    Returns:
+        list of int: Segment end positions as returned by ruptures (the last one is len(signal)).
+        Signals too short for `n_bkps` breakpoints return a single segment.
+    """
+    import ruptures as rpt
+
+    signal = signal[~np.isnan(signal).any(axis=1)]
+    if len(signal) < (n_bkps + 1) * min_size:
+        return [len(signal)]
+    algo = rpt.KernelCPD(kernel="linear", min_size=min_size).fit(signal)  # written in C
+    return [int(bkp) for bkp in algo.predict(n_bkps=n_bkps)]
+
+
+def _detect_chunk(task):
+    """Pool task: detects change points for a chunk of (key, signal) pairs."""
+    signals, n_bkps, min_size = task
+    return {key: detect_change_points(signal, n_bkps, min_size) for key, signal in signals}
+
+
+class ChangePointCache:
+    """SQLite cache of breakpoints keyed by `signal_key`."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS breakpoints (key TEXT PRIMARY KEY, result TEXT, created REAL)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_many(self, keys):
+        """Returns a dict of key -> breakpoints for the keys found in the cache."""
+        found = {}
+        keys = list(keys)
+        with self._connect() as conn:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(f"SELECT key, result FROM breakpoints WHERE key IN ({placeholders})", batch)
+                found.update({key: json.loads(result) for key, result in rows})
+        return found
+
+    def put_many(self, results):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO breakpoints VALUES (?, ?, ?)",
+                             [(key, json.dumps(result), now) for key, result in results.items()])
+
+
+def detect_all_wells(daily_df, well_col="current_well_name", time_col="producing_days", rate_col="daily_oil_rate",
+                     smooth_col="rolling_oil_mean", n_bkps=DEFAULT_N_BKPS, min_size=DEFAULT_MIN_SIZE,
+                     workers=None, cache=None, chunk_size=200):
+    """
+    Detects flow-regime change points for every well.
+
+    Parameters:
+        daily_df (pd.DataFrame): Long table with one row per well and month.
+        well_col (str): Column identifying the well.
+        time_col (str): Producing days.
+        rate_col (str): Daily oil rate, used to find the IP.
+        smooth_col (str): Rate the log signal is built from (rolling_oil_mean, as in the notebook).
+        n_bkps (int): Breakpoints per well.
+        min_size (int): Minimum segment length in points.
+        workers (int, optional): Worker processes, 1 runs in this process.
+        cache (ChangePointCache, optional): Reuses results for wells whose signal is unchanged.
+        chunk_size (int): Wells per pool task, KernelCPD takes about a millisecond per well.
+
+    Returns:
+        pd.DataFrame: One row per segment, see `breakpoints_table`.
+    """
+    data = daily_df[[well_col, time_col, rate_col, smooth_col]].dropna(subset=[time_col])
+    data = data.sort_values([well_col, time_col], kind="stable")
+
+    wells = {}
+    for well, group in data.groupby(well_col, sort=False):
+        start = ip_start(group[time_col].to_numpy(), group[rate_col].to_numpy())
+        group = group.iloc[start:]
+        signal = log_signal(group[time_col].to_numpy(), group[smooth_col].to_numpy())
+        valid = ~np.isnan(signal).any(axis=1)
+        group, signal = group[valid], signal[valid]
+        wells[well] = (group, signal, signal_key(signal, n_bkps, min_size))
+
+    keys = {key: signal for _, signal, key in wells.values()}
+    results = cache.get_many(keys) if cache is not None else {}
+    misses = [(key, signal) for key, signal in keys.items() if key not in results]
+    print(f"Detecting change points for {len(misses)} wells, {len(keys) - len(misses)} served from cache.")
+
+    tasks = [(misses[i:i + chunk_size], n_bkps, min_size) for i in range(0, len(misses), chunk_size)]
+    if workers == 1 or len(tasks) <= 1:
+        computed = [_detect_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            computed = list(executor.map(_detect_chunk, tasks))
+    new_results = {key: bkps for chunk in computed for key, bkps in chunk.items()}
+    if cache is not None and new_results:
+        cache.put_many(new_results)
+    results.update(new_results)
+
+    return breakpoints_table(
+        {well: (group, signal, results[key]) for well, (group, signal, key) in wells.items()},
+        well_col, time_col, rate_col,
+    )
+
+
+def breakpoints_table(well_results, well_col="current_well_name", time_col="producing_days",
+                      rate_col="daily_oil_rate"):
+    """
+    Turns per-well breakpoints into a tidy segment table.
+
+    Parameters:
+        well_results (dict): Well -> (rows from IP onwards, log signal, ruptures breakpoints).
+
+    Returns:
+        pd.DataFrame: well, segment number, start/end positions and producing days, points,
+        the daily oil rate at the segment start and the log-log slope of the segment
+        (about -0.5 for linear flow, -1 for boundary-dominated flow).
+    """
+    rows = []
+    for well, (group, signal, bkps) in well_results.items():
+        days = group[time_col].to_numpy(dtype=float)
+        rates = group[rate_col].to_numpy(dtype=float)
+        start = 0
+        for segment, end in enumerate(bkps, start=1):
+            if end <= start:
+                continue
+            seg = signal[start:end]
+            slope = np.polyfit(seg[:, 0], seg[:, 1], 1)[0] if len(seg) >= 2 and np.ptp(seg[:, 0]) > 0 else np.nan
+            rows.append({
+                well_col: well,
+                "segment": segment,
+                "start_index": start,
+                "end_index": end,
+                "start_day": days[start],
+                "end_day": days[end - 1],
+                # Back-transformed change point, exp(log time) at the segment start
+                "change_point_day": float(np.exp(signal[start, 0])) if segment > 1 else np.nan,
+                "n_points": end - start,
+                "start_rate": rates[start],
+                "loglog_slope": slope,
+            })
+            start = end
+    return pd.DataFrame(rows, columns=[well_col, "segment", "start_index", "end_index", "start_day", "end_day",
+                                       "change_point_day", "n_points", "start_rate", "loglog_slope"])
+
+
+def fit_segment_arps(daily_df, breakpoints_df, well_col="current_well_name", time_col="producing_days",
+                     rate_col="rolling_oil_mean", **solver_kwargs):
+    """
+    Fits Arps parameters to every segment of every well with the batched solver.
+
+    Time is measured from each segment's start, so qi is the rate at the segment start.
+
+    Returns:
+        pd.DataFrame: breakpoints_df with qi, Di, b, RMSE and converged per segment.
+    """
+    from decline_curves import fit_arps_wells
+
+    data = daily_df[[well_col, time_col, rate_col]].dropna()
+    merged = data.merge(breakpoints_df[[well_col, "segment", "start_day", "end_day"]], on=well_col)
+    merged = merged[(merged[time_col] >= merged["start_day"]) & (merged[time_col] <= merged["end_day"])].copy()
+    merged["segment_key"] = merged[well_col].astype(str) + "#" + merged["segment"].astype(str)
+    merged["segment_days"] = merged[time_col] - merged["start_day"]
+
+    params = fit_arps_wells(merged, well_col="segment_key", time_col="segment_days", rate_col=rate_col,
+                            **solver_kwargs)
+    keys = breakpoints_df[well_col].astype(str) + "#" + breakpoints_df["segment"].astype(str)
+    params = params.set_index("segment_key")[["qi", "Di", "b", "RMSE", "converged"]]
+    return pd.concat([breakpoints_df.reset_index(drop=True), params.reindex(keys).reset_index(drop=True)], axis=1)
+
+
+def main():
+    from data_store import DEFAULT_STORE_PATH, ensure_store, load_daily
+
+    parser = argparse.ArgumentParser(description="Detect flow-regime change points for all wells.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Parquet store of the processed dataset.")
+    parser.add_argument("--field", default=None, help="Only process wells in this field.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to all cores.")
+    parser.add_argument("--n-bkps", type=int, default=DEFAULT_N_BKPS, help="Breakpoints per well.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite cache of breakpoints.")
+    parser.add_argument("--fit-segments", action="store_true", help="Also fit Arps parameters per segment.")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_PATH, help="Output CSV of segments.")
+    args = parser.parse_args()
+
+    ensure_store(args.store)
+    daily_df = load_daily(args.field, root=args.store, filters=[("well_status", "==", "A")])
+    daily_df = daily_df.rename(columns={'y': 'daily_oil_rate'})
+    daily_df['rolling_oil_mean'] = daily_df['rolling_oil_mean'].fillna(daily_df['daily_oil_rate'])
+
+    change_point_df = detect_all_wells(daily_df, n_bkps=args.n_bkps, workers=args.workers,
+                                       cache=ChangePointCache(args.cache))
+    if args.fit_segments:
+        change_point_df = fit_segment_arps(daily_df, change_point_df)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    change_point_df.to_csv(args.out, index=False)
+    print(f"Wrote {len(change_point_df)} segments for {change_point_df['current_well_name'].nunique()} wells to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
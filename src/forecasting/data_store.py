@@ -0,0 +1,164 @@
+"""
+Columnar storage for the processed dataset (final_df).
+
+`final_df.csv` is converted once into a Parquet dataset partitioned by `field`
+(and optionally by operator) with explicitly typed columns. Readers then load only
+the `DAILY_COLS` projection of the field they need, instead of parsing and cleaning
+the whole state-wide CSV on every start.
+
+Usage:
+    python src/forecasting/data_store.py --csv data/processed/final_df.csv
+"""
+import argparse
+import os
+from urllib.parse import unquote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import janitor  # noqa: F401 - registers DataFrame.clean_names
+
+from schema import apply_schema, fillna_category
+
+DEFAULT_CSV_PATH = "data/processed/final_df.csv"
+DEFAULT_STORE_PATH = "data/processed/final_df_parquet"
+PARTITION_COLS = ("field",)
+
+# Placeholder partition value for wells with no field in the header data
+UNKNOWN_PARTITION = "UNKNOWN"
+
+# Select relevant columns for analysis
+DAILY_COLS = ['ndic_file_no', 'api_no', 'well_type', 'well_status',
+       'latitude','longitude', 'current_operator', 'current_well_name', 'total_depth',
+       'field', 'perfs', 'filenumber','well_id','ds', 'producing_days', 'y', 'daily_gas_rate',
+       'daily_water_rate', 'cumulative_oil_bbls', 'cumulative_gas_mcf',
+       'cumulative_wtr_bbls', 'rolling_oil_mean', 'rolling_oil_std',
+       'is_outlier', 'trend', 'yhat', 'yhat_lower', 'yhat_upper']
+
+def prepare_final_df(df, partition_cols=PARTITION_COLS):
+    """
+    Cleans column names and applies explicit column types to final_df.
+
+    Parameters:
+        df (pd.DataFrame): final_df as written by the data exploration notebook.
+        partition_cols (tuple of str): Columns the store is partitioned by.
+
+    Returns:
+        pd.DataFrame: Typed copy of the data with cleaned column names.
+    """
+    df = df.clean_names()  # clean column names for consistency
+    df = df.drop(columns=[col for col in df.columns if col.startswith('unnamed')])
+
+    for col in partition_cols:
+        df[col] = fillna_category(df[col], UNKNOWN_PARTITION)
+
+    # Compact types from schema.py, remaining text columns as strings
+    df = apply_schema(df)
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype('string')
+
+    return df
+
+
+def write_store(df, root=DEFAULT_STORE_PATH, partition_cols=PARTITION_COLS,
+                basename_template=None, existing_data_behavior="delete_matching"):
+    """
+    Writes a prepared dataset as hive-partitioned Parquet.
+
+    Parameters:
+        df (pd.DataFrame): Output of `prepare_final_df`.
+        root (str): Directory of the Parquet dataset.
+        partition_cols (tuple of str): Columns to partition by.
+        basename_template (str, optional): File name template, e.g. "part-3-{i}.parquet",
+            so several writers can append to the same dataset.
+        existing_data_behavior (str): Passed to `pyarrow.dataset.write_dataset`.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # Categorical columns get the same dictionary index type in every file (pandas picks
+    # int8 or int16 by category count), and partition values are written as plain strings
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            value_type = pa.string() if field.name in partition_cols else pa.dictionary(pa.int32(), pa.string())
+            table = table.set_column(i, field.name, table.column(i).cast(value_type))
+    partitioning = ds.partitioning(
+        pa.schema([table.schema.field(col) for col in partition_cols]), flavor="hive"
+    )
+    ds.write_dataset(
+        table,
+        root,
+        format="parquet",
+        partitioning=partitioning,
+        basename_template=basename_template,
+        existing_data_behavior=existing_data_behavior,
+    )
+
+
+def convert_csv_to_store(csv_path=DEFAULT_CSV_PATH, root=DEFAULT_STORE_PATH, partition_cols=PARTITION_COLS):
+    """Converts final_df.csv into the partitioned Parquet store."""
+    df = pd.read_csv(csv_path, low_memory=False)
+    df = prepare_final_df(df, partition_cols)
+    write_store(df, root, partition_cols)
+    print(f"Wrote {len(df)} rows to {root} partitioned by {', '.join(partition_cols)}")
+
+
+def ensure_store(root=DEFAULT_STORE_PATH, csv_path=DEFAULT_CSV_PATH, partition_cols=PARTITION_COLS):
+    """Builds the Parquet store from the CSV the first time it is needed."""
+    if not os.path.isdir(root):
+        convert_csv_to_store(csv_path, root, partition_cols)
+
+
+def list_fields(root=DEFAULT_STORE_PATH, well_status=None):
+    """
+    Lists the fields available in the store.
+
+    Parameters:
+        root (str): Directory of the Parquet dataset.
+        well_status (str, optional): Only list fields that have wells with this status.
+
+    Returns:
+        list of str: Field names.
+    """
+    if well_status is None:
+        # Field names are the partition directory names, no data needs to be read
+        prefix = "field="
+        return sorted(unquote(name[len(prefix):]) for name in os.listdir(root) if name.startswith(prefix))
+
+    dataset = ds.dataset(root, format="parquet", partitioning="hive")
+    table = dataset.to_table(columns=["field"], filter=ds.field("well_status") == well_status)
+    return list(pd.unique(table.column("field").to_pandas().astype(str)))
+
+
+def load_daily(field=None, root=DEFAULT_STORE_PATH, columns=DAILY_COLS, filters=None):
+    """
+    Loads the daily-rate projection of the processed dataset.
+
+    Parameters:
+        field (str, optional): Only read this field's partition.
+        root (str): Directory of the Parquet dataset.
+        columns (list of str): Columns to read, defaults to `DAILY_COLS`.
+        filters (list of tuple, optional): Extra pyarrow filters, e.g. [("well_status", "==", "A")].
+
+    Returns:
+        pd.DataFrame: The requested columns for the selected partition.
+    """
+    filters = list(filters or [])
+    if field is not None:
+        filters.append(("field", "==", field))
+    # Stores written before the compact schema are cast on load
+    return apply_schema(pd.read_parquet(root, columns=list(columns), filters=filters or None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert final_df.csv into a partitioned Parquet store.")
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH, help="Processed CSV written by the notebooks.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Output Parquet dataset directory.")
+    parser.add_argument("--by-operator", action="store_true", help="Also partition by current_operator.")
+    args = parser.parse_args()
+
+    partition_cols = PARTITION_COLS + ("current_operator",) if args.by_operator else PARTITION_COLS
+    convert_csv_to_store(args.csv, args.store, partition_cols)
+
+
+if __name__ == "__main__":
+    main()
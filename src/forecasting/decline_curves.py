@@ -0,0 +1,252 @@
+"""
+Decline curve analysis (DCA) helpers shared by the dashboard and batch jobs.
+
+The single-well functions (`mod_hyperbolic_arps`, `arps_forecast`) are the same
+equations used by the Streamlit dashboard. `fit_arps_batch` fits qi/Di/b for many
+wells at once with a NumPy-batched Levenberg-Marquardt solver, so a basin-wide
+fit does not need one `curve_fit` call per well.
+"""
+import numpy as np
+import pandas as pd
+
+# Parameter bounds, including b factor constraints (e.g., 0 < b <= 1.5)
+PARAM_BOUNDS = ([0, 0, 0], [np.inf, 15, 1.5])  # qi, Di, and b upper/lower bounds
+
+# Smallest b used inside the solver, b -> 0 is the exponential limit and would divide by zero
+_MIN_B = 1e-4
+
+
+# Modified Hyperbolic Arps equation
+# This function models production decline using the hyperbolic decline formula
+def mod_hyperbolic_arps(t, qi, Di, b):
+    return qi / (1 + b * Di * t) ** (1/b)
+
+
+# Define the Arps forecast function
+# This function forecasts production using Arps parameters
+def arps_forecast(t, qi, Di, b):
+
+    time_adjusted = t - np.min(t)
+    return qi * (1 + b * Di * time_adjusted) ** (-1 / b)
+
+
+def pad_wells(df, well_col="current_well_name", time_col="producing_days", rate_col="rolling_oil_mean"):
+    """
+    Packs a long production table into padded well x month arrays.
+
+    Parameters:
+        df (pd.DataFrame): Long table with one row per well and month.
+        well_col (str): Column identifying the well.
+        time_col (str): Column with the time axis (producing days).
+        rate_col (str): Column with the rate to fit.
+
+    Returns:
+        tuple: (wells, t, q, mask) where `wells` is an array of well ids and
+        `t`, `q`, `mask` are 2-D arrays of shape (n_wells, max_points).
+    """
+    data = df[[well_col, time_col, rate_col]].dropna()
+    data = data.sort_values([well_col, time_col], kind="stable")
+
+    codes, wells = pd.factorize(data[well_col], sort=False)
+    positions = data.groupby(codes, sort=False).cumcount().to_numpy()
+    n_wells = len(wells)
+    max_points = int(positions.max()) + 1 if len(positions) else 0
+
+    t = np.zeros((n_wells, max_points))
+    q = np.zeros((n_wells, max_points))
+    mask = np.zeros((n_wells, max_points), dtype=bool)
+    t[codes, positions] = data[time_col].to_numpy(dtype=float)
+    q[codes, positions] = data[rate_col].to_numpy(dtype=float)
+    mask[codes, positions] = True
+
+    return np.asarray(wells), t, q, mask
+
+
+def _initial_guess(t, q, mask, lower, upper):
+    """Starting point for the solver: the first observed rate, a moderate decline and b=0.5."""
+    first = np.argmax(mask, axis=1)
+    qi0 = np.maximum(q[np.arange(len(q)), first], 1.0)
+    p0 = np.column_stack([qi0, np.full(len(q), 0.01), np.full(len(q), 0.5)])
+    return np.clip(p0, lower, upper)
+
+
+def _model_and_jacobian(t, params):
+    """Evaluates the modified hyperbolic model and its analytic Jacobian for a batch of wells."""
+    qi = params[:, 0:1]
+    Di = params[:, 1:2]
+    b = np.maximum(params[:, 2:3], _MIN_B)
+
+    u = 1.0 + b * Di * t
+    log_u = np.log(u)
+    base = np.exp(-log_u / b)  # u ** (-1/b)
+    q_model = qi * base
+
+    jac = np.empty(t.shape + (3,))
+    jac[..., 0] = base
+    jac[..., 1] = -qi * t * base / u
+    jac[..., 2] = q_model * (log_u / b**2 - Di * t / (b * u))
+    return q_model, jac
+
+
+def _sse(t, q, mask, params):
+    q_model, _ = _model_and_jacobian(t, params)
+    residuals = np.where(mask, q_model - q, 0.0)
+    return np.sum(residuals**2, axis=1)
+
+
+def _fit_chunk(t, q, mask, lower, upper, max_iter, tol):
+    """Runs projected Levenberg-Marquardt iterations on one chunk of padded wells."""
+    n_wells = len(t)
+    params = _initial_guess(t, q, mask, lower, upper)
+    damping = np.full(n_wells, 1e-3)
+    sse = _sse(t, q, mask, params)
+    converged = np.zeros(n_wells, dtype=bool)
+    iterations = np.zeros(n_wells, dtype=int)
+
+    for _ in range(max_iter):
+        active = np.flatnonzero(~converged)
+        if active.size == 0:
+            break
+
+        ta, qa, ma, pa = t[active], q[active], mask[active], params[active]
+        q_model, jac = _model_and_jacobian(ta, pa)
+        residuals = np.where(ma, q_model - qa, 0.0)
+        jac = jac * ma[..., None]
+
+        jtj = np.einsum("nli,nlj->nij", jac, jac)
+        grad = np.einsum("nli,nl->ni", jac, residuals)
+        diag = np.diagonal(jtj, axis1=1, axis2=2)
+        lhs = jtj + (damping[active, None] * (diag + 1e-12))[:, :, None] * np.eye(3)
+
+        try:
+            step = np.linalg.solve(lhs, -grad[..., None])[..., 0]
+        except np.linalg.LinAlgError:
+            step = -grad / (np.diagonal(lhs, axis1=1, axis2=2) + 1e-12)
+
+        candidate = np.clip(pa + step, lower, upper)
+        candidate_sse = _sse(ta, qa, ma, candidate)
+        improved = candidate_sse < sse[active]
+
+        accepted = active[improved]
+        rel_change = (sse[accepted] - candidate_sse[improved]) / np.maximum(sse[accepted], 1e-12)
+        params[accepted] = candidate[improved]
+        sse[accepted] = candidate_sse[improved]
+        damping[accepted] = np.maximum(damping[accepted] / 10, 1e-9)
+        damping[active[~improved]] *= 10
+        iterations[active] += 1
+
+        # A well has converged once an accepted step barely changes its error,
+        # or once the damping is so large that the step has collapsed to zero.
+        converged[accepted[rel_change < tol]] = True
+        converged[active[~improved][damping[active[~improved]] > 1e10]] = True
+
+    return params, sse, converged, iterations
+
+
+def fit_arps_batch(t, q, mask, bounds=PARAM_BOUNDS, max_iter=200, tol=1e-8, chunk_size=5000):
+    """
+    Fits the modified hyperbolic Arps model to many wells at once.
+
+    Parameters:
+        t (np.ndarray): Producing days, shape (n_wells, max_points).
+        q (np.ndarray): Rates to fit, same shape as `t`.
+        mask (np.ndarray): Boolean array marking the valid (non-padded) points.
+        bounds (tuple): Lower and upper bounds for (qi, Di, b), as used by `curve_fit`.
+        max_iter (int): Maximum solver iterations per well.
+        tol (float): Relative change in squared error below which a well is converged.
+        chunk_size (int): Number of wells solved together, bounds peak memory.
+
+    Returns:
+        dict: Arrays `qi`, `Di`, `b`, `RMSE`, `n_points`, `converged` and `iterations`,
+        one entry per well. Wells with fewer than three points are left as NaN.
+    """
+    t = np.asarray(t, dtype=float)
+    q = np.asarray(q, dtype=float)
+    mask = np.asarray(mask, dtype=bool)
+    lower = np.asarray(bounds[0], dtype=float)
+    upper = np.asarray(bounds[1], dtype=float)
+
+    n_wells = len(t)
+    n_points = mask.sum(axis=1)
+    params = np.full((n_wells, 3), np.nan)
+    rmse = np.full(n_wells, np.nan)
+    converged = np.zeros(n_wells, dtype=bool)
+    iterations = np.zeros(n_wells, dtype=int)
+
+    # Proceed only for wells with at least three data points, same rule as the dashboard
+    fittable = np.flatnonzero(n_points >= 3)
+    for start in range(0, len(fittable), chunk_size):
+        idx = fittable[start:start + chunk_size]
+        width = int(n_points[idx].max())
+        chunk_params, chunk_sse, chunk_conv, chunk_iter = _fit_chunk(
+            t[idx, :width], q[idx, :width], mask[idx, :width], lower, upper, max_iter, tol
+        )
+        params[idx] = chunk_params
+        rmse[idx] = np.sqrt(chunk_sse / n_points[idx])
+        converged[idx] = chunk_conv
+        iterations[idx] = chunk_iter
+
+    return {
+        "qi": params[:, 0],
+        "Di": params[:, 1],
+        "b": params[:, 2],
+        "RMSE": rmse,
+        "n_points": n_points,
+        "converged": converged,
+        "iterations": iterations,
+    }
+
+
+def parameter_covariance(t, q, mask, qi, Di, b):
+    """
+    Approximate covariance of fitted (qi, Di, b) for many wells, s^2 (J^T J)^-1 at the solution.
+
+    This is the same estimate `curve_fit` returns as `pcov`. Wells with three or fewer
+    points have no residual degrees of freedom and get NaN.
+
+    Parameters:
+        t, q, mask (np.ndarray): Padded arrays as passed to `fit_arps_batch`.
+        qi, Di, b (np.ndarray): Fitted parameters per well.
+
+    Returns:
+        np.ndarray: Covariance matrices, shape (n_wells, 3, 3).
+    """
+    t = np.asarray(t, dtype=float)
+    q = np.asarray(q, dtype=float)
+    mask = np.asarray(mask, dtype=bool)
+    params = np.column_stack([qi, Di, b]).astype(float)
+
+    q_model, jac = _model_and_jacobian(t, params)
+    residuals = np.where(mask, q_model - q, 0.0)
+    jac = jac * mask[..., None]
+    dof = mask.sum(axis=1) - 3
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s2 = np.sum(residuals**2, axis=1) / dof
+    jtj = np.einsum("nli,nlj->nij", jac, jac)
+    # pinv copes with wells whose parameters sit on a bound and leave J^T J singular
+    covariance = np.linalg.pinv(np.nan_to_num(jtj)) * s2[:, None, None]
+    covariance[(dof <= 0) | np.isnan(params).any(axis=1)] = np.nan
+    return covariance
+
+
+def fit_arps_wells(df, well_col="current_well_name", time_col="producing_days", rate_col="rolling_oil_mean",
+                   bounds=PARAM_BOUNDS, **solver_kwargs):
+    """
+    Fits every well in a long production table and returns a parameter table.
+
+    Parameters:
+        df (pd.DataFrame): Production data with one row per well and month.
+        well_col (str): Column identifying the well.
+        time_col (str): Column with producing days.
+        rate_col (str): Column with the rate to fit.
+        bounds (tuple): Lower and upper bounds for (qi, Di, b).
+        **solver_kwargs: Passed through to `fit_arps_batch`.
+
+    Returns:
+        pd.DataFrame: One row per well with qi, Di, b, RMSE, n_points, converged and iterations.
+    """
+    wells, t, q, mask = pad_wells(df, well_col, time_col, rate_col)
+    result = fit_arps_batch(t, q, mask, bounds=bounds, **solver_kwargs)
+    param_df = pd.DataFrame(result)
+    param_df.insert(0, well_col, wells)
+    return param_df
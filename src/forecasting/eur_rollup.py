@@ -0,0 +1,288 @@
+"""
+Fleet-wide EUR and remaining reserves from fitted Arps parameters.
+
+Every active well is forecast with the modified hyperbolic decline: the fitted
+hyperbolic curve until its instantaneous decline falls to the terminal decline
+`Df`, then exponential at `Df`, until the rate drops below the economic limit or
+the forecast horizon ends. Monthly volumes come from the closed-form cumulative of
+each segment, so they are exact for the curve rather than rate x 30.
+
+Wells are processed in chunks of a fixed size, so memory stays bounded at
+(chunk size x months) regardless of the number of wells. Results are written as
+Parquet: per-well EUR, the monthly forecast volumes, and totals by field and operator.
+
+Usage:
+    python src/forecasting/eur_rollup.py --out data/processed/eur
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_store import UNKNOWN_PARTITION
+from decline_curves import _MIN_B
+from schema import fillna_category
+
+# Terminal decline from the dashboard (Df_constant), a nominal decline per 30-day month.
+# Fitted Di values are per producing day, so it is divided by DAYS_PER_MONTH before use.
+DF_CONSTANT = 0.005687923
+DAYS_PER_MONTH = 30
+
+DEFAULT_ECONOMIC_LIMIT = 5.0  # bbl/d
+DEFAULT_MONTHS = 600
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_OUTPUT_DIR = "data/processed/eur"
+
+# Below this b the hyperbolic terms overflow, the exponential limit is used instead
+_EXPONENTIAL_B = 1e-3
+
+
+def switch_time(Di, b, Df):
+    """
+    Returns the producing day at which the hyperbolic decline reaches `Df`.
+
+    The instantaneous decline of the hyperbolic curve is Di / (1 + b * Di * t), so the
+    switch happens at t = (Di / Df - 1) / (b * Di). Wells that already decline slower
+    than Df switch (to exponential at Di) immediately.
+    """
+    Di = np.asarray(Di, dtype=float)
+    b = np.maximum(np.asarray(b, dtype=float), _MIN_B)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_switch = (Di / Df - 1.0) / (b * Di)
+    return np.where(Di > Df, t_switch, 0.0)
+
+
+def _hyperbolic_rate(t, qi, Di, b):
+    """Hyperbolic rate at day t, exponential for b close to 0."""
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        hyperbolic = qi / (1.0 + b * Di * t) ** (1.0 / b)
+        exponential = qi * np.exp(-Di * t)
+    return np.where(b < _EXPONENTIAL_B, exponential, hyperbolic)
+
+
+def _hyperbolic_cumulative(t, qi, Di, b):
+    """Closed-form cumulative volume of the hyperbolic curve from day 0 to day t."""
+    u = 1.0 + b * Di * t
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        general = qi / ((1.0 - b) * Di) * (1.0 - u ** (1.0 - 1.0 / b))
+        harmonic = qi / Di * np.log(u)
+        exponential = qi / Di * (1.0 - np.exp(-Di * t))
+    cumulative = np.where(np.abs(b - 1.0) < 1e-6, harmonic, general)
+    cumulative = np.where(b < _EXPONENTIAL_B, exponential, cumulative)
+    # A well with no decline produces at qi throughout
+    return np.where(Di > 0, cumulative, qi * t)
+
+
+def modified_hyperbolic_rate(t, qi, Di, b, Df):
+    """
+    Modified hyperbolic rate: hyperbolic until the decline reaches Df, exponential after.
+
+    Parameters:
+        t (np.ndarray): Producing days, broadcastable against the parameters.
+        qi, Di, b (np.ndarray): Arps parameters (Di per day).
+        Df (float): Terminal decline per day.
+
+    Returns:
+        np.ndarray: Daily rate at t.
+    """
+    b = np.maximum(b, _MIN_B)
+    t_switch = switch_time(Di, b, Df)
+    D_exp = np.where(Di > Df, Df, Di)
+    q_switch = _hyperbolic_rate(t_switch, qi, Di, b)
+    hyperbolic = _hyperbolic_rate(np.minimum(t, t_switch), qi, Di, b)
+    return np.where(t < t_switch, hyperbolic, q_switch * np.exp(-D_exp * np.maximum(t - t_switch, 0.0)))
+
+
+def modified_hyperbolic_cumulative(t, qi, Di, b, Df):
+    """
+    Cumulative volume of the modified hyperbolic curve from day 0 to day t.
+
+    Parameters are as for `modified_hyperbolic_rate`.
+
+    Returns:
+        np.ndarray: Cumulative volume at t.
+    """
+    b = np.maximum(b, _MIN_B)
+    t_switch = switch_time(Di, b, Df)
+    D_exp = np.where(Di > Df, Df, Di)
+    q_switch = _hyperbolic_rate(t_switch, qi, Di, b)
+    before = _hyperbolic_cumulative(np.minimum(t, t_switch), qi, Di, b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tail = np.where(D_exp > 0, q_switch / D_exp * (1.0 - np.exp(-D_exp * np.maximum(t - t_switch, 0.0))),
+                        q_switch * np.maximum(t - t_switch, 0.0))
+    return before + tail
+
+
+def forecast_chunk(qi, Di, b, t_start, Df=DF_CONSTANT / DAYS_PER_MONTH, economic_limit=DEFAULT_ECONOMIC_LIMIT,
+                   months=DEFAULT_MONTHS):
+    """
+    Monthly forecast volumes for a chunk of wells.
+
+    Parameters:
+        qi, Di, b (np.ndarray): Arps parameters per well, shape (n_wells,).
+        t_start (np.ndarray): Producing day the forecast starts from (last production), shape (n_wells,).
+        Df (float): Terminal decline per day.
+        economic_limit (float): Rate (bbl/d) below which a well is shut in.
+        months (int): Forecast horizon in 30-day months.
+
+    Returns:
+        tuple: (volumes of shape (n_wells, months), months until the economic limit per well)
+    """
+    qi, Di, b, t_start = (np.asarray(x, dtype=float)[:, None] for x in (qi, Di, b, t_start))
+    edges = t_start + DAYS_PER_MONTH * np.arange(months + 1)[None, :]
+
+    cumulative = modified_hyperbolic_cumulative(edges, qi, Di, b, Df)
+    volumes = np.diff(cumulative, axis=1)
+
+    # A month is produced only if the well is still above the limit when it starts
+    start_rates = modified_hyperbolic_rate(edges[:, :-1], qi, Di, b, Df)
+    economic = start_rates >= economic_limit
+    # Once below the limit a well stays shut in, even if the curve would not say so
+    economic = np.logical_and.accumulate(economic, axis=1)
+    volumes = np.where(economic, volumes, 0.0)
+    return np.nan_to_num(volumes), economic.sum(axis=1)
+
+
+def summarize_wells(df, well_col="current_well_name"):
+    """
+    Per-well attributes needed for the roll-up.
+
+    Returns:
+        pd.DataFrame: field, current_operator, last producing day and cumulative oil to date per well.
+    """
+    return df.groupby(well_col, sort=False).agg(
+        field=('field', 'first'),
+        current_operator=('current_operator', 'first'),
+        last_producing_day=('producing_days', 'max'),
+        cum_oil_to_date=('cumulative_oil_bbls', 'max'),
+    ).reset_index()
+
+
+def compute_eur(param_df, well_df, out_dir=DEFAULT_OUTPUT_DIR, well_col="current_well_name",
+                Df=DF_CONSTANT / DAYS_PER_MONTH, economic_limit=DEFAULT_ECONOMIC_LIMIT,
+                months=DEFAULT_MONTHS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Forecasts every well in chunks and writes EUR, monthly volumes and roll-ups to Parquet.
+
+    Parameters:
+        param_df (pd.DataFrame): Fitted qi, Di, b per well (from `fit_arps_wells` or `fit_wells_cached`).
+        well_df (pd.DataFrame): Output of `summarize_wells`.
+        out_dir (str): Output directory.
+        well_col (str): Column identifying the well.
+        Df (float): Terminal decline per day.
+        economic_limit (float): Rate (bbl/d) below which a well is shut in.
+        months (int): Forecast horizon in 30-day months.
+        chunk_size (int): Wells forecast at a time.
+
+    Returns:
+        dict: DataFrames "wells", "field" and "operator" (the monthly volumes are only written to disk).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    wells = well_df.merge(param_df[[well_col, 'qi', 'Di', 'b']], on=well_col, how='inner')
+    wells = wells.dropna(subset=['qi', 'Di', 'b', 'last_producing_day']).reset_index(drop=True)
+    # Roll-up keys must not be missing, wells without a field or operator are grouped together
+    for col in ('field', 'current_operator'):
+        wells[col] = fillna_category(wells[col], UNKNOWN_PARTITION)
+
+    field_codes, fields = pd.factorize(wells['field'])
+    operator_codes, operators = pd.factorize(wells['current_operator'])
+    field_monthly = np.zeros((len(fields), months))
+    operator_monthly = np.zeros((len(operators), months))
+    remaining = np.zeros(len(wells))
+    economic_months = np.zeros(len(wells), dtype=int)
+
+    monthly_path = os.path.join(out_dir, "monthly_volumes.parquet")
+    writer = None
+    try:
+        for start in range(0, len(wells), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            volumes, n_months = forecast_chunk(
+                wells['qi'].to_numpy()[chunk], wells['Di'].to_numpy()[chunk], wells['b'].to_numpy()[chunk],
+                wells['last_producing_day'].to_numpy()[chunk], Df, economic_limit, months,
+            )
+            remaining[chunk] = volumes.sum(axis=1)
+            economic_months[chunk] = n_months
+            np.add.at(field_monthly, field_codes[chunk], volumes)
+            np.add.at(operator_monthly, operator_codes[chunk], volumes)
+
+            # Long table of the producing months only
+            rows, cols = np.nonzero(volumes)
+            table = pa.table({
+                well_col: wells[well_col].to_numpy()[chunk][rows].astype(str),
+                'forecast_month': (cols + 1).astype(np.int16),
+                'oil_bbls': volumes[rows, cols],
+            })
+            if writer is None:
+                writer = pq.ParquetWriter(monthly_path, table.schema)
+            writer.write_table(table)
+            print(f"Forecast {min(start + chunk_size, len(wells))} of {len(wells)} wells")
+    finally:
+        if writer is not None:
+            writer.close()
+
+    wells['remaining_reserves'] = remaining
+    wells['months_to_economic_limit'] = economic_months
+    wells['eur'] = wells['cum_oil_to_date'].fillna(0) + remaining
+    wells.to_parquet(os.path.join(out_dir, "wells.parquet"), index=False)
+
+    results = {"wells": wells}
+    for name, codes, labels, monthly in (("field", field_codes, fields, field_monthly),
+                                         ("current_operator", operator_codes, operators, operator_monthly)):
+        rollup = wells.groupby(name, observed=True).agg(
+            wells=(well_col, 'count'),
+            cum_oil_to_date=('cum_oil_to_date', 'sum'),
+            remaining_reserves=('remaining_reserves', 'sum'),
+            eur=('eur', 'sum'),
+        ).reset_index()
+        key = "operator" if name == "current_operator" else name
+        rollup.to_parquet(os.path.join(out_dir, f"{key}_rollup.parquet"), index=False)
+
+        monthly_df = pd.DataFrame(monthly, columns=np.arange(1, months + 1))
+        monthly_df.insert(0, name, np.asarray(labels))
+        monthly_df = monthly_df.melt(id_vars=name, var_name='forecast_month', value_name='oil_bbls')
+        monthly_df.to_parquet(os.path.join(out_dir, f"{key}_monthly.parquet"), index=False)
+        results[key] = rollup
+    return results
+
+
+def load_rollup(level="field", out_dir=DEFAULT_OUTPUT_DIR):
+    """Reads a precomputed roll-up ("field", "operator" or "wells"), or None if it has not been computed."""
+    path = os.path.join(out_dir, f"{level}_rollup.parquet" if level != "wells" else "wells.parquet")
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+
+def main():
+    from arps_cache import DEFAULT_CACHE_PATH, ArpsParamCache, fit_wells_cached
+    from data_store import DEFAULT_STORE_PATH, ensure_store, load_daily
+
+    parser = argparse.ArgumentParser(description="Compute EUR and remaining reserves for every active well.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Parquet store of the processed dataset.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite Arps parameter cache.")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_DIR, help="Output directory for the Parquet files.")
+    parser.add_argument("--df", type=float, default=DF_CONSTANT, help="Terminal decline per 30-day month.")
+    parser.add_argument("--economic-limit", type=float, default=DEFAULT_ECONOMIC_LIMIT, help="Economic limit (bbl/d).")
+    parser.add_argument("--months", type=int, default=DEFAULT_MONTHS, help="Forecast horizon in months.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Wells forecast at a time.")
+    args = parser.parse_args()
+
+    ensure_store(args.store)
+    daily_df = load_daily(root=args.store, filters=[("well_status", "==", "A")])
+    daily_df = daily_df.rename(columns={'y': 'daily_oil_rate'})
+    daily_df = daily_df[daily_df['daily_oil_rate'].notna()].copy()
+    daily_df['rolling_oil_mean'] = daily_df['rolling_oil_mean'].fillna(daily_df['daily_oil_rate'])
+
+    # Fits are reused from the parameter cache, only changed wells are refit
+    param_df = fit_wells_cached(daily_df, ArpsParamCache(args.cache))
+    results = compute_eur(param_df, summarize_wells(daily_df), args.out, Df=args.df / DAYS_PER_MONTH,
+                          economic_limit=args.economic_limit, months=args.months, chunk_size=args.chunk_size)
+
+    totals = results["field"][['remaining_reserves', 'eur']].sum()
+    print(f"{len(results['wells'])} wells: remaining reserves {totals['remaining_reserves']:,.0f} bbls, "
+          f"EUR {totals['eur']:,.0f} bbls. Results in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
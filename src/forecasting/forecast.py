@@ -0,0 +1,292 @@
+"""
+Headless Arps fits and forecasts for every active well, without Streamlit.
+
+The dashboard fits one well with `curve_fit` when it is selected. This script fits
+and forecasts all active wells (or one field's) ahead of time: the wells are split
+into chunks that a process pool fits with the same `curve_fit` call (`fit_arps_curve`),
+or with the faster batched solver from decline_curves.py (`--solver batch`), and each
+well's history plus a 6-month horizon is forecast with `arps_forecast`, the same
+curve the dashboard draws. Everything is written to one Parquet file with a
+row per well and time point, carrying the well's parameters, RMSE, covariance and
+the fit key of its production history. The dashboard reads the parameters from this
+file and only fits wells that are missing or whose history has changed since.
+
+Usage:
+    python src/forecasting/forecast.py --workers 8
+    python src/forecasting/forecast.py --field SANISH --out data/processed/forecasts.parquet
+"""
+import argparse
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from scipy.optimize import curve_fit
+
+from arps_cache import fit_key
+from data_store import DEFAULT_STORE_PATH, ensure_store, load_daily
+from decline_curves import (PARAM_BOUNDS, arps_forecast, fit_arps_batch, mod_hyperbolic_arps, pad_wells,
+                            parameter_covariance)
+
+DEFAULT_OUTPUT_PATH = "data/processed/forecasts.parquet"
+DEFAULT_CHUNK_SIZE = 1000
+# Forecast 6 months past the last production date, in days
+DEFAULT_HORIZON_DAYS = 6 * 30
+DAYS_PER_MONTH = 30
+SOLVERS = ("curve_fit", "batch")
+WELL_KEYS = ["field", "current_well_name"]
+PARAM_COLS = ["qi", "Di", "b", "RMSE", "n_points", "converged", "fit_key", "covariance"]
+
+FORECAST_SCHEMA = pa.schema([
+    ("field", pa.string()),
+    ("current_well_name", pa.string()),
+    ("producing_days", pa.float64()),
+    ("forecast_rate", pa.float64()),
+    ("is_forecast", pa.bool_()),
+    ("qi", pa.float64()),
+    ("Di", pa.float64()),
+    ("b", pa.float64()),
+    ("RMSE", pa.float64()),
+    ("n_points", pa.int32()),
+    ("converged", pa.bool_()),
+    ("fit_key", pa.string()),
+    # Row-major 3x3 covariance of (qi, Di, b), null where it could not be estimated
+    ("covariance", pa.list_(pa.float64())),
+])
+
+
+def load_active_wells(field=None, root=DEFAULT_STORE_PATH):
+    """
+    Loads the rows the dashboard fits: active wells, months with an oil rate, and the
+    rolling oil mean filled with the daily rate where it is missing.
+
+    Parameters:
+        field (str, optional): Only load this field.
+        root (str): Parquet store of the processed dataset.
+
+    Returns:
+        pd.DataFrame: Daily-rate projection with `daily_oil_rate` in place of `y`.
+    """
+    daily_df = load_daily(field, root=root, filters=[("well_status", "==", "A")])
+    daily_df = daily_df.rename(columns={'y': 'daily_oil_rate'})
+    daily_df = daily_df[daily_df['daily_oil_rate'].notna()].copy()
+    daily_df['rolling_oil_mean'] = daily_df['rolling_oil_mean'].fillna(daily_df['daily_oil_rate'])
+    return daily_df
+
+
+def forecast_time_points(producing_days, horizon_days=DEFAULT_HORIZON_DAYS):
+    """
+    Time points of a well's history plus monthly points up to the forecast horizon.
+
+    Parameters:
+        producing_days (np.ndarray): Producing days of the well's history.
+        horizon_days (int): Days forecast past the last producing day.
+
+    Returns:
+        np.ndarray: History days followed by the forecast days.
+    """
+    last_day = producing_days.max()
+    additional_time_points = np.arange(last_day + DAYS_PER_MONTH, last_day + horizon_days + 1, DAYS_PER_MONTH)
+    return np.concatenate([producing_days, additional_time_points])
+
+
+def fit_arps_curve(time, rate, bounds=PARAM_BOUNDS):
+    """
+    Fits one well with `curve_fit`, the dashboard's best fit.
+
+    Parameters:
+        time (np.ndarray): Producing days.
+        rate (np.ndarray): Rates to fit (rolling_oil_mean).
+        bounds (tuple): Lower and upper bounds for (qi, Di, b).
+
+    Returns:
+        dict: qi, Di, b, RMSE, covariance (3x3 nested list or None) and fitted. Wells with
+        fewer than three points, or where the fit did not converge, get the dashboard's
+        starting values and fitted False.
+    """
+    # Proceed only if there are at least three data points
+    if len(time) < 3:
+        return {'qi': 0.0, 'Di': 0.0, 'b': 0.0, 'RMSE': None, 'covariance': None, 'fitted': False}
+    try:
+        params, covariance = curve_fit(mod_hyperbolic_arps, time, rate, bounds=bounds)
+    except RuntimeError:
+        return {'qi': 500, 'Di': 0.01, 'b': 0.5, 'RMSE': None, 'covariance': None, 'fitted': False}
+    qi_est, Di_est, b_est = params
+    # Calculate RMSE of the fitted model
+    rmse = np.sqrt(np.mean((rate - mod_hyperbolic_arps(time, *params)) ** 2))
+    covariance = covariance.tolist() if np.isfinite(covariance).all() else None
+    return {'qi': float(qi_est), 'Di': float(Di_est), 'b': float(b_est), 'RMSE': float(rmse),
+            'covariance': covariance, 'fitted': True}
+
+
+def _batch_fits(data, bounds):
+    """`fit_arps_curve` results of every well_key in `data` from the batched solver, with its converged flag."""
+    wells, t, q, mask = pad_wells(data, "well_key", "producing_days", "rolling_oil_mean")
+    result = fit_arps_batch(t, q, mask, bounds=bounds)
+    covariance = parameter_covariance(t, q, mask, result["qi"], result["Di"], result["b"])
+    fits = {}
+    for i, well in enumerate(wells):
+        params = [float(result[name][i]) for name in ("qi", "Di", "b")]
+        fitted = bool(np.isfinite(params).all())
+        fits[well] = {'qi': params[0], 'Di': params[1], 'b': params[2], 'RMSE': float(result["RMSE"][i]),
+                      'covariance': covariance[i].tolist() if np.isfinite(covariance[i]).all() else None,
+                      'fitted': fitted, 'converged': bool(result["converged"][i])}
+    return fits
+
+
+def forecast_wells(daily_df, horizon_days=DEFAULT_HORIZON_DAYS, bounds=PARAM_BOUNDS, solver="curve_fit"):
+    """
+    Fits and forecasts a set of wells.
+
+    Parameters:
+        daily_df (pd.DataFrame): Rows of whole wells, see `load_active_wells`.
+        horizon_days (int): Days forecast past each well's last producing day.
+        bounds (tuple): Lower and upper bounds for (qi, Di, b).
+        solver (str): "curve_fit" fits each well as the dashboard does, "batch" fits all
+            of them at once with `fit_arps_batch`, which is faster but can settle on a
+            different fit for short or noisy wells.
+
+    Returns:
+        pd.DataFrame: One row per well and time point with the columns of FORECAST_SCHEMA.
+        Wells with fewer than three points, or whose fit failed, are left out. Batch fits
+        that stopped before converging are kept with converged False, and the dashboard
+        refits those wells itself.
+    """
+    if solver not in SOLVERS:
+        raise ValueError(f"solver must be one of {SOLVERS}")
+    data = daily_df[WELL_KEYS + ['producing_days', 'rolling_oil_mean']].copy()
+    for col in WELL_KEYS:
+        data[col] = data[col].astype(str)
+    # Same row order as the dashboard's well index, so the fit keys match
+    data = data.sort_values(WELL_KEYS + ['producing_days'], kind="mergesort")
+    data['well_key'] = pd.factorize(pd.MultiIndex.from_frame(data[WELL_KEYS]), sort=False)[0]
+    batch_fits = _batch_fits(data, bounds) if solver == "batch" else {}
+
+    frames = []
+    for well, group in data.groupby("well_key", sort=False):
+        time = group['producing_days'].to_numpy(dtype=float)
+        rate = group['rolling_oil_mean'].to_numpy(dtype=float)
+        fit = batch_fits.get(well) if solver == "batch" else fit_arps_curve(time, rate, bounds)
+        if fit is None or not fit['fitted']:
+            continue
+        time_points = forecast_time_points(time, horizon_days)
+        # b at its lower bound makes arps_forecast divide by zero, it is drawn flat as in the dashboard
+        with np.errstate(divide="ignore"):
+            forecast_rate = arps_forecast(time_points, *np.array([fit['qi'], fit['Di'], fit['b']]))
+        covariance = np.ravel(fit['covariance']).tolist() if fit['covariance'] is not None else None
+        frames.append(pd.DataFrame({
+            "field": group['field'].iloc[0],
+            "current_well_name": group['current_well_name'].iloc[0],
+            "producing_days": time_points,
+            "forecast_rate": forecast_rate,
+            "is_forecast": np.arange(len(time_points)) >= len(time),
+            "qi": fit['qi'],
+            "Di": fit['Di'],
+            "b": fit['b'],
+            "RMSE": fit['RMSE'],
+            "n_points": len(time),
+            # curve_fit raises instead of returning a fit that did not converge
+            "converged": fit.get('converged', fit['fitted']),
+            "fit_key": fit_key(time, rate, bounds),
+            "covariance": [covariance] * len(time_points),
+        }))
+    if not frames:
+        return FORECAST_SCHEMA.empty_table().to_pandas()
+    return pd.concat(frames, ignore_index=True)
+
+
+def _forecast_chunk(task):
+    daily_df, horizon_days, solver = task
+    with warnings.catch_warnings():
+        # curve_fit warns for every well whose covariance cannot be estimated
+        warnings.simplefilter("ignore")
+        return forecast_wells(daily_df, horizon_days, solver=solver)
+
+
+def forecast_all_wells(daily_df, out_path=DEFAULT_OUTPUT_PATH, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                       horizon_days=DEFAULT_HORIZON_DAYS, solver="curve_fit"):
+    """
+    Fits and forecasts every well in chunks on a process pool and writes one Parquet file.
+
+    Parameters:
+        daily_df (pd.DataFrame): Rows of the wells to forecast, see `load_active_wells`.
+        out_path (str): Output Parquet file, replaced if it exists.
+        workers (int, optional): Worker processes, defaults to the number of cores. 1 runs in this process.
+        chunk_size (int): Wells per pool task.
+        horizon_days (int): Days forecast past each well's last producing day.
+        solver (str): "curve_fit" or "batch", see `forecast_wells`.
+
+    Returns:
+        dict: Number of wells, forecast wells and rows written.
+    """
+    codes = pd.factorize(pd.MultiIndex.from_frame(daily_df[WELL_KEYS].astype(str)), sort=False)[0]
+    n_wells = int(codes.max()) + 1 if len(codes) else 0
+    tasks = [(daily_df[(codes >= start) & (codes < start + chunk_size)], horizon_days, solver)
+             for start in range(0, n_wells, chunk_size)]
+    print(f"Forecasting {n_wells} wells in {len(tasks)} chunks.")
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    rows = 0
+    forecast_count = 0
+    with pq.ParquetWriter(out_path, FORECAST_SCHEMA) as writer:
+        if workers == 1 or len(tasks) <= 1:
+            results = map(_forecast_chunk, tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_forecast_chunk, tasks)
+        try:
+            for done, chunk_df in enumerate(results, start=1):
+                writer.write_table(pa.Table.from_pandas(chunk_df, schema=FORECAST_SCHEMA, preserve_index=False))
+                rows += len(chunk_df)
+                forecast_count += chunk_df[WELL_KEYS].drop_duplicates().shape[0]
+                print(f"Forecast chunk {done} of {len(tasks)}")
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    return {"wells": n_wells, "forecast_wells": forecast_count, "rows": rows}
+
+
+def load_well_parameters(field=None, path=DEFAULT_OUTPUT_PATH):
+    """
+    Reads the precomputed parameters of each well.
+
+    Parameters:
+        field (str, optional): Only read this field's wells.
+        path (str): Forecast file written by this script.
+
+    Returns:
+        pd.DataFrame or None: One row per well with WELL_KEYS and PARAM_COLS, None if the
+        forecasts have not been computed.
+    """
+    if not os.path.exists(path):
+        return None
+    filters = [("field", "==", field)] if field is not None else None
+    param_df = pd.read_parquet(path, columns=WELL_KEYS + PARAM_COLS, filters=filters)
+    return param_df.drop_duplicates(WELL_KEYS).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit and forecast every active well without the dashboard.")
+    parser.add_argument("--field", default=None, help="Only forecast this field's wells.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Parquet store of the processed dataset.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to the number of cores.")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Wells per pool task.")
+    parser.add_argument("--horizon-days", type=int, default=DEFAULT_HORIZON_DAYS,
+                        help="Days forecast past each well's last production.")
+    parser.add_argument("--solver", choices=SOLVERS, default="curve_fit",
+                        help="curve_fit per well as the dashboard does, or the faster batched solver.")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_PATH, help="Output Parquet file.")
+    args = parser.parse_args()
+
+    ensure_store(args.store)
+    daily_df = load_active_wells(args.field, args.store)
+    result = forecast_all_wells(daily_df, args.out, args.workers, args.chunk_size, args.horizon_days, args.solver)
+    print(f"Forecast {result['forecast_wells']} of {result['wells']} wells, {result['rows']} rows written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Parallel per-well training of Prophet and ARIMA models.
+
+Each well is trained in a process pool worker. Workers are replaced after a fixed
+number of wells, run under an address-space cap, and abort any well that exceeds
+a time limit, so one pathological well cannot stall or exhaust the run. Fitted
+models and their forecasts are written to disk per well as soon as they finish,
+and a SQLite manifest records a hash of each well's training data. An interrupted
+run picks up where it stopped, and an incremental run only refits wells whose
+history changed (e.g. a new month was added).
+
+Layout under the model directory:
+    <kind>/models/<well_id>.json|.pkl     fitted model
+    <kind>/forecasts/<well_id>.parquet    forecast (ds, trend, yhat, yhat_lower, yhat_upper, ...)
+    model_manifest.sqlite
+
+Usage:
+    python src/forecasting/model_farm.py --kind prophet --workers 8 --timeout 120
+    python src/forecasting/model_farm.py --kind arima --full
+"""
+import argparse
+import datetime
+import glob
+import hashlib
+import logging
+import os
+import signal
+import sqlite3
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows, workers then run without a memory cap
+    resource = None
+
+DEFAULT_MODEL_DIR = "data/models"
+DEFAULT_FORECAST_PERIODS = 6  # Prophet, months past the last production date
+DEFAULT_ARIMA_ORDER = (1, 1, 1)
+DEFAULT_ARIMA_STEPS = 12
+MODEL_KINDS = ("prophet", "arima")
+
+
+def well_name(well_id):
+    """File and manifest name of a well id, e.g. 18406.0 -> "18406"."""
+    if isinstance(well_id, (float, np.floating)) and float(well_id).is_integer():
+        well_id = int(well_id)
+    return str(well_id)
+
+
+def data_hash(ds, y):
+    """Hash of a well's training data, used to detect wells whose history changed."""
+    digest = hashlib.sha256()
+    # Nanoseconds whatever unit the store reads back in, so the hash only changes with the data
+    digest.update(np.asarray(pd.to_datetime(ds).astype("datetime64[ns]").astype("int64"), dtype=np.int64).tobytes())
+    digest.update(np.asarray(y, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class ModelManifest:
+    """SQLite record of trained models per (kind, well)."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS models (
+                kind TEXT,
+                well_id TEXT,
+                data_hash TEXT,
+                last_month TEXT,
+                n_points INTEGER,
+                status TEXT,
+                error TEXT,
+                seconds REAL,
+                trained TEXT,
+                PRIMARY KEY (kind, well_id)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def records(self, kind):
+        """Returns a dict of well id -> manifest record for one model kind."""
+        cursor = self.conn.execute("SELECT * FROM models WHERE kind = ?", (kind,))
+        columns = [col[0] for col in cursor.description]
+        return {row[1]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    def record(self, kind, well_id, data_hash, last_month, n_points, status, error=None, seconds=None):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, well_name(well_id), data_hash, last_month, n_points, status, error, seconds,
+             datetime.datetime.now().isoformat(timespec="seconds")),
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def model_path(kind, well_id, model_dir=DEFAULT_MODEL_DIR):
+    extension = "json" if kind == "prophet" else "pkl"
+    return os.path.join(model_dir, kind, "models", f"{well_name(well_id)}.{extension}")
+
+
+def forecast_path(kind, well_id, model_dir=DEFAULT_MODEL_DIR):
+    return os.path.join(model_dir, kind, "forecasts", f"{well_name(well_id)}.parquet")
+
+
+def fit_prophet(ds, y, periods=DEFAULT_FORECAST_PERIODS):
+    """
+    Fits a Prophet model to one well, with the settings used in the data exploration notebook.
+
+    Returns:
+        tuple: (fitted model, forecast DataFrame including `periods` future month ends)
+    """
+    from prophet import Prophet
+
+    history = pd.DataFrame({"ds": pd.to_datetime(ds), "y": y})
+    model = Prophet(daily_seasonality=False, yearly_seasonality=False, weekly_seasonality=False)
+    model.fit(history)
+    future = model.make_future_dataframe(periods=periods, freq='ME')
+    return model, model.predict(future)
+
+
+def fit_arima(ds, y, order=DEFAULT_ARIMA_ORDER, steps=DEFAULT_ARIMA_STEPS):
+    """
+    Fits an ARIMA model to one well, with the settings used in the model bakeoff notebook.
+
+    Returns:
+        tuple: (fitted results, DataFrame of in-sample fitted values and `steps` forecast months as ds/yhat)
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+
+    series = pd.Series(np.asarray(y, dtype=float), index=pd.DatetimeIndex(pd.to_datetime(ds)))
+    fitted_model = ARIMA(series, order=order, enforce_stationarity=False, enforce_invertibility=False).fit()
+    forecast = fitted_model.forecast(steps=steps)
+    future_ds = pd.date_range(start=series.index[-1], periods=steps + 1, freq='ME')[1:]
+    forecast_df = pd.DataFrame({
+        "ds": np.concatenate([series.index.values, future_ds.values]),
+        "yhat": np.concatenate([np.asarray(fitted_model.fittedvalues), np.asarray(forecast)]),
+    })
+    return fitted_model, forecast_df
+
+
+def save_model(kind, model, path):
+    """Serializes a fitted model, written to a temporary file and renamed into place."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    if kind == "prophet":
+        from prophet.serialize import model_to_json
+        with open(tmp_path, "w") as f:
+            f.write(model_to_json(model))
+    else:
+        model.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_model(kind, well_id, model_dir=DEFAULT_MODEL_DIR):
+    """Loads a fitted Prophet model or ARIMA results object from the model directory."""
+    path = model_path(kind, well_id, model_dir)
+    if kind == "prophet":
+        from prophet.serialize import model_from_json
+        with open(path) as f:
+            return model_from_json(f.read())
+    from statsmodels.tsa.arima.model import ARIMAResults
+    return ARIMAResults.load(path)
+
+
+def load_forecasts(kind, model_dir=DEFAULT_MODEL_DIR, columns=None, wells=None):
+    """
+    Reads the saved forecasts of every well into one table.
+
+    Parameters:
+        kind (str): "prophet" or "arima".
+        model_dir (str): Model directory.
+        columns (list, optional): Forecast columns to keep, e.g. ['ds', 'trend', 'yhat', 'yhat_lower', 'yhat_upper'].
+        wells (iterable, optional): Only read these wells' forecasts.
+
+    Returns:
+        pd.DataFrame: Forecasts with a `well_id` column.
+    """
+    if wells is None:
+        paths = sorted(glob.glob(os.path.join(model_dir, kind, "forecasts", "*.parquet")))
+    else:
+        paths = [path for path in (forecast_path(kind, well, model_dir) for well in wells) if os.path.exists(path)]
+    if not paths:
+        return pd.DataFrame()
+    read_columns = None if columns is None else ["well_id"] + [col for col in columns if col != "well_id"]
+    return pd.concat([pd.read_parquet(path, columns=read_columns) for path in paths], ignore_index=True)
+
+
+class WellTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise WellTimeout()
+
+
+def init_worker(memory_mb=None):
+    """Caps the worker's address space and silences the Prophet/Stan progress logging."""
+    if memory_mb and resource is not None:
+        limit = int(memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    logging.getLogger("prophet").setLevel(logging.WARNING)
+    # statsmodels warns about the inferred month-end frequency on every well
+    warnings.filterwarnings("ignore", category=UserWarning, module="statsmodels")
+
+
+def train_well(task):
+    """
+    Pool task: fits, saves and forecasts one well.
+
+    Parameters:
+        task (tuple): (kind, well_id, ds, y, model_dir, timeout, options)
+
+    Returns:
+        dict: well_id, status ("ok", "timeout", "memory" or "failed"), error and seconds.
+    """
+    kind, well_id, ds, y, model_dir, timeout, options = task
+    start = time.perf_counter()
+    # SIGALRM only exists on POSIX and only works in the worker's main thread
+    use_alarm = timeout and hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(int(timeout))
+    try:
+        if kind == "prophet":
+            model, forecast = fit_prophet(ds, y, **options)
+        else:
+            model, forecast = fit_arima(ds, y, **options)
+        save_model(kind, model, model_path(kind, well_id, model_dir))
+
+        path = forecast_path(kind, well_id, model_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        forecast.insert(0, "well_id", well_id)
+        forecast.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        status, error = "ok", None
+    except WellTimeout:
+        status, error = "timeout", f"exceeded {timeout} s"
+    except MemoryError:
+        status, error = "memory", "exceeded the worker memory cap"
+    except Exception as e:
+        status, error = "failed", str(e)
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+    return {"well_id": well_id, "status": status, "error": error, "seconds": time.perf_counter() - start}
+
+
+def train_wells(df, kind="prophet", well_col="well_id", ds_col="ds", y_col="y", model_dir=DEFAULT_MODEL_DIR,
+                workers=None, timeout=300, memory_mb=None, max_tasks_per_child=50, incremental=True,
+                crash_retries=1, **options):
+    """
+    Trains one model per well in a process pool.
+
+    Parameters:
+        df (pd.DataFrame): Long table with one row per well and month.
+        kind (str): "prophet" or "arima".
+        well_col (str): Column identifying the well.
+        ds_col (str): Date column.
+        y_col (str): Target column (daily oil rate).
+        model_dir (str): Where models, forecasts and the manifest are written.
+        workers (int, optional): Worker processes, defaults to the number of cores.
+        timeout (int): Seconds allowed per well.
+        memory_mb (int, optional): Address-space cap per worker process.
+        max_tasks_per_child (int): Wells a worker trains before it is replaced.
+        incremental (bool): Skip wells whose training data is unchanged since their last successful fit.
+        crash_retries (int): Times a well whose worker process died is retried on its own
+            before it is recorded as failed.
+        **options: Passed to `fit_prophet` or `fit_arima` (e.g. periods, order, steps).
+
+    Returns:
+        pd.DataFrame: One row per trained or skipped well with status, error and seconds.
+    """
+    if kind not in MODEL_KINDS:
+        raise ValueError(f"kind must be one of {MODEL_KINDS}")
+
+    manifest = ModelManifest(os.path.join(model_dir, "model_manifest.sqlite"))
+    records = manifest.records(kind)
+
+    data = df[[well_col, ds_col, y_col]].dropna().sort_values([well_col, ds_col], kind="stable")
+    tasks = {}
+    meta = {}
+    skipped = []
+    for well_id, group in data.groupby(well_col, sort=False):
+        ds = pd.to_datetime(group[ds_col]).to_numpy()
+        y = group[y_col].to_numpy(dtype=float)
+        # Prophet and ARIMA(1,1,1) both need a few points to fit
+        if len(y) < 3:
+            continue
+        well_hash = data_hash(ds, y)
+        meta[well_id] = (well_hash, str(pd.Timestamp(ds[-1]).to_period("M")), len(y))
+        record = records.get(well_name(well_id))
+        if incremental and record and record["status"] == "ok" and record["data_hash"] == well_hash \
+                and os.path.exists(forecast_path(kind, well_id, model_dir)):
+            skipped.append({well_col: well_id, "status": "skipped", "error": None, "seconds": 0.0})
+            continue
+        tasks[well_id] = (kind, well_id, ds, y, model_dir, timeout, options)
+
+    print(f"Training {kind} for {len(tasks)} wells, {len(skipped)} unchanged wells skipped.")
+    results = []
+    pending = dict(tasks)
+    # Wells that were in flight when a worker died. A dead worker breaks the whole pool, so
+    # these are retried one per pool to find the well that caused it, the others just rerun.
+    suspects = []
+    crashes = {}
+    n_workers = workers or os.cpu_count() or 1
+
+    def finish(well_id, result):
+        pending.pop(well_id, None)
+        well_hash, last_month, n_points = meta[well_id]
+        manifest.record(kind, well_id, well_hash, last_month, n_points, result["status"],
+                        result["error"], result["seconds"])
+        results.append({well_col: well_id, **{k: v for k, v in result.items() if k != "well_id"}})
+        if result["status"] != "ok":
+            print(f"Could not model well {well_id}: {result['status']} ({result['error']})")
+        if len(results) % 100 == 0:
+            print(f"Trained {len(results)} of {len(tasks)} wells")
+
+    try:
+        while pending:
+            isolated = suspects.pop(0) if suspects else None
+            queue = [isolated] if isolated is not None else list(pending)
+            with ProcessPoolExecutor(max_workers=1 if isolated is not None else workers, initializer=init_worker,
+                                     initargs=(memory_mb,), max_tasks_per_child=max_tasks_per_child) as executor:
+                # Only a few wells per worker are submitted at a time, so a crash breaks few of them
+                in_flight = {}
+                broken = False
+                while (queue or in_flight) and not broken:
+                    while queue and len(in_flight) < 2 * n_workers:
+                        try:
+                            in_flight[executor.submit(train_well, pending[queue[0]])] = queue[0]
+                        except BrokenProcessPool:
+                            # The pool broke before this well was handed to it, it reruns normally
+                            broken = not in_flight
+                            break
+                        queue.pop(0)
+                    if broken:
+                        break
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        well_id = in_flight.pop(future)
+                        try:
+                            finish(well_id, future.result())
+                        except BrokenProcessPool:
+                            # A worker was killed (e.g. by the OS for memory); the pool cannot be reused
+                            broken = True
+                            if isolated is None:
+                                suspects.append(well_id)
+                                continue
+                            crashes[well_id] = crashes.get(well_id, 0) + 1
+                            if crashes[well_id] <= crash_retries:
+                                suspects.append(well_id)
+                            else:
+                                finish(well_id, {"well_id": well_id, "status": "failed",
+                                                 "error": "worker process died", "seconds": None})
+                if broken and isolated is None:
+                    suspects.extend(in_flight.values())
+                    print(f"A worker process died, retrying {len(suspects)} wells one at a time")
+    finally:
+        manifest.close()
+
+    report = pd.DataFrame(results + skipped)
+    if not report.empty:
+        print(f"Model status: {report['status'].value_counts().to_dict()}")
+    return report
+
+
+def main():
+    from data_store import DEFAULT_STORE_PATH, ensure_store, load_daily
+
+    parser = argparse.ArgumentParser(description="Train per-well Prophet or ARIMA models in parallel.")
+    parser.add_argument("--kind", choices=MODEL_KINDS, default="prophet")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Parquet store of the processed dataset.")
+    parser.add_argument("--field", default=None, help="Only train wells in this field.")
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to all cores.")
+    parser.add_argument("--timeout", type=int, default=300, help="Seconds allowed per well.")
+    parser.add_argument("--memory-mb", type=int, default=None, help="Address-space cap per worker.")
+    parser.add_argument("--max-tasks-per-child", type=int, default=50)
+    parser.add_argument("--crash-retries", type=int, default=1,
+                        help="Retries of a well whose worker process died before it is marked failed.")
+    parser.add_argument("--full", action="store_true", help="Retrain every well, even if unchanged.")
+    parser.add_argument("--out", default=None, help="Optional Parquet file of all forecasts.")
+    args = parser.parse_args()
+
+    ensure_store(args.store)
+    daily_df = load_daily(args.field, root=args.store, columns=["well_id", "ds", "y"])
+    train_wells(daily_df, args.kind, model_dir=args.model_dir, workers=args.workers, timeout=args.timeout,
+                memory_mb=args.memory_mb, max_tasks_per_child=args.max_tasks_per_child, incremental=not args.full,
+                crash_retries=args.crash_retries)
+
+    if args.out:
+        columns = ['ds', 'trend', 'yhat', 'yhat_lower', 'yhat_upper'] if args.kind == "prophet" else ['ds', 'yhat']
+        load_forecasts(args.kind, args.model_dir, columns).to_parquet(args.out, index=False)
+        print(f"Forecasts written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Motif search across wells and a nearest-neighbour index of analog wells.
+
+The model bakeoff notebook concatenates every well's first 720 days into one series
+and runs `stumpy.stump`, so subsequences that straddle two wells show up as motifs and
+the cost grows with the square of the total length. Here subsequences never cross a
+well boundary: every window of `m` months is z-normalized, and the distance between
+two wells is the smallest z-normalized Euclidean distance between any of their windows
+(the minimum of their AB-join matrix profile). Distances come from blocked matrix
+products over all windows at once, with blocks of wells spread across processes.
+
+The result is persisted as a top-k table (well -> similar wells, distances and the
+window offsets that matched) plus the normalized windows, so looking up analogs for a
+new well is one matrix product against the stored windows instead of a recomputation.
+
+Usage:
+    python src/forecasting/motifs.py --workers 8 --k 10
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOW = 12  # months, rows are monthly so 720 days leave about 24 points per well
+DEFAULT_MAX_DAYS = 720
+DEFAULT_K = 10
+DEFAULT_INDEX_DIR = "data/processed/motifs"
+DEFAULT_BLOCK_ELEMENTS = 32_000_000  # correlations held in memory per block, about 128 MB in float32
+_STD_EPS = 1e-8
+
+# Windows of all wells, set once per worker process by `_init_worker`
+_worker_windows = None
+_worker_starts = None
+_worker_offsets = None
+
+
+def znormalized_windows(series, m):
+    """
+    Sliding windows of a series, z-normalized and scaled to unit length.
+
+    The dot product of two such windows is their Pearson correlation, and the
+    z-normalized Euclidean distance is sqrt(2 * m * (1 - correlation)). Flat windows
+    are left as zeros, so they have correlation 0 with everything.
+
+    Returns:
+        np.ndarray: Windows of shape (len(series) - m + 1, m) in float32.
+    """
+    series = np.asarray(series, dtype=float)
+    if len(series) < m:
+        return np.empty((0, m), dtype=np.float32)
+    windows = np.lib.stride_tricks.sliding_window_view(series, m)
+    centered = windows - windows.mean(axis=1, keepdims=True)
+    std = windows.std(axis=1, keepdims=True)
+    scaled = np.divide(centered, std * np.sqrt(m), out=np.zeros_like(centered), where=std > _STD_EPS)
+    return scaled.astype(np.float32)
+
+
+def well_windows(daily_df, m=DEFAULT_WINDOW, max_days=DEFAULT_MAX_DAYS, well_col="current_well_name",
+                 time_col="producing_days", rate_col="rolling_oil_mean"):
+    """
+    Z-normalized windows of every well's early production, without crossing wells.
+
+    Parameters:
+        daily_df (pd.DataFrame): Long table with one row per well and month.
+        m (int): Window length in rows.
+        max_days (int): Only the first `max_days` producing days of each well are used.
+
+    Returns:
+        tuple: (wells, starts, windows, offsets) where the windows of wells[i] are
+        windows[starts[i]:starts[i + 1]] and offsets hold each window's first row within its well.
+        Wells with fewer than `m` rows are left out.
+    """
+    data = daily_df.loc[daily_df[time_col] <= max_days, [well_col, time_col, rate_col]].dropna()
+    data = data.sort_values([well_col, time_col], kind="stable")
+    series = data[rate_col].to_numpy(dtype=float)
+    labels, wells = pd.factorize(data[well_col], sort=False)
+    counts = np.bincount(labels, minlength=len(wells))
+    row_starts = np.concatenate([[0], np.cumsum(counts)])
+
+    # Windows over the concatenated series, keeping only those that end inside their own well
+    windows = znormalized_windows(series, m)
+    positions = np.arange(len(windows))
+    inside = positions + m <= row_starts[labels[:len(windows)] + 1]
+    windows, positions = windows[inside], positions[inside]
+    window_labels = labels[positions]
+
+    keep = counts >= m
+    remap = np.cumsum(keep) - 1
+    starts = np.concatenate([[0], np.cumsum(np.bincount(remap[window_labels], minlength=keep.sum()))])
+    offsets = positions - row_starts[window_labels]
+    return np.asarray(wells)[keep], starts, windows, offsets
+
+
+def _init_worker(windows, starts, offsets):
+    global _worker_windows, _worker_starts, _worker_offsets
+    _worker_windows, _worker_starts, _worker_offsets = windows, starts, offsets
+
+
+def _join_block(task):
+    """
+    Top-k analogs of a block of consecutive wells against every well.
+
+    Returns:
+        tuple: (first well of the block, neighbours, correlations, offsets and neighbour
+        offsets), each of shape (n_block, k) and sorted from the closest neighbour.
+    """
+    first, last, k = task
+    windows, starts, offsets = _worker_windows, _worker_starts, _worker_offsets
+    row_starts = starts[first:last] - starts[first]
+    corr = windows[starts[first]:starts[last]] @ windows.T
+
+    # Best match of each block well against every window, then against every well,
+    # so windows are never compared across well boundaries
+    best_windows = np.maximum.reduceat(corr, row_starts, axis=0)
+    best = np.maximum.reduceat(best_windows, starts[:-1], axis=1)
+    block = np.arange(last - first)
+    best[block, first + block] = -np.inf  # not its own analog
+
+    nearest = np.argpartition(-best, k - 1, axis=1)[:, :k]
+    nearest = np.take_along_axis(nearest, np.argsort(-np.take_along_axis(best, nearest, axis=1), axis=1,
+                                                     kind="stable"), axis=1)
+    best_corr = np.take_along_axis(best, nearest, axis=1)
+
+    # Windows where each pair matches best
+    well_offsets = np.empty_like(nearest)
+    neighbor_offsets = np.empty_like(nearest)
+    for i in block:
+        rows = slice(starts[first + i] - starts[first], starts[first + i + 1] - starts[first])
+        for j, neighbor in enumerate(nearest[i]):
+            column = starts[neighbor] + int(np.argmax(best_windows[i, starts[neighbor]:starts[neighbor + 1]]))
+            well_offsets[i, j] = offsets[starts[first] + rows.start + int(np.argmax(corr[rows, column]))]
+            neighbor_offsets[i, j] = offsets[column]
+    return first, nearest, best_corr, well_offsets, neighbor_offsets
+
+
+def top_k_neighbors(wells, starts, windows, offsets, m=DEFAULT_WINDOW, k=DEFAULT_K, workers=None,
+                    block_elements=DEFAULT_BLOCK_ELEMENTS):
+    """
+    The k most similar wells of every well by AB-join distance.
+
+    Parameters:
+        wells, starts, windows, offsets: Output of `well_windows`.
+        m (int): Window length the windows were built with.
+        k (int): Neighbours kept per well.
+        workers (int, optional): Worker processes, 1 runs in this process.
+        block_elements (int): Correlations computed per block, bounds memory per worker.
+
+    Returns:
+        pd.DataFrame: well, rank, neighbor, distance, offset and neighbor_offset.
+    """
+    columns = ["well", "rank", "neighbor", "distance", "offset", "neighbor_offset"]
+    n_wells = len(wells)
+    k = min(k, n_wells - 1)
+    if k <= 0:
+        return pd.DataFrame(columns=columns)
+
+    # Blocks of consecutive wells with about `block_elements` correlations each
+    rows_per_block = max(1, block_elements // max(len(windows), 1))
+    boundaries = [0]
+    while boundaries[-1] < n_wells:
+        target = starts[boundaries[-1]] + rows_per_block
+        boundaries.append(max(boundaries[-1] + 1, min(n_wells, int(np.searchsorted(starts, target, side="right")) - 1)))
+    tasks = [(first, last, k) for first, last in zip(boundaries[:-1], boundaries[1:])]
+    print(f"Joining {len(windows)} windows of {n_wells} wells in {len(tasks)} blocks.")
+
+    if workers == 1 or len(tasks) <= 1:
+        _init_worker(windows, starts, offsets)
+        results = list(map(_join_block, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(windows, starts, offsets)) as executor:
+            results = list(executor.map(_join_block, tasks))
+
+    nearest = np.concatenate([result[1] for result in results])
+    best_corr = np.concatenate([result[2] for result in results]).astype(float)
+    return pd.DataFrame({
+        "well": np.repeat(wells, k),
+        "rank": np.tile(np.arange(1, k + 1), n_wells),
+        "neighbor": np.asarray(wells)[nearest.ravel()],
+        "distance": np.sqrt(np.clip(2 * m * (1 - best_corr.ravel()), 0, None)),
+        "offset": np.concatenate([result[3] for result in results]).ravel(),
+        "neighbor_offset": np.concatenate([result[4] for result in results]).ravel(),
+    }, columns=columns)
+
+
+def build_index(daily_df, out_dir=DEFAULT_INDEX_DIR, m=DEFAULT_WINDOW, max_days=DEFAULT_MAX_DAYS, k=DEFAULT_K,
+                workers=None, well_col="current_well_name", time_col="producing_days", rate_col="rolling_oil_mean"):
+    """
+    Builds and saves the analog-well index.
+
+    Writes `neighbors.parquet` (top-k table) and `windows.npz` (normalized windows and
+    their wells) to `out_dir`.
+
+    Returns:
+        MotifIndex: The saved index.
+    """
+    wells, starts, windows, offsets = well_windows(daily_df, m, max_days, well_col, time_col, rate_col)
+    neighbors = top_k_neighbors(wells, starts, windows, offsets, m=m, k=k, workers=workers)
+
+    os.makedirs(out_dir, exist_ok=True)
+    neighbors.to_parquet(os.path.join(out_dir, "neighbors.parquet"), index=False)
+    np.savez(os.path.join(out_dir, "windows.npz"), wells=np.asarray(wells, dtype=str), starts=starts,
+             windows=windows, offsets=offsets, m=m, max_days=max_days)
+    print(f"Saved top-{k} analogs of {len(wells)} wells to {out_dir}")
+    return MotifIndex(out_dir)
+
+
+class MotifIndex:
+    """Saved analog-well index, see `build_index`."""
+
+    def __init__(self, path=DEFAULT_INDEX_DIR):
+        self.path = path
+        self.neighbors_df = pd.read_parquet(os.path.join(path, "neighbors.parquet"))
+        stored = np.load(os.path.join(path, "windows.npz"))
+        self.wells = stored["wells"]
+        self.starts = stored["starts"]
+        self.windows = stored["windows"]
+        self.offsets = stored["offsets"]
+        self.m = int(stored["m"])
+        self.max_days = int(stored["max_days"])
+
+    def neighbors(self, well, k=None):
+        """
+        Analogs of an indexed well, closest first.
+
+        Returns:
+            pd.DataFrame: rank, neighbor, distance, offset and neighbor_offset.
+        """
+        rows = self.neighbors_df[self.neighbors_df["well"] == well]
+        if k is not None:
+            rows = rows[rows["rank"] <= k]
+        return rows.drop(columns="well").reset_index(drop=True)
+
+    def query(self, series, k=DEFAULT_K, exclude=None):
+        """
+        Analogs of a well that is not in the index, from its early rates.
+
+        Parameters:
+            series (array-like): The well's rates (e.g. rolling_oil_mean) in time order,
+                limited to the first `max_days` producing days like the index.
+            k (int): Analogs to return.
+            exclude (str, optional): Well name to leave out, e.g. the well itself.
+
+        Returns:
+            pd.DataFrame: rank, neighbor, distance, offset and neighbor_offset. Empty when
+            the series is shorter than the window.
+        """
+        rows = znormalized_windows(series, self.m)
+        if len(rows) == 0:
+            return pd.DataFrame(columns=["rank", "neighbor", "distance", "offset", "neighbor_offset"])
+        corr = rows @ self.windows.T
+        best_row = corr.argmax(axis=0)
+        best_window = corr.max(axis=0)
+        best = np.maximum.reduceat(best_window, self.starts[:-1])
+        if exclude is not None:
+            best[self.wells == exclude] = -np.inf
+        nearest = np.argsort(-best, kind="stable")[:k]
+
+        result = []
+        for rank, neighbor in enumerate(nearest, 1):
+            window = self.starts[neighbor] + int(np.argmax(best_window[self.starts[neighbor]:self.starts[neighbor + 1]]))
+            result.append({
+                "rank": rank,
+                "neighbor": self.wells[neighbor],
+                "distance": float(np.sqrt(max(2 * self.m * (1 - best[neighbor]), 0))),
+                "offset": int(best_row[window]),
+                "neighbor_offset": int(self.offsets[window]),
+            })
+        return pd.DataFrame(result)
+
+
+def main():
+    from data_store import DEFAULT_STORE_PATH, ensure_store, load_daily
+
+    parser = argparse.ArgumentParser(description="Build the analog-well index from per-well motif search.")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Parquet store of the processed dataset.")
+    parser.add_argument("--field", default=None, help="Only index wells in this field.")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Window length in months.")
+    parser.add_argument("--max-days", type=int, default=DEFAULT_MAX_DAYS, help="Producing days used per well.")
+    parser.add_argument("--k", type=int, default=DEFAULT_K, help="Analogs kept per well.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to all cores.")
+    parser.add_argument("--out", default=DEFAULT_INDEX_DIR, help="Directory for the index.")
+    args = parser.parse_args()
+
+    ensure_store(args.store)
+    daily_df = load_daily(args.field, root=args.store, filters=[("well_status", "==", "A")])
+    daily_df = daily_df.rename(columns={'y': 'daily_oil_rate'})
+    daily_df['rolling_oil_mean'] = daily_df['rolling_oil_mean'].fillna(daily_df['daily_oil_rate'])
+    build_index(daily_df, args.out, m=args.window, max_days=args.max_days, k=args.k, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
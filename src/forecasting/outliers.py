@@ -0,0 +1,326 @@
+"""
+Rolling outlier detection for every well in one streaming pass.
+
+The data exploration notebook flags `is_outlier` when a month's daily oil rate falls
+outside the rolling mean +/- `std_acceptable_window` rolling standard deviations,
+with the rolling statistics recomputed per well through a groupby. Here every well
+keeps a ring buffer of its last `window` rates and a sliding Welford mean and sum of
+squares, and each step pushes one month into all wells at once. The statistics are
+kept, so a new `std_acceptable_window` is only a comparison, and new monthly rows are
+pushed into the saved state of their wells instead of rescanning their history.
+
+Usage:
+    python src/forecasting/outliers.py --std-window 3
+    python src/forecasting/outliers.py --append data/raw/new_production_rows.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WINDOW = 12
+DEFAULT_STD_ACCEPTABLE_WINDOW = 3
+DEFAULT_PRODUCTION_CSV = "data/raw/ndic_production_data.csv"
+DEFAULT_STATE_PATH = "data/processed/outlier_state.npz"
+DEFAULT_OUTPUT_PATH = "data/processed/outliers.parquet"
+
+
+class OutlierEngine:
+    """
+    Rolling mean/std and outlier flags of many wells, updated one month at a time.
+
+    Rows of a well are pushed in time order. Like `rolling(window, center=True)` in the
+    notebook, a row's statistics cover the `window` rows around it within its well and
+    are missing if any of them is missing or not finite, or the well has too few rows.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, center=True):
+        self.window = window
+        self.center = center
+        self.wells = pd.Index([])
+        # Per-well ring buffer and sliding Welford state
+        self.ring = np.full((0, window), np.nan)
+        self.head = np.zeros(0, dtype=np.int64)
+        self.n_rows = np.zeros(0, dtype=np.int64)
+        self.n_valid = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.last_time = None
+        # Per-row history in arrival order, stats of the trailing window ending at the row
+        self.row_well = np.zeros(0, dtype=np.int64)
+        self.row_position = np.zeros(0, dtype=np.int64)
+        self.row_time = None
+        self.row_value = np.zeros(0)
+        self.row_mean = np.zeros(0)
+        self.row_std = np.zeros(0)
+
+    @property
+    def shift(self):
+        """Rows between a row and the end of the window its statistics are taken from."""
+        return (self.window - 1) // 2 if self.center else 0
+
+    def _add_wells(self, new_wells, time_dtype):
+        n_new = len(new_wells)
+        self.wells = self.wells.append(pd.Index(new_wells))
+        self.ring = np.vstack([self.ring, np.full((n_new, self.window), np.nan)])
+        self.head = np.concatenate([self.head, np.zeros(n_new, dtype=np.int64)])
+        self.n_rows = np.concatenate([self.n_rows, np.zeros(n_new, dtype=np.int64)])
+        self.n_valid = np.concatenate([self.n_valid, np.zeros(n_new, dtype=np.int64)])
+        self.mean = np.concatenate([self.mean, np.zeros(n_new)])
+        self.m2 = np.concatenate([self.m2, np.zeros(n_new)])
+        missing_time = np.full(n_new, np.datetime64("NaT") if time_dtype.kind == "M" else np.nan, dtype=time_dtype)
+        self.last_time = missing_time if self.last_time is None else np.concatenate([self.last_time, missing_time])
+
+    def _push(self, wells, values):
+        """
+        Pushes one value into each of the given wells (no well twice) and returns the
+        mean and std of their trailing windows.
+        """
+        slot = self.head[wells]
+        old = self.ring[wells, slot]
+        mean, m2, n_valid = self.mean[wells], self.m2[wells], self.n_valid[wells]
+
+        # Remove the value leaving the window
+        leaving = np.isfinite(old)
+        n_valid = n_valid - leaving
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = np.where(leaving, old - mean, 0.0)
+            mean = np.where(leaving & (n_valid > 0), mean - delta / n_valid, mean)
+            m2 = np.where(leaving, m2 - delta * (old - mean), m2)
+        mean = np.where(n_valid == 0, 0.0, mean)
+        m2 = np.where(n_valid == 0, 0.0, m2)
+
+        # Add the new value, rates that are missing or infinite count as missing
+        entering = np.isfinite(values)
+        n_valid = n_valid + entering
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = np.where(entering, values - mean, 0.0)
+            mean = np.where(entering, mean + delta / np.maximum(n_valid, 1), mean)
+            m2 = np.where(entering, m2 + delta * (values - mean), m2)
+        # Rounding can leave a tiny negative sum of squares
+        m2 = np.maximum(m2, 0.0)
+
+        self.ring[wells, slot] = np.where(entering, values, np.nan)
+        self.head[wells] = (slot + 1) % self.window
+        self.n_rows[wells] += 1
+        self.mean[wells], self.m2[wells], self.n_valid[wells] = mean, m2, n_valid
+
+        full = n_valid == self.window
+        window_mean = np.where(full, mean, np.nan)
+        window_std = np.where(full, np.sqrt(m2 / (self.window - 1)), np.nan) if self.window > 1 \
+            else np.full(len(wells), np.nan)
+        return window_mean, window_std
+
+    def append(self, wells, times, values):
+        """
+        Pushes new rows, which must come after the rows already seen of their wells.
+
+        Parameters:
+            wells (array-like): Well of every row.
+            times (array-like): Producing days or dates, used for ordering.
+            values (array-like): Rate of every row.
+
+        Returns:
+            pd.DataFrame: Rows whose statistics changed (the new rows and the rows up to
+            `(window - 1) // 2` before them), as returned by `frame`.
+        """
+        wells = np.asarray(wells)
+        times = np.asarray(times)
+        values = np.asarray(values, dtype=float)
+        if len(wells) == 0:
+            return self.frame().iloc[:0]
+
+        # Map wells to state rows, creating state for wells not seen before
+        well_ids = self.wells.get_indexer(wells)
+        new_wells = pd.unique(wells[well_ids < 0])
+        if len(new_wells):
+            self._add_wells(new_wells, times.dtype)
+            well_ids = self.wells.get_indexer(wells)
+
+        # Order the new rows by well and time, then number them within their well
+        order = np.lexsort((times, well_ids))
+        well_ids, times, values = well_ids[order], times[order], values[order]
+        changes = np.flatnonzero(well_ids[1:] != well_ids[:-1]) + 1
+        starts = np.concatenate([[0], changes])
+        ends = np.concatenate([changes, [len(well_ids)]]) - 1
+        step = np.arange(len(well_ids)) - np.repeat(starts, ends - starts + 1)
+
+        first_time = times[starts]
+        last_time = self.last_time[well_ids[starts]]
+        seen = self.n_rows[well_ids[starts]] > 0
+        if np.any(seen & ~(first_time > last_time)):
+            raise ValueError("New rows must be later than the rows already seen of their well, refit instead.")
+
+        positions = self.n_rows[well_ids] + step
+        row_mean = np.empty(len(well_ids))
+        row_std = np.empty(len(well_ids))
+        # One push per month, across all wells that have a row at that step
+        for k in range(step.max() + 1):
+            rows = np.flatnonzero(step == k)
+            row_mean[rows], row_std[rows] = self._push(well_ids[rows], values[rows])
+        self.last_time[well_ids[ends]] = times[ends]
+
+        # Rows of these wells from `shift` rows before the first new row have new statistics
+        changed_from = np.full(len(self.wells), np.iinfo(np.int64).max)
+        changed_from[well_ids[starts]] = positions[starts] - self.shift
+        self.row_well = np.concatenate([self.row_well, well_ids])
+        self.row_position = np.concatenate([self.row_position, positions])
+        self.row_time = times if self.row_time is None else np.concatenate([self.row_time, times])
+        self.row_value = np.concatenate([self.row_value, values])
+        self.row_mean = np.concatenate([self.row_mean, row_mean])
+        self.row_std = np.concatenate([self.row_std, row_std])
+
+        order = self._sorted()[0]
+        changed = self.row_position[order] >= changed_from[self.row_well[order]]
+        return self.frame()[changed]
+
+    def fit(self, wells, times, values):
+        """Starts over from the given rows, see `append`."""
+        self.__init__(self.window, self.center)
+        self.append(wells, times, values)
+        return self
+
+    def _sorted(self):
+        """Row order by well and position, and the row holding each row's window statistics."""
+        order = np.lexsort((self.row_position, self.row_well))
+        source = np.arange(len(order)) + self.shift
+        in_well = source < len(order)
+        source = np.minimum(source, len(order) - 1)
+        in_well &= self.row_well[order][source] == self.row_well[order]
+        return order, order[source], in_well
+
+    def frame(self, std_acceptable_window=DEFAULT_STD_ACCEPTABLE_WINDOW, wells=None):
+        """
+        Rolling statistics and outlier flags of every row seen.
+
+        Parameters:
+            std_acceptable_window (float): Number of acceptable standard deviations
+                around the rolling mean, the statistics are not recomputed for a new value.
+            wells (list, optional): Only return these wells.
+
+        Returns:
+            pd.DataFrame: One row per row seen, sorted by well and time, with well, position,
+            time, value, rolling_mean, rolling_std and is_outlier.
+        """
+        order, source, in_well = self._sorted()
+        if wells is not None:
+            keep = np.isin(self.row_well[order], self.wells.get_indexer(wells))
+            order, source, in_well = order[keep], source[keep], in_well[keep]
+        rolling_mean = np.where(in_well, self.row_mean[source], np.nan)
+        rolling_std = np.where(in_well, self.row_std[source], np.nan)
+        values = self.row_value[order]
+        return pd.DataFrame({
+            'well': self.wells[self.row_well[order]] if len(order) else pd.Index([]),
+            'position': self.row_position[order],
+            'time': self.row_time[order] if self.row_time is not None else np.zeros(0),
+            'value': values,
+            'rolling_mean': rolling_mean,
+            'rolling_std': rolling_std,
+            'is_outlier': flag_outliers(values, rolling_mean, rolling_std, std_acceptable_window),
+        })
+
+    def save(self, path=DEFAULT_STATE_PATH):
+        """Saves the engine so later runs can append new months."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        wells = self.wells.to_numpy()
+        np.savez(path, window=self.window, center=self.center,
+                 wells=wells.astype(str) if wells.dtype == object else wells,
+                 ring=self.ring, head=self.head, n_rows=self.n_rows, n_valid=self.n_valid, mean=self.mean,
+                 m2=self.m2, last_time=self.last_time, row_well=self.row_well, row_position=self.row_position,
+                 row_time=self.row_time, row_value=self.row_value, row_mean=self.row_mean, row_std=self.row_std)
+
+    @classmethod
+    def load(cls, path=DEFAULT_STATE_PATH):
+        """Loads an engine written by `save`."""
+        with np.load(path) as state:
+            engine = cls(int(state['window']), bool(state['center']))
+            engine.wells = pd.Index(state['wells'])
+            for name in ('ring', 'head', 'n_rows', 'n_valid', 'mean', 'm2', 'last_time', 'row_well',
+                         'row_position', 'row_time', 'row_value', 'row_mean', 'row_std'):
+                setattr(engine, name, state[name])
+        return engine
+
+
+def flag_outliers(values, rolling_mean, rolling_std, std_acceptable_window=DEFAULT_STD_ACCEPTABLE_WINDOW):
+    """True where a value falls outside rolling mean +/- std_acceptable_window rolling stds."""
+    # Avoid division by zero
+    rolling_std = np.where(rolling_std == 0, 1e-10, rolling_std)
+    upper_bound = rolling_mean + std_acceptable_window * rolling_std
+    lower_bound = rolling_mean - std_acceptable_window * rolling_std
+    with np.errstate(invalid="ignore"):
+        return (values > upper_bound) | (values < lower_bound)
+
+
+def rolling_outliers(df, well_col='File Number', time_col='producing_days', value_col='daily_oil_rate',
+                     window=DEFAULT_WINDOW, std_acceptable_window=DEFAULT_STD_ACCEPTABLE_WINDOW, center=True):
+    """
+    Rolling mean, std and outlier flags of every well of a DataFrame.
+
+    Parameters:
+        df (pd.DataFrame): One row per well and month.
+        well_col (str): Column identifying the well.
+        time_col (str): Column the rows of a well are ordered by.
+        value_col (str): Rate to check.
+        window (int): Rolling window in rows.
+        std_acceptable_window (float): Number of acceptable standard deviations.
+        center (bool): Center the window on each row, as in the notebook.
+
+    Returns:
+        tuple: (stats, engine) where stats has rolling_mean, rolling_std and is_outlier
+        aligned to `df.index`, and engine can re-threshold or append new rows.
+    """
+    # Rows already in well/time order keep their order, ties included
+    order = np.lexsort((np.arange(len(df)), df[time_col].to_numpy(), df[well_col].to_numpy()))
+    engine = OutlierEngine(window, center).fit(df[well_col].to_numpy()[order], df[time_col].to_numpy()[order],
+                                               df[value_col].to_numpy(dtype=float)[order])
+    result = engine.frame(std_acceptable_window)
+    # Wells are numbered in order of appearance, so the engine's rows come back in `order`
+    stats = result[['rolling_mean', 'rolling_std', 'is_outlier']].set_axis(df.index[order])
+    return stats.reindex(df.index), engine
+
+
+def read_monthly_rates(path):
+    """Production rows with their daily oil rate, ordered by the production month."""
+    from schema import read_production_csv
+
+    production_df = read_production_csv(path)
+    production_df = production_df.dropna(subset=['File Number', 'Date'])
+    production_df['daily_oil_rate'] = production_df['BBLS Oil'].astype(float) / production_df['Days'].astype(float)
+    return production_df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag rolling-window production outliers for every well.")
+    parser.add_argument("--production", default=DEFAULT_PRODUCTION_CSV, help="Production CSV to fit from.")
+    parser.add_argument("--append", default=None, help="CSV of new monthly rows to push into the saved state.")
+    parser.add_argument("--state", default=DEFAULT_STATE_PATH, help="Saved engine state.")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Rolling window in months.")
+    parser.add_argument("--std-window", type=float, default=DEFAULT_STD_ACCEPTABLE_WINDOW,
+                        help="Acceptable standard deviations around the rolling mean.")
+    parser.add_argument("--out", default=DEFAULT_OUTPUT_PATH, help="Output Parquet file of flags.")
+    args = parser.parse_args()
+
+    if args.append:
+        engine = OutlierEngine.load(args.state)
+        new_rows = read_monthly_rates(args.append)
+        changed = engine.append(new_rows['File Number'].to_numpy(), new_rows['Date'].to_numpy(),
+                                new_rows['daily_oil_rate'].to_numpy())
+        print(f"Appended {len(new_rows)} rows, {len(changed)} rows updated")
+    elif os.path.exists(args.state) and not os.path.exists(args.production):
+        engine = OutlierEngine.load(args.state)
+    else:
+        production_df = read_monthly_rates(args.production)
+        _, engine = rolling_outliers(production_df, time_col='Date', window=args.window)
+        print(f"Fit {len(production_df)} rows of {len(engine.wells)} wells")
+    engine.save(args.state)
+
+    result = engine.frame(args.std_window).rename(columns={'well': 'File Number', 'time': 'Date',
+                                                            'value': 'daily_oil_rate'})
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    result.to_parquet(args.out, index=False)
+    print(f"{int(result['is_outlier'].sum())} outliers at {args.std_window} std, written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Probabilistic decline curve analysis (P10/P50/P90) by Monte Carlo.
+
+Parameter realizations for a well are drawn either from the fit covariance
+(multivariate normal through a square root of the covariance) or by bootstrapping the residuals
+of `rolling_oil_mean` and refitting every resampled history at once with the
+batched solver. All realizations are then evaluated as one NumPy array of shape
+(n_samples, n_times), with no Python loop per sample.
+
+Percentiles follow the reserves convention: P10 is the high case (exceeded with
+10% probability, the 90th percentile) and P90 the low case.
+"""
+import numpy as np
+
+from decline_curves import PARAM_BOUNDS, fit_arps_batch, mod_hyperbolic_arps, parameter_covariance, _MIN_B
+from eur_rollup import (DAYS_PER_MONTH, DEFAULT_CHUNK_SIZE, DEFAULT_ECONOMIC_LIMIT, DEFAULT_MONTHS, DF_CONSTANT,
+                        forecast_chunk, modified_hyperbolic_rate)
+
+DEFAULT_SAMPLES = 2000
+
+
+def sample_from_covariance(params, covariance, n_samples=DEFAULT_SAMPLES, bounds=PARAM_BOUNDS, rng=None):
+    """
+    Draws (qi, Di, b) realizations from a multivariate normal around the fitted parameters.
+
+    Parameters:
+        params (array-like): Fitted (qi, Di, b), shape (3,) or (n_wells, 3).
+        covariance (array-like): Covariance of the fit, shape (3, 3) or (n_wells, 3, 3).
+        n_samples (int): Realizations per well.
+        bounds (tuple): Lower and upper bounds, samples are clipped to them.
+        rng (np.random.Generator, optional): Random generator.
+
+    Returns:
+        np.ndarray: Samples of shape (n_samples, 3), or (n_wells, n_samples, 3) for many wells.
+    """
+    rng = rng or np.random.default_rng()
+    params = np.asarray(params, dtype=float)
+    covariance = np.asarray(covariance, dtype=float)
+    single = params.ndim == 1
+    if single:
+        params, covariance = params[None], covariance[None]
+
+    # Symmetric square root, tolerant of the singular covariances of wells fit on a bound
+    values, vectors = np.linalg.eigh(np.nan_to_num((covariance + np.swapaxes(covariance, 1, 2)) / 2))
+    factor = vectors * np.sqrt(np.clip(values, 0, None))[:, None, :]
+
+    z = rng.standard_normal((len(params), n_samples, 3))
+    samples = params[:, None, :] + np.einsum("nsj,nij->nsi", z, factor)
+    samples = np.clip(samples, np.asarray(bounds[0], dtype=float), np.asarray(bounds[1], dtype=float))
+    return samples[0] if single else samples
+
+
+def sample_from_bootstrap(t, q, params, n_samples=500, bounds=PARAM_BOUNDS, rng=None, **solver_kwargs):
+    """
+    Draws (qi, Di, b) realizations by resampling fit residuals and refitting.
+
+    Every resampled history is refit in one call to the batched solver.
+
+    Parameters:
+        t (array-like): Producing days of the well.
+        q (array-like): Rates the parameters were fit to (e.g. rolling_oil_mean).
+        params (array-like): Fitted (qi, Di, b).
+        n_samples (int): Realizations.
+        bounds (tuple): Lower and upper bounds for the refits.
+        rng (np.random.Generator, optional): Random generator.
+        **solver_kwargs: Passed through to `fit_arps_batch`.
+
+    Returns:
+        np.ndarray: Samples of shape (n_samples, 3). Refits that fail are dropped.
+    """
+    rng = rng or np.random.default_rng()
+    t = np.asarray(t, dtype=float)
+    q = np.asarray(q, dtype=float)
+    fitted = mod_hyperbolic_arps(t, *np.asarray(params, dtype=float))
+    residuals = q - fitted
+
+    resampled = fitted[None, :] + residuals[rng.integers(0, len(t), size=(n_samples, len(t)))]
+    result = fit_arps_batch(np.broadcast_to(t, resampled.shape), np.clip(resampled, 0, None),
+                            np.ones(resampled.shape, dtype=bool), bounds=bounds, **solver_kwargs)
+    samples = np.column_stack([result["qi"], result["Di"], result["b"]])
+    return samples[~np.isnan(samples).any(axis=1)]
+
+
+def simulate_rates(t, samples, Df=None):
+    """
+    Evaluates every realization on a time grid.
+
+    Parameters:
+        t (array-like): Producing days, shape (n_times,).
+        samples (np.ndarray): Parameter realizations, shape (n_samples, 3).
+        Df (float, optional): Terminal decline per day, plain hyperbolic if None.
+
+    Returns:
+        np.ndarray: Rates of shape (n_samples, n_times).
+    """
+    t = np.asarray(t, dtype=float)[None, :]
+    qi, Di, b = (samples[:, i:i + 1] for i in range(3))
+    if Df is not None:
+        return modified_hyperbolic_rate(t, qi, Di, b, Df)
+    return mod_hyperbolic_arps(t, qi, Di, np.maximum(b, _MIN_B))
+
+
+def percentiles(values, axis=0):
+    """
+    Returns the P10 (high), P50 and P90 (low) of realizations along an axis.
+
+    Returns:
+        dict: Arrays "P10", "P50" and "P90".
+    """
+    p90, p50, p10 = np.nanpercentile(values, [10, 50, 90], axis=axis)
+    return {"P10": p10, "P50": p50, "P90": p90}
+
+
+def probabilistic_forecast(t_fit, q_fit, params, covariance=None, t_forecast=None, n_samples=DEFAULT_SAMPLES,
+                           method="covariance", cum_to_date=0.0, Df=DF_CONSTANT / DAYS_PER_MONTH,
+                           economic_limit=DEFAULT_ECONOMIC_LIMIT, months=DEFAULT_MONTHS, seed=None):
+    """
+    P10/P50/P90 rate curves and EUR for one well.
+
+    Parameters:
+        t_fit (array-like): Producing days used in the fit.
+        q_fit (array-like): Rates used in the fit.
+        params (array-like): Fitted (qi, Di, b).
+        covariance (array-like, optional): Fit covariance, required for method="covariance".
+        t_forecast (array-like, optional): Producing days for the rate curves, defaults to `t_fit`.
+        n_samples (int): Monte Carlo realizations.
+        method (str): "covariance" or "bootstrap". Falls back to bootstrap when the
+            covariance is missing or not finite.
+        cum_to_date (float): Oil produced so far, added to each realization's remaining volume.
+        Df (float): Terminal decline per day for the EUR forecast.
+        economic_limit (float): Rate (bbl/d) below which a well is shut in.
+        months (int): EUR forecast horizon in 30-day months.
+        seed (int, optional): Seed for repeatable realizations.
+
+    Returns:
+        dict: "rates" (P10/P50/P90 curves over `t_forecast`), "eur" (P10/P50/P90 EUR),
+        "eur_samples" (EUR per realization) and "method" (the method actually used).
+    """
+    rng = np.random.default_rng(seed)
+    t_fit = np.asarray(t_fit, dtype=float)
+    t_forecast = t_fit if t_forecast is None else np.asarray(t_forecast, dtype=float)
+
+    if method == "covariance" and covariance is not None and np.all(np.isfinite(covariance)):
+        samples = sample_from_covariance(params, covariance, n_samples, rng=rng)
+    else:
+        method = "bootstrap"
+        samples = sample_from_bootstrap(t_fit, q_fit, params, min(n_samples, 500), rng=rng)
+
+    rates = simulate_rates(t_forecast, samples)
+    t_start = np.full(len(samples), t_fit.max())
+    volumes, _ = forecast_chunk(samples[:, 0], samples[:, 1], samples[:, 2], t_start, Df, economic_limit, months)
+    eur_samples = cum_to_date + volumes.sum(axis=1)
+
+    return {"rates": percentiles(rates), "eur": percentiles(eur_samples), "eur_samples": eur_samples,
+            "method": method}
+
+
+def portfolio_eur(eur_samples):
+    """
+    P10/P50/P90 of a group of wells' total EUR.
+
+    Realizations are summed across wells before taking percentiles, so the result is
+    the distribution of the total, not the (too wide) sum of each well's percentiles.
+
+    Parameters:
+        eur_samples (array-like): EUR realizations, shape (n_wells, n_samples).
+
+    Returns:
+        dict: "P10", "P50" and "P90" of the total.
+    """
+    return percentiles(np.sum(eur_samples, axis=0))
+
+
+def field_eur_distribution(t, q, mask, qi, Di, b, cum_to_date, n_samples=1000, Df=DF_CONSTANT / DAYS_PER_MONTH,
+                           economic_limit=DEFAULT_ECONOMIC_LIMIT, months=DEFAULT_MONTHS, seed=None,
+                           chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    EUR realizations for many wells from their fit covariances, for portfolio roll-ups.
+
+    Parameters:
+        t, q, mask (np.ndarray): Padded arrays from `pad_wells`.
+        qi, Di, b (np.ndarray): Fitted parameters per well.
+        cum_to_date (np.ndarray): Oil produced so far per well.
+        n_samples (int): Realizations per well.
+        chunk_size (int): Realizations forecast together (wells x samples), bounds memory like `compute_eur`.
+
+    Returns:
+        np.ndarray: EUR realizations, shape (n_wells, n_samples). Wells without a usable fit are NaN.
+    """
+    rng = np.random.default_rng(seed)
+    params = np.column_stack([qi, Di, b]).astype(float)
+    covariance = parameter_covariance(t, q, mask, qi, Di, b)
+    t_start = np.where(mask, t, -np.inf).max(axis=1)
+    cum_to_date = np.nan_to_num(np.asarray(cum_to_date, dtype=float))
+
+    eur = np.full((len(params), n_samples), np.nan)
+    usable = np.flatnonzero(np.isfinite(params).all(axis=1) & np.isfinite(covariance).all(axis=(1, 2)))
+    wells_per_chunk = max(1, chunk_size // n_samples)
+    for start in range(0, len(usable), wells_per_chunk):
+        idx = usable[start:start + wells_per_chunk]
+        samples = sample_from_covariance(params[idx], covariance[idx], n_samples, rng=rng).reshape(-1, 3)
+        volumes, _ = forecast_chunk(samples[:, 0], samples[:, 1], samples[:, 2],
+                                    np.repeat(t_start[idx], n_samples), Df, economic_limit, months)
+        eur[idx] = cum_to_date[idx, None] + volumes.sum(axis=1).reshape(len(idx), n_samples)
+    return eur
@@ -1,136 +1,135 @@
 # Import necessary Libraries
+import os
+import sys
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from scipy.optimize import curve_fit
-import janitor
-
-# Modified Hyperbolic Arps equation
-# This function models production decline using the hyperbolic decline formula
-def mod_hyperbolic_arps(t, qi, Di, b):
-    return qi / (1 + b * Di * t) ** (1/b)
-# Define the Arps forecast function
-# This function forecasts production using Arps parameters
-def arps_forecast(t, qi, Di, b):
-    
-    time_adjusted = t - np.min(t)
-    return qi * (1 + b * Di * time_adjusted) ** (-1 / b)
-
-# Load processed dataset create during the eda
-df = pd.read_csv("data/processed/final_df.csv")
-df_clean = df.clean_names() # clean column names for consistency
-
-# Select relevant columns for analysis
-daily_cols = ['ndic_file_no', 'api_no', 'well_type', 'well_status',
-       'latitude','longitude', 'current_operator', 'current_well_name', 'total_depth',
-       'field', 'perfs', 'filenumber','well_id','ds', 'producing_days', 'y', 'daily_gas_rate',
-       'daily_water_rate', 'cumulative_oil_bbls', 'cumulative_gas_mcf',
-       'cumulative_wtr_bbls', 'rolling_oil_mean', 'rolling_oil_std',
-       'is_outlier', 'trend', 'yhat', 'yhat_lower', 'yhat_upper']
-
-daily_df = df_clean[daily_cols]
-
-# Filter for wells with status 'A' (active wells)
-daily_df = daily_df.query(
-    "well_status == 'A'"
-)
-
-# Placeholder for Arps parameters
-qi_est = float()  # Initial production rate (qi)
-Di_est = float() # Decline rate (Di)
-b_est = float()  # Hyperbolic exponent (b)
-
-# Rename column 'y' to 'daily_oil_rate' for clarity
-daily_df = daily_df.rename(columns={'y':'daily_oil_rate'})
 
-# Streamlit dashboard title
-st.title('Production Dashboard with Dynamic Arps Parameters')
-
-# Sidebar: Select field and well
-st.sidebar.header("Select Field and Well")
-# Sidebar filters
-selected_field = st.sidebar.radio('Fields', daily_df['field'].unique())
-st.sidebar.markdown("---")
-selected_well = st.sidebar.selectbox(
-    'Wells', sorted(daily_df[daily_df['field']==selected_field]['current_well_name'].unique())
-)
-
-# Filter the DataFrame based on selected field and well
-filtered_df = daily_df[
-    (daily_df['current_well_name'] == selected_well) & 
-    (daily_df['field'] == selected_field) &
-    daily_df['daily_oil_rate'].notna()
-]
-
-# Fill missing rolling oil mean values with daily oil rate
-filtered_df['rolling_oil_mean'] = filtered_df['rolling_oil_mean'].fillna(filtered_df['daily_oil_rate'])
-# Let's perform traditional DCA on selected well
-
-# Parameter bounds, including b factor constraints (e.g., 0 < b <= 1)
-param_bounds = ([0, 0, 0], [np.inf, 15, 1.5])  # qi, Di, and b upper/lower bounds
-rows_list = []
-# Filter the DataFrame for the current well
-well_data = filtered_df.copy()
-
-# Extract Time and rate for curve fitting
-time = well_data['producing_days'].values
-rate = well_data['rolling_oil_mean'].values
-
-# Fit the Arps model to estimate parameters (qi, Di, b)
-if len(time) >= 3:  # Proceed only if there are at least three data points
-    try:
-        params, covariance = curve_fit(mod_hyperbolic_arps, time, rate, bounds=param_bounds)
-        qi_est, Di_est, b_est = params
-        
-        # Calculate the predicted rates using the fitted model and parameters
-        predicted_rates = mod_hyperbolic_arps(time, *params)
-        
-        # Calculate RMSE
-        rmse = np.sqrt(np.mean((rate - predicted_rates) ** 2))
-            
-        # Append the results, including RMSE, to the list                
-        rows_list.append({'current_well_name': selected_well, 'qi': qi_est, 'Di': Di_est, 'b': b_est, 'RMSE': rmse})
-    except RuntimeError:
-        qi_est, Di_est, b_est = 500, 0.01, 0.5 
-
-# Sidebar: Sliders for adjusting Arps parameters
-st.sidebar.header("Arps Parameters")
-qi = st.sidebar.slider("Initial Production Rate (qi)", min_value=0.0, max_value=1000.0, value=float(qi_est), step=10.0)
-Di = st.sidebar.slider("Decline Rate (Di)", min_value=0.0, max_value=1.0, value=float(Di_est)*30, step=0.01)
-b = st.sidebar.slider("b-Factor", min_value=0.0, max_value=1.5, value=float(b_est), step=0.01)
-
-# Reset parameters to best-fit values
-if st.sidebar.button("Reset to Best-Fit Parameters"):
-    qi, Di, b = qi_est, Di_est * 30, b_est
-
-# Convert rows_list directly to DataFrame
-param_df = pd.DataFrame(rows_list)
-
-Df_constant = 0.005687923  
-# Forecast 6 Months past last production date. 
-forecast_df = pd.DataFrame()
-forecast_rows_list = []
-# Generate forecast based on user inputs
+# Arps equations and bounds are shared with the batch fitter
+from decline_curves import arps_forecast, PARAM_BOUNDS
+from arps_cache import ArpsParamCache, fit_key
+from data_store import ensure_store, list_fields, load_daily
+from well_index import ProductionIndex
+from eur_rollup import load_rollup
+from probabilistic_dca import probabilistic_forecast
+from forecast import DEFAULT_OUTPUT_PATH as FORECAST_PATH, fit_arps_curve, forecast_time_points, load_well_parameters
+# Stage timers shared with the data pipeline scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'get_data'))
+from instrumentation import METRICS_PATH_ENV, Metrics, count
+
+# The script reruns on every widget change. Everything that does not depend on the Arps
+# sliders (data, fits, figures) is cached, and the sliders live in a fragment that only
+# reruns the forecast trace and RMSE when they move.
+
+# Forecast 6 Months past last production date.
 forecast_period = 6 * 30  # Forecast 6 months (in days)
-max_ip_day = filtered_df['producing_days'].max()
-additional_time_points = np.arange(max_ip_day + 30, max_ip_day + forecast_period + 1, 30)
-full_time_points = np.concatenate([filtered_df['producing_days'], additional_time_points])
-forecasted_production = arps_forecast(full_time_points, qi, Di/30, b)
-
-# Create a forecast DataFrame
-forecast_df = pd.DataFrame({
-    'current_well_name': selected_well,
-    'producing_days': full_time_points,
-    'ForecastedProduction': forecasted_production
-})
-
-# Dashboard Layout
-col1, col2 = st.columns(2)
+Df_constant = 0.005687923
+
+# On-disk parameter cache shared across dashboard sessions and batch jobs
+@st.cache_resource
+def get_param_cache():
+    return ArpsParamCache()
+
+# Field list for the sidebar, fields with active wells only
+@st.cache_data
+def get_fields():
+    return list_fields(well_status='A')
+
+# Index over one field's active wells, built once per field partition and shared across sessions
+@st.cache_resource
+def get_production_index(field):
+    # Load only the selected field's partition, filtered for wells with status 'A' (active wells)
+    daily_df = load_daily(field, filters=[("well_status", "==", "A")])
+    # Rename column 'y' to 'daily_oil_rate' for clarity
+    daily_df = daily_df.rename(columns={'y':'daily_oil_rate'})
+    return ProductionIndex(daily_df)
+
+# Field EUR and reserves precomputed by eur_rollup.py, None until it has been run
+@st.cache_data
+def get_field_rollup():
+    return load_rollup("field")
+
+# Parameters precomputed by forecast.py, one row per well of the field, None until it has been run.
+# The file's modification time is part of the cache key, so a later run of forecast.py is picked up
+@st.cache_resource
+def load_precomputed_parameters(field, mtime):
+    param_df = load_well_parameters(field, FORECAST_PATH)
+    if param_df is None:
+        return None
+    return {row.current_well_name: row._asdict() for row in param_df.itertuples(index=False)}
+
+def get_precomputed_parameters(field):
+    mtime = os.path.getmtime(FORECAST_PATH) if os.path.exists(FORECAST_PATH) else None
+    return load_precomputed_parameters(field, mtime)
+
+# Rows of the selected well with production, only this well's slice of the index is read
+@st.cache_data
+def get_well_data(field, well):
+    filtered_df = get_production_index(field).well_rows(field, well)
+    filtered_df = filtered_df[filtered_df['daily_oil_rate'].notna()]
+    # Fill missing rolling oil mean values with daily oil rate
+    filtered_df['rolling_oil_mean'] = filtered_df['rolling_oil_mean'].fillna(filtered_df['daily_oil_rate'])
+    return filtered_df
+
+# Best-fit Arps parameters of a well, fit once per well and production history
+@st.cache_data
+def fit_well(field, well):
+    well_data = get_well_data(field, well)
+    # Extract Time and rate for curve fitting
+    time = well_data['producing_days'].to_numpy(dtype=float)
+    rate = well_data['rolling_oil_mean'].to_numpy(dtype=float)
+    # Proceed only if there are at least three data points
+    if len(time) < 3:
+        return {'qi': 0.0, 'Di': 0.0, 'b': 0.0, 'RMSE': None, 'covariance': None, 'fitted': False}
+
+    cache_key = fit_key(time, rate, PARAM_BOUNDS)
+    # Use the batch forecast's fit if it was made from the same production history and converged
+    precomputed = (get_precomputed_parameters(field) or {}).get(str(well))
+    if precomputed is not None and precomputed['fit_key'] == cache_key and precomputed['converged']:
+        covariance = precomputed['covariance']
+        covariance = np.reshape(covariance, (3, 3)).tolist() if covariance is not None else None
+        return {'qi': precomputed['qi'], 'Di': precomputed['Di'], 'b': precomputed['b'],
+                'RMSE': precomputed['RMSE'], 'covariance': covariance, 'fitted': True}
+
+    # Reuse a previous fit if this well's production history has not changed
+    param_cache = get_param_cache()
+    cached_fit = param_cache.get(cache_key)
+    if cached_fit is not None and cached_fit['qi'] is not None:
+        return {'qi': cached_fit['qi'], 'Di': cached_fit['Di'], 'b': cached_fit['b'], 'RMSE': cached_fit['RMSE'],
+                'covariance': cached_fit.get('covariance'), 'fitted': True}
+    # Fit the Arps model to estimate parameters (qi, Di, b)
+    count("fits")
+    best_fit = fit_arps_curve(time, rate, PARAM_BOUNDS)
+    if best_fit['fitted']:
+        param_cache.put(cache_key, {'qi': best_fit['qi'], 'Di': best_fit['Di'], 'b': best_fit['b'],
+                                    'RMSE': best_fit['RMSE'], 'n_points': int(len(time)), 'converged': True,
+                                    'covariance': best_fit['covariance']})
+    return best_fit
+
+# Time points of the well's history plus the 6-month forecast horizon
+@st.cache_data
+def get_forecast_time_points(field, well):
+    producing_days = get_well_data(field, well)['producing_days'].to_numpy(dtype=float)
+    return forecast_time_points(producing_days, forecast_period)
+
+# P10/P50/P90 rate curves and EUR from realizations of the fitted parameters
+@st.cache_data
+def get_uncertainty(field, well):
+    well_data = get_well_data(field, well)
+    best_fit = fit_well(field, well)
+    return probabilistic_forecast(
+        well_data['producing_days'].to_numpy(dtype=float), well_data['rolling_oil_mean'].to_numpy(dtype=float),
+        (best_fit['qi'], best_fit['Di'], best_fit['b']), best_fit['covariance'],
+        t_forecast=get_forecast_time_points(field, well),
+        cum_to_date=float(np.nan_to_num(well_data['cumulative_oil_bbls'].max())), seed=0
+    )
 
-# Left Column: Production Plots
-with col1:
+# Production chart without the Arps forecast, which is the only trace the sliders change
+@st.cache_data
+def get_base_figure(field, well, show_uncertainty):
+    filtered_df = get_well_data(field, well)
     # Daily Oil Chart with Confidence Interval and Arps Forecast
     fig = go.Figure()
 
@@ -154,24 +153,38 @@ with col1:
             line=dict(color='purple', dash='dash', width=2)
         )
     )
-    # Add arps Forecasted Daily Oil Rate Line
-    fig.add_trace(
-        go.Scatter(
-            x=forecast_df['producing_days'],
-            y=forecast_df['ForecastedProduction'],
-            mode='lines',
-            name='Forecasted Daily Oil Rate',
-            line=dict(color='white', dash='dash', width=3)
+    # Add P10/P90 band and P50 of the best fit
+    if show_uncertainty:
+        full_time_points = get_forecast_time_points(field, well)
+        uncertainty = get_uncertainty(field, well)
+        fig.add_trace(
+            go.Scatter(
+                x=list(full_time_points) + list(full_time_points[::-1]),
+                y=list(uncertainty['rates']['P10']) + list(uncertainty['rates']['P90'][::-1]),
+                fill='toself',
+                fillcolor='rgba(0, 191, 255, 0.2)',
+                line=dict(color='rgba(0, 191, 255, 0.0)'),
+                mode='lines',
+                name='Arps P10-P90'
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=full_time_points,
+                y=uncertainty['rates']['P50'],
+                mode='lines',
+                name='Arps P50',
+                line=dict(color='deepskyblue', dash='dot', width=2)
+            )
         )
-    )
     # Add Confidence Interval as Shaded Area
     fig.add_trace(
         go.Scatter(
             x=list(filtered_df['producing_days']) + list(filtered_df['producing_days'][::-1]),  # Combine x for both bounds
-            y=list(filtered_df['yhat_upper']) + list(filtered_df['yhat_lower'][::-1]), 
+            y=list(filtered_df['yhat_upper']) + list(filtered_df['yhat_lower'][::-1]),
             fill='toself',
-            fillcolor='rgba(0, 0, 0, 0.0)', 
-            line=dict(color='rgba(255, 255, 0, 1.0)'),  
+            fillcolor='rgba(0, 0, 0, 0.0)',
+            line=dict(color='rgba(255, 255, 0, 1.0)'),
             mode='lines',
             name='Forecast Confidence Interval'
         )
@@ -191,33 +204,18 @@ with col1:
             bgcolor="rgba(0, 0, 0, 0.5)"
             )
     )
+    return fig
 
-    # Streamlit Plot
-    st.plotly_chart(fig, use_container_width=True)
-    # Add some metrics and charts
-    st.subheader('Daily Production')
-    daily_oil_chart_date = px.line(filtered_df, x='ds', y='daily_oil_rate', color='current_well_name')
-    st.plotly_chart(daily_oil_chart_date, use_container_width=True)
-
-# Add RMSE display
-rmse = np.sqrt(np.mean((rate - arps_forecast(time, qi, Di/30, b)) ** 2))      
-st.sidebar.metric("RMSE", f"{rmse:.2f}")
+# Daily production by date
+@st.cache_data
+def get_daily_chart(field, well):
+    return px.line(get_well_data(field, well), x='ds', y='daily_oil_rate', color='current_well_name')
 
-# Option to download the forecast data
-csv = forecast_df.to_csv(index=False)
-st.download_button(label="Download Forecast Data", data=csv, file_name="forecast.csv", mime="text/csv")
-
-# Right Column: Map Chart
-with col2:
-    # Prepare data for map
-    map_df = daily_df[daily_df['field'] == selected_field]
-    cum_oil_df = map_df.groupby('current_well_name')['cumulative_oil_bbls'].max().reset_index()
-    min_cum = cum_oil_df.cumulative_oil_bbls.min()
-    cum_oil_df['cumulative_oil_bbls'] = cum_oil_df['cumulative_oil_bbls'].fillna(min_cum)    
-    map_df = map_df[['current_well_name','latitude', 'longitude']].drop_duplicates()
-    
-    # Merge the cumulative oil data with the map DataFrame
-    map_df = map_df.merge(cum_oil_df, on='current_well_name', how='left')
+# Map of the field's wells, drawn once per field
+@st.cache_data
+def get_map_figure(field):
+    # Well locations and cumulative oil, precomputed per field by the index
+    map_df = get_production_index(field).map_summary(field)
 
     # Plot map using Plotly Express
     map_fig = px.scatter_mapbox(
@@ -237,7 +235,162 @@ with col2:
         height=800,
         margin={"r": 0, "t": 0, "l": 0, "b": 0}
     )
+    return map_fig
+
+# Slider keys are per well, so switching wells starts from that well's best fit
+def slider_keys(field, well):
+    return tuple(f"{name}_{field}_{well}" for name in ("qi", "Di", "b"))
+
+# Slider (min, max) of qi, Di (per month) and b
+slider_ranges = ((0.0, 1000.0), (0.0, 1.0), (0.0, 1.5))
+
+def reset_to_best_fit(field, well):
+    best_fit = fit_well(field, well)
+    best_values = (best_fit['qi'], best_fit['Di'] * 30, best_fit['b'])
+    for key, value, (low, high) in zip(slider_keys(field, well), best_values, slider_ranges):
+        # Fits outside a slider's range start at its end instead of failing
+        st.session_state[key] = float(np.clip(value, low, high))
+
+# Arps sliders, forecast trace and RMSE. Moving a slider reruns only this function.
+@st.fragment
+def arps_panel(field, well, show_uncertainty, show_timings=False):
+    # Timings of this panel, a slider change reruns it without the rest of the script
+    panel_metrics = Metrics(os.environ.get(METRICS_PATH_ENV))
+    with panel_metrics.timer("fit"):
+        best_fit = fit_well(field, well)
+    qi_key, Di_key, b_key = slider_keys(field, well)
+    if qi_key not in st.session_state:
+        reset_to_best_fit(field, well)
+
+    # Sliders for adjusting Arps parameters
+    st.subheader("Arps Parameters")
+    slider_cols = st.columns(3)
+    (qi_min, qi_max), (Di_min, Di_max), (b_min, b_max) = slider_ranges
+    qi = slider_cols[0].slider("Initial Production Rate (qi)", min_value=qi_min, max_value=qi_max, step=10.0, key=qi_key)
+    Di = slider_cols[1].slider("Decline Rate (Di)", min_value=Di_min, max_value=Di_max, step=0.01, key=Di_key)
+    b = slider_cols[2].slider("b-Factor", min_value=b_min, max_value=b_max, step=0.01, key=b_key)
+
+    # Reset parameters to best-fit values
+    st.button("Reset to Best-Fit Parameters", on_click=reset_to_best_fit, args=(field, well))
+
+    # Generate forecast based on user inputs
+    with panel_metrics.timer("forecast"):
+        full_time_points = get_forecast_time_points(field, well)
+        forecasted_production = arps_forecast(full_time_points, qi, Di/30, b)
+
+    # Create a forecast DataFrame
+    forecast_df = pd.DataFrame({
+        'current_well_name': well,
+        'producing_days': full_time_points,
+        'ForecastedProduction': forecasted_production
+    })
+
+    # Add arps Forecasted Daily Oil Rate Line, st.cache_data hands out a fresh copy of the chart
+    with panel_metrics.timer("plot: production chart"):
+        fig = get_base_figure(field, well, show_uncertainty)
+        fig.add_trace(
+            go.Scatter(
+                x=forecast_df['producing_days'],
+                y=forecast_df['ForecastedProduction'],
+                mode='lines',
+                name='Forecasted Daily Oil Rate',
+                line=dict(color='white', dash='dash', width=3)
+            )
+        )
+        # Streamlit Plot
+        st.plotly_chart(fig, use_container_width=True)
+
+    # Add RMSE display
+    well_data = get_well_data(field, well)
+    time = well_data['producing_days'].to_numpy(dtype=float)
+    rate = well_data['rolling_oil_mean'].to_numpy(dtype=float)
+    rmse = np.sqrt(np.mean((rate - arps_forecast(time, qi, Di/30, b)) ** 2))
+    metric_cols = st.columns(2)
+    metric_cols[0].metric("RMSE", f"{rmse:.2f}")
+    if best_fit['RMSE'] is not None:
+        metric_cols[1].metric("Best-Fit RMSE", f"{best_fit['RMSE']:.2f}")
+
+    # Option to download the forecast data
+    csv = forecast_df.to_csv(index=False)
+    st.download_button(label="Download Forecast Data", data=csv, file_name="forecast.csv", mime="text/csv")
+
+    if show_timings:
+        st.caption("Arps panel: " + ", ".join(f"{row['stage']} {row['total'] * 1000:.1f} ms"
+                                              for row in panel_metrics.summary()))
+
+# Stage timings of a Metrics as a table for the debug panel
+def timings_table(metrics):
+    timings_df = pd.DataFrame(metrics.summary(), columns=['stage', 'calls', 'total', 'max'])
+    timings_df['total'] = timings_df['total'] * 1000
+    timings_df['max'] = timings_df['max'] * 1000
+    return timings_df.rename(columns={'total': 'total (ms)', 'max': 'max (ms)'})
+
+# Timings of this rerun, shown in the debug panel (cache hits take close to 0 ms)
+rerun_metrics = Metrics(os.environ.get(METRICS_PATH_ENV))
+
+# Processed dataset create during the eda, stored as Parquet partitioned by field.
+# The store is built from final_df.csv the first time the dashboard runs.
+with rerun_metrics.timer("load: parquet store"):
+    ensure_store()
+
+# Streamlit dashboard title
+st.title('Production Dashboard with Dynamic Arps Parameters')
+
+# Sidebar: Select field and well
+st.sidebar.header("Select Field and Well")
+# Sidebar filters, only fields with active wells are listed
+with rerun_metrics.timer("load: fields"):
+    fields = get_fields()
+selected_field = st.sidebar.radio('Fields', fields)
+st.sidebar.markdown("---")
+
+# Field totals from the nightly EUR roll-up
+with rerun_metrics.timer("load: EUR roll-up"):
+    field_rollup = get_field_rollup()
+if field_rollup is not None and selected_field in set(field_rollup['field']):
+    field_totals = field_rollup[field_rollup['field'] == selected_field].iloc[0]
+    st.sidebar.metric("Field EUR (bbls)", f"{field_totals['eur']:,.0f}")
+    st.sidebar.metric("Remaining Reserves (bbls)", f"{field_totals['remaining_reserves']:,.0f}")
+    st.sidebar.markdown("---")
+
+with rerun_metrics.timer("load: production index"):
+    wells = get_production_index(selected_field).wells(selected_field)
+selected_well = st.sidebar.selectbox('Wells', wells)
+with rerun_metrics.timer("load: well data"):
+    get_well_data(selected_field, selected_well)
+
+# Monte Carlo uncertainty around the best fit
+show_uncertainty = st.sidebar.checkbox("Show P10/P50/P90", value=False)
+with rerun_metrics.timer("fit"):
+    show_uncertainty = show_uncertainty and fit_well(selected_field, selected_well)['fitted']
+if show_uncertainty:
+    with rerun_metrics.timer("fit: uncertainty"):
+        uncertainty = get_uncertainty(selected_field, selected_well)
+    st.sidebar.caption(f"EUR from {uncertainty['method']} sampling")
+    for case in ("P10", "P50", "P90"):
+        st.sidebar.metric(f"EUR {case} (bbls)", f"{uncertainty['eur'][case]:,.0f}")
+
+# Debug panel with the timings of each stage
+show_timings = st.sidebar.checkbox("Show timings", value=False)
 
-    st.plotly_chart(map_fig, use_container_width=True)
+# Dashboard Layout
+col1, col2 = st.columns(2)
 
+# Left Column: Production Plots
+with col1:
+    with rerun_metrics.timer("arps panel"):
+        arps_panel(selected_field, selected_well, show_uncertainty, show_timings)
+    # Add some metrics and charts
+    st.subheader('Daily Production')
+    with rerun_metrics.timer("plot: daily chart"):
+        st.plotly_chart(get_daily_chart(selected_field, selected_well), use_container_width=True)
+
+# Right Column: Map Chart
+with col2:
+    with rerun_metrics.timer("plot: map"):
+        st.plotly_chart(get_map_figure(selected_field), use_container_width=True)
 
+if show_timings:
+    with st.sidebar.expander("Timings of this rerun", expanded=True):
+        st.dataframe(timings_table(rerun_metrics), hide_index=True, use_container_width=True)
+        st.caption("Slider changes rerun only the Arps panel, its timings are shown below the chart.")
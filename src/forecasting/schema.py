@@ -0,0 +1,127 @@
+"""
+Compact column types for the production, header and processed (final_df) data.
+
+With pandas defaults every id and label comes back as an object string and every
+number as float64. Here the low-cardinality labels (field, operator, status, type)
+are categoricals, file numbers and producing days are 32-bit integers (nullable,
+since header-only wells have no production), rates and volumes are float32, and
+dates are parsed once. The data takes a fraction of the memory and field/operator
+groupbys run on integer category codes.
+"""
+import pandas as pd
+
+# Processed dataset (final_df) after clean_names
+CATEGORY_COLS = ['field', 'current_operator', 'well_status', 'well_type', 'pool']
+INT32_COLS = ['ndic_file_no', 'filenumber', 'well_id', 'producing_days']
+FLOAT32_COLS = ['total_depth', 'y', 'daily_oil_rate', 'daily_gas_rate', 'daily_water_rate', 'cumulative_oil_bbls',
+                'cumulative_gas_mcf', 'cumulative_wtr_bbls', 'rolling_oil_mean', 'rolling_oil_std',
+                'trend', 'yhat', 'yhat_lower', 'yhat_upper', 'days', 'bbls_oil', 'runs', 'bbls_water',
+                'mcf_prod', 'mcf_sold', 'vent_flare']
+# Coordinates keep float64, float32 would round them to about a metre
+FLOAT64_COLS = ['latitude', 'longitude']
+STRING_COLS = ['api_no', 'current_well_name', 'perfs']
+DATE_COLS = ['ds']
+BOOL_COLS = ['is_outlier']
+
+# Raw CSVs as written by the scrapers
+PRODUCTION_DTYPES = {
+    'File Number': 'Int32',
+    'Pool': 'category',
+    'Date': 'string',
+    'Days': 'float32',
+    'BBLS Oil': 'float32',
+    'Runs': 'float32',
+    'BBLS Water': 'float32',
+    'MCF Prod': 'float32',
+    'MCF Sold': 'float32',
+    'Vent/Flare': 'float32',
+}
+HEADER_DTYPES = {
+    'NDIC File No': 'Int32',
+    'FileNumber': 'Int32',
+    'API No': 'string',
+    'Current Operator': 'category',
+    'Current Well Name': 'string',
+    'Field': 'category',
+    'Well Status': 'category',
+    'Well Type': 'category',
+}
+
+
+def final_df_dtypes():
+    """Returns the column -> dtype mapping of the processed dataset."""
+    dtypes = {col: 'category' for col in CATEGORY_COLS}
+    dtypes.update({col: 'Int32' for col in INT32_COLS})
+    dtypes.update({col: 'float32' for col in FLOAT32_COLS})
+    dtypes.update({col: 'float64' for col in FLOAT64_COLS})
+    dtypes.update({col: 'string' for col in STRING_COLS})
+    dtypes.update({col: 'boolean' for col in BOOL_COLS})
+    return dtypes
+
+
+def _to_int32(series):
+    """Nullable int32, values that are not whole numbers become missing."""
+    values = pd.to_numeric(series, errors='coerce')
+    return values.where(values.isna() | (values % 1 == 0)).astype('Int32')
+
+
+def apply_schema(df, dtypes=None):
+    """
+    Casts the columns of the processed dataset to their compact types.
+
+    Columns not in the schema are left as they are, so the function can be applied to
+    any projection of final_df, and columns that already have the right type are not copied.
+
+    Parameters:
+        df (pd.DataFrame): final_df or a subset of its columns, with cleaned names.
+        dtypes (dict, optional): Column -> dtype, defaults to `final_df_dtypes()`.
+
+    Returns:
+        pd.DataFrame: The typed data.
+    """
+    dtypes = final_df_dtypes() if dtypes is None else dtypes
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if col in DATE_COLS:
+            if not pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+            continue
+        dtype = dtypes.get(col)
+        if dtype is None or str(df[col].dtype) == dtype:
+            continue
+        if dtype == 'Int32':
+            df[col] = _to_int32(df[col])
+        elif dtype in ('float32', 'float64'):
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+        elif dtype == 'boolean':
+            df[col] = df[col].map({True: True, False: False, 'True': True, 'False': False}).astype('boolean')
+        elif dtype == 'category':
+            df[col] = df[col].astype('string').astype('category')
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+
+def fillna_category(series, value):
+    """Fills missing values, adding `value` as a category first if the series is categorical."""
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        series = series.cat.add_categories([value])
+    return series.fillna(value)
+
+
+def read_production_csv(path, **kwargs):
+    """Reads the raw production CSV with compact types and `Date` parsed (format MM-YYYY)."""
+    df = pd.read_csv(path, dtype=PRODUCTION_DTYPES, **kwargs)
+    df['Date'] = pd.to_datetime(df['Date'], format='%m-%Y', errors='coerce')
+    return df
+
+
+def read_header_csv(path, **kwargs):
+    """Reads the raw well header CSV with compact types for ids and labels."""
+    columns = pd.read_csv(path, nrows=0).columns
+    return pd.read_csv(path, dtype={col: dtype for col, dtype in HEADER_DTYPES.items() if col in columns}, **kwargs)
+
+
+def memory_usage_mb(df):
+    """Deep memory usage of a DataFrame in MB, to compare layouts."""
+    return df.memory_usage(deep=True).sum() / 1024**2
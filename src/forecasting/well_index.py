@@ -0,0 +1,92 @@
+"""
+In-memory index over the daily production data used by the dashboard.
+
+The data is sorted once by field, well and producing days, so each well's history
+is a contiguous block of rows. The field -> well lists, the (field, well) -> row
+slices and the per-field map summary are all built at load time, and a well switch
+then only touches that well's rows instead of scanning the whole field.
+"""
+import numpy as np
+import pandas as pd
+
+
+class ProductionIndex:
+    """
+    Read-only access to daily production data by field and well.
+
+    Parameters:
+        daily_df (pd.DataFrame): Daily production data, e.g. from `data_store.load_daily`.
+        field_col (str): Field column.
+        well_col (str): Well name column.
+        time_col (str): Column the rows of each well are ordered by.
+    """
+
+    def __init__(self, daily_df, field_col="field", well_col="current_well_name", time_col="producing_days"):
+        self.field_col = field_col
+        self.well_col = well_col
+        self.time_col = time_col
+
+        # Stable sort keeps the original row order for ties in producing days
+        self.df = daily_df.sort_values([field_col, well_col, time_col], kind="mergesort").reset_index(drop=True)
+
+        # Row slices per (field, well), from the boundaries where either key changes
+        fields = self.df[field_col].to_numpy(dtype=object)
+        wells = self.df[well_col].to_numpy(dtype=object)
+        n_rows = len(self.df)
+        if n_rows:
+            changes = (fields[1:] != fields[:-1]) | (wells[1:] != wells[:-1])
+            starts = np.concatenate([[0], np.flatnonzero(changes) + 1])
+        else:
+            starts = np.array([], dtype=int)
+        stops = np.append(starts[1:], n_rows)
+
+        self._slices = {}
+        self._wells = {}
+        for start, stop in zip(starts, stops):
+            field, well = fields[start], wells[start]
+            self._slices[(field, well)] = (int(start), int(stop))
+            self._wells.setdefault(field, []).append(well)
+
+        self._map = self._build_map_summary()
+
+    def _build_map_summary(self):
+        """Per-field well locations sized by the well's maximum cumulative oil."""
+        keys = [self.field_col, self.well_col]
+        cum_oil_df = self.df.groupby(keys, sort=False, observed=True)['cumulative_oil_bbls'].max().reset_index()
+        # Wells without cumulative oil are drawn at the field's smallest size
+        min_cum = cum_oil_df.groupby(self.field_col, observed=True)['cumulative_oil_bbls'].transform('min')
+        cum_oil_df['cumulative_oil_bbls'] = cum_oil_df['cumulative_oil_bbls'].fillna(min_cum)
+        locations = self.df[keys + ['latitude', 'longitude']].drop_duplicates()
+        map_df = locations.merge(cum_oil_df, on=keys, how='left')
+        return {
+            field: group.drop(columns=self.field_col).reset_index(drop=True)
+            for field, group in map_df.groupby(self.field_col, sort=False, observed=True)
+        }
+
+    def fields(self):
+        """Returns the indexed fields, sorted."""
+        return sorted(self._wells)
+
+    def wells(self, field):
+        """Returns the sorted well names of a field."""
+        return list(self._wells.get(field, []))
+
+    def well_rows(self, field, well):
+        """
+        Returns one well's rows, ordered by producing days.
+
+        Returns:
+            pd.DataFrame: Copy of the well's rows, safe to modify. Empty if the well is not indexed.
+        """
+        start, stop = self._slices.get((field, well), (0, 0))
+        return self.df.iloc[start:stop].copy()
+
+    def map_summary(self, field):
+        """
+        Returns the map data of a field.
+
+        Returns:
+            pd.DataFrame: current_well_name, latitude, longitude and cumulative_oil_bbls per well location.
+        """
+        return self._map.get(field, pd.DataFrame(columns=[self.well_col, 'latitude', 'longitude',
+                                                          'cumulative_oil_bbls']))
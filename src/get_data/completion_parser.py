@@ -0,0 +1,298 @@
+"""
+Bulk parsing of completion data from cached OCR text.
+
+`parse_completion_data` in extract_completion_data.py parses one page of text into a
+one-row DataFrame, and parsing a corpus used to concatenate thousands of those.
+`parse_completions` takes an iterable of (file number, text) pairs instead, finds the
+completion lines of every text with one compiled regex, collects the fields into
+column lists and builds a single typed table at the end, with a Parse_Status per
+file. Both use `parse_completion_record`, so they return the same fields, and the
+extraction pipeline, `ocr_cache.py reparse` and this script all write this table.
+
+This module has no OCR dependencies, so cached text can be parsed without poppler
+or Tesseract installed.
+
+Usage:
+    python src/get_data/completion_parser.py --out data/processed/completion_data.csv
+    python src/get_data/completion_parser.py --benchmark
+"""
+import argparse
+import os
+import re
+import time
+
+import pandas as pd
+
+from ocr_cache import DEFAULT_CACHE_PATH, OcrCache
+
+# Stimulation header ("<date> [Middle] Bakken <top> <bottom> <stages> <volume> <units>") and
+# treatment ("Sand Frac [<acid %>] <lbs proppant> <max pressure> <max rate>") lines of the
+# cleaned completion page. OCR drops, doubles or merges characters and cells, so every field
+# after the formation or treatment type is optional, and the first token that does not fit the
+# next field ends the match.
+COMPLETION_REGEX = re.compile(
+    r"""
+    ^[^\S\n]*
+    (?:
+        (?:(?P<date>\S*/\S*)[^\S\n]+)?
+        (?P<formation>(?:[A-Za-z]+[^\S\n]+)?[A-Za-z]*Bakken[A-Za-z]*)
+        (?:[^\S\n]+(?P<top>\d{4,5})\b)?
+        (?:[^\S\n]+(?P<bottom>\d{4,5})\b)?
+        (?:[^\S\n]+(?P<stages>\d{1,2})\b)?
+        (?:[^\S\n]+(?P<volume>\d+(?:\.\d+)?)(?![\d.]))?
+        (?:[^\S\n]*(?P<units>[A-Za-z]+)\b)?
+    |
+        [A-Za-z]*Sand[^\S\n]+Frac[A-Za-z]*
+        # The acid % cell is usually blank, a number there is followed by three more
+        (?:[^\S\n]+\d+(?:\.\d+)?(?=(?:[^\S\n]+\d+(?:\.\d+)?\b){3}))?
+        (?:[^\S\n]+(?P<proppant>\d+(?:\.\d+)?)\b)?
+        (?:[^\S\n]+(?P<pressure>\d+(?:\.\d+)?)\b)?
+        (?:[^\S\n]+(?P<rate>\d+(?:\.\d+)?)\b)?
+    )
+    """,
+    re.MULTILINE | re.VERBOSE,
+)
+NON_TEXT_REGEX = re.compile(r"[^\w\s./]")
+# Dots between spaces on the same line, so cleaning a whole page keeps its lines apart
+STANDALONE_DOT_REGEX = re.compile(r"[^\S\n]\.[^\S\n]")
+# Volumes are in barrels, smaller numbers are other cells that OCR moved into the column
+MIN_VOLUME = 30000
+
+COMPLETION_COLUMNS = ["Date", "Formation", "Top (Ft)", "Bottom (Ft)", "Stages", "Volume", "Volume Units",
+                      "Type Treatment", "Lbs Proppant", "Max Pressure (PSI)", "Max Rate (BBLS/Min)"]
+INT_COLUMNS = ["Top (Ft)", "Bottom (Ft)", "Stages"]
+FLOAT_COLUMNS = ["Volume", "Lbs Proppant", "Max Pressure (PSI)", "Max Rate (BBLS/Min)"]
+CATEGORY_COLUMNS = ["Formation", "Volume Units", "Type Treatment"]
+# ok: stimulation header and treatment found, partial: only one of them,
+# no_match: no completion lines, error: the parser raised (see Parse_Error)
+PARSE_STATUSES = ["ok", "partial", "no_match", "error"]
+
+
+def extract_file_number(file_path):
+    """
+    Extracts the file number from the PDF file path.
+
+    Parameters:
+        file_path (str): Path to the PDF file.
+
+    Returns:
+        str: Extracted file number.
+    """
+    base_name = os.path.basename(file_path)  # Get the file name (e.g., W10450.pdf)
+    return base_name.lstrip("W").rstrip(".pdf")  # Extract the number after 'W' and before '.pdf'
+
+
+def clean_row(row):
+    """
+    Cleans a row of text, or a whole page line by line, to remove unwanted characters and normalize the format.
+
+    Parameters:
+        row (str): Raw OCR text row or page.
+
+    Returns:
+        str: Cleaned row.
+    """
+    # Remove non-alphanumeric characters except spaces and numbers
+    row = NON_TEXT_REGEX.sub("", row)
+
+    # Remove standalone dots or periods (but keep valid decimals)
+    row = STANDALONE_DOT_REGEX.sub(" ", row)
+    # Remove underscores
+    row = row.replace("_", "")
+
+    # Strip leading/trailing spaces
+    return row.strip()
+
+
+def _header_fields(match):
+    """Fields of a stimulation header line, None where OCR lost the cell."""
+    volume = match.group("volume")
+    return {
+        "Date": match.group("date"),
+        "Formation": match.group("formation"),
+        "Top (Ft)": match.group("top"),
+        "Bottom (Ft)": match.group("bottom"),
+        "Stages": match.group("stages"),
+        "Volume": volume if volume is not None and float(volume) > MIN_VOLUME else None,
+        "Volume Units": match.group("units"),
+    }
+
+
+def _treatment_fields(match):
+    """Fields of a "Sand Frac" treatment line, None where OCR lost the cell."""
+    return {
+        "Type Treatment": "Sand Frac",
+        "Lbs Proppant": match.group("proppant"),
+        "Max Pressure (PSI)": match.group("pressure"),
+        "Max Rate (BBLS/Min)": match.group("rate"),
+    }
+
+
+def parse_completion_record(ocr_text):
+    """
+    Parses the completion page text of one well file.
+
+    The cleaned text is scanned once with COMPLETION_REGEX. Every stimulation header
+    line starts a new record and "Sand Frac" lines add the treatment to it, so the last
+    stimulation in the text is returned.
+
+    Parameters:
+        ocr_text (str): Text of the completion page.
+
+    Returns:
+        dict: Field name -> raw value, empty if the text has no completion lines.
+    """
+    current_record = {}
+    for match in COMPLETION_REGEX.finditer(clean_row(ocr_text)):
+        if match.group("formation") is not None:
+            current_record = _header_fields(match)
+        else:
+            current_record.update(_treatment_fields(match))
+    return current_record
+
+
+def _int32(values):
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors="coerce")
+    return numbers.where(numbers % 1 == 0).astype("Int32")
+
+
+def completion_table(columns):
+    """
+    Builds the typed completion table from column lists.
+
+    Parameters:
+        columns (dict): File_Number, COMPLETION_COLUMNS, Parse_Status and Parse_Error
+            -> list of raw values, one per file.
+
+    Returns:
+        pd.DataFrame: Numbers as nullable Int32 / float64 (values that do not parse are
+        missing), labels as categoricals and the date as the string found on the page.
+    """
+    table = {"File_Number": _int32(columns["File_Number"])}
+    for col in COMPLETION_COLUMNS:
+        if col in INT_COLUMNS:
+            table[col] = _int32(columns[col])
+        elif col in FLOAT_COLUMNS:
+            table[col] = pd.to_numeric(pd.Series(columns[col], dtype=object), errors="coerce").astype("float64")
+        elif col in CATEGORY_COLUMNS:
+            table[col] = pd.Series(columns[col], dtype="string").astype("category")
+        else:
+            table[col] = pd.Series(columns[col], dtype="string")
+    table["Parse_Status"] = pd.Categorical(columns["Parse_Status"], categories=PARSE_STATUSES)
+    table["Parse_Error"] = pd.Series(columns["Parse_Error"], dtype="string")
+    return pd.DataFrame(table)
+
+
+def parse_completions(items):
+    """
+    Parses the completion pages of many well files into one table.
+
+    Parameters:
+        items (iterable): (file number, page text) pairs, text may be None.
+
+    Returns:
+        pd.DataFrame: One row per pair in input order, see `completion_table`.
+    """
+    columns = {col: [] for col in ["File_Number"] + COMPLETION_COLUMNS + ["Parse_Status", "Parse_Error"]}
+    for file_number, ocr_text in items:
+        error = None
+        try:
+            record = parse_completion_record(ocr_text or "")
+        except Exception as e:
+            record = {}
+            error = f"{type(e).__name__}: {e}"
+
+        if error is not None:
+            status = "error"
+        elif not record:
+            status = "no_match"
+        elif "Date" in record and "Type Treatment" in record:
+            status = "ok"
+        else:
+            status = "partial"
+
+        columns["File_Number"].append(file_number)
+        for col in COMPLETION_COLUMNS:
+            columns[col].append(record.get(col))
+        columns["Parse_Status"].append(status)
+        columns["Parse_Error"].append(error)
+    return completion_table(columns)
+
+
+def per_file_frames(items):
+    """Parses the old way, one DataFrame per file and a concat, for benchmarking."""
+    all_data = []
+    for file_number, ocr_text in items:
+        try:
+            record = parse_completion_record(ocr_text or "")
+        except Exception:
+            continue
+        completion_data = pd.DataFrame([record] if record else [])
+        completion_data["File_Number"] = file_number
+        all_data.append(completion_data)
+    return pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame()
+
+
+def benchmark(items, repeat=3):
+    """
+    Times `parse_completions` against per-file DataFrames and a concat.
+
+    Returns:
+        dict: Best time of each approach in seconds and files per minute.
+    """
+    items = list(items)
+    timings = {}
+    for name, func in (("per_file", per_file_frames), ("bulk", parse_completions)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(items)
+            best = min(best, time.perf_counter() - start)
+        timings[f"{name}_seconds"] = best
+        timings[f"{name}_files_per_minute"] = len(items) / best * 60 if best > 0 else float("inf")
+    return timings
+
+
+def cached_pages(cache_path=DEFAULT_CACHE_PATH, dpi=200, config=""):
+    """
+    Reads every located completion page from the OCR cache.
+
+    Returns:
+        tuple: ((file number, text) pairs, extraction path of each page)
+    """
+    cache = OcrCache(cache_path)
+    rows = cache.conn.execute(
+        "SELECT file_name, text, path FROM target_page WHERE dpi = ? AND config = ? ORDER BY file_name",
+        (dpi, config),
+    ).fetchall()
+    cache.close()
+    return [(extract_file_number(file_name), text) for file_name, text, _ in rows], [path for _, _, path in rows]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse completion data from every cached completion page.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="OCR cache file.")
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--config", default="", help="Tesseract config string used for OCR.")
+    parser.add_argument("--benchmark", action="store_true", help="Time against per-file DataFrames instead.")
+    parser.add_argument("--out", default="data/processed/completion_data.csv", help="Output CSV.")
+    args = parser.parse_args()
+
+    items, paths = cached_pages(args.cache, args.dpi, args.config)
+    if args.benchmark:
+        result = benchmark(items)
+        print(f"{len(items)} pages: per-file {result['per_file_seconds']:.3f} s "
+              f"({result['per_file_files_per_minute']:.0f} files/min), bulk {result['bulk_seconds']:.3f} s "
+              f"({result['bulk_files_per_minute']:.0f} files/min)")
+        return
+
+    completion_df = parse_completions(items)
+    completion_df["Extraction_Path"] = pd.Series(paths, dtype="string")
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    completion_df.to_csv(args.out, index=False)
+    print(f"Parsed {len(completion_df)} cached pages to {args.out}: "
+          f"{completion_df['Parse_Status'].value_counts().to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
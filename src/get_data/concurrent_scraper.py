@@ -0,0 +1,158 @@
+"""
+Concurrent scraping of NDIC production pages.
+
+Wells are fetched by a bounded thread pool. Each worker thread keeps its own
+`requests.Session`, so connections stay alive between wells. A shared token bucket
+caps the request rate against the state server, and failed requests are retried
+with exponential backoff. A failure on one well is recorded and does not stop the
+others.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import count_response, timed, timer
+from scrape_production_data import PRODUCTION_URL, parse_production_page
+
+# Responses worth retrying, anything else is treated as a permanent failure
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_session(pool_size=1):
+    """Creates a session with a keep-alive connection pool."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+@timed()
+def fetch_production_page(session, file_number, bucket, url=PRODUCTION_URL, retries=3, backoff=0.5, timeout=30):
+    """
+    Fetches one production page, retrying transient failures with exponential backoff.
+
+    Parameters:
+        session (requests.Session): Session used for the request.
+        file_number: NDIC file number.
+        bucket (TokenBucket): Shared rate limiter.
+        url (str): Production page URL.
+        retries (int): Retries after the first attempt.
+        backoff (float): Base delay in seconds, doubled after each failed attempt.
+        timeout (float): Request timeout in seconds.
+
+    Returns:
+        str: HTML of the page.
+    """
+    error = None
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            response = session.post(url, data={"FileNumber": file_number}, timeout=timeout)
+            count_response(response)
+            if response.status_code == 200:
+                return response.text
+            error = f"HTTP {response.status_code}"
+            if response.status_code not in RETRY_STATUSES:
+                break
+        except requests.RequestException as e:
+            error = str(e)
+        if attempt < retries:
+            # Jitter keeps the workers from retrying in lockstep
+            time.sleep(backoff * 2 ** attempt * (1 + random.random() / 2))
+    raise Exception(f"Failed to fetch production data for File No: {file_number} ({error})")
+
+
+def scrape_wells_concurrently(file_numbers, workers=8, rate=5.0, retries=3, backoff=0.5, timeout=30,
+                              url=PRODUCTION_URL, parse_page=parse_production_page, on_result=None, on_failure=None):
+    """
+    Scrapes production data for many wells concurrently.
+
+    Parameters:
+        file_numbers (list): NDIC file numbers to scrape.
+        workers (int): Maximum number of requests in flight.
+        rate (float): Maximum requests per second across all workers.
+        retries (int): Retries per well for transient failures.
+        backoff (float): Base retry delay in seconds.
+        timeout (float): Request timeout in seconds.
+        url (str): Production page URL, override to point at a local stand-in server.
+        parse_page (callable): Page parser, e.g. `fast_parse.parse_production_page_lxml`.
+        on_result (callable, optional): Called as on_result(file_number, well_data, production_data)
+            from the calling thread as each well completes. When given, results are handed
+            to the callback instead of being collected in memory.
+        on_failure (callable, optional): Called as on_failure(file_number, error) for failed wells.
+
+    Returns:
+        tuple: (list of well header dicts, list of production rows, dict of file number -> error)
+    """
+    bucket = TokenBucket(rate)
+    local = threading.local()
+
+    def scrape_one(file_number):
+        if not hasattr(local, "session"):
+            local.session = make_session()
+        html = fetch_production_page(local.session, file_number, bucket, url, retries, backoff, timeout)
+        with timer("parse_production_page"):
+            return parse_page(html, file_number)
+
+    results = {}
+    failures = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(scrape_one, file_number): file_number for file_number in file_numbers}
+        for done, future in enumerate(as_completed(futures), start=1):
+            file_number = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                failures[file_number] = str(e)
+                print(f"Error scraping File No: {file_number}, error: {e}")
+                if on_failure:
+                    on_failure(file_number, e)
+            else:
+                if on_result:
+                    on_result(file_number, *result)
+                else:
+                    results[file_number] = result
+            if done % 100 == 0:
+                print(f"Scraped {done} of {len(futures)} wells")
+
+    # Keep the output in the order the file numbers were given
+    all_well_header_data = []
+    all_production_data = []
+    for file_number in file_numbers:
+        if file_number in results:
+            well_data, production_data = results[file_number]
+            if well_data:
+                all_well_header_data.append(well_data)
+            all_production_data.extend(production_data)
+
+    print(f"Scraped {len(futures) - len(failures)} wells, {len(failures)} failed.")
+    return all_well_header_data, all_production_data, failures
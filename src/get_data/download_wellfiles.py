@@ -1,41 +1,320 @@
+"""
+Downloads NDIC well file PDFs (`W{file_number}.pdf`).
+
+Files are fetched by a bounded thread pool sharing one pooled session and streamed
+to disk in chunks. Each download is written to `<name>.pdf.part` and renamed into
+place once its size and PDF header check out, so an interrupted run never leaves a
+truncated PDF behind. Partial files are resumed with HTTP Range requests. A SQLite
+manifest records the size, ETag and SHA-256 of every downloaded file, so finished
+files are skipped on the next run, and records failures so they can be retried.
+
+Usage:
+    python src/get_data/download_wellfiles.py --workers 4 --rate 2
+    python src/get_data/download_wellfiles.py --retry-failed
+    python src/get_data/download_wellfiles.py --base-url http://127.0.0.1:8765/oilgas/basic/bwfiles
+"""
+import argparse
+import datetime
+import hashlib
 import os
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import requests
 import pandas as pd
 
-def get_pdf_url(file_number):
+from concurrent_scraper import RETRY_STATUSES, TokenBucket, make_session
+from instrumentation import count, profile, timed
+
+BWFILES_URL = "https://www.dmr.nd.gov/oilgas/basic/bwfiles"
+DEFAULT_OUTPUT_DIR = "data/raw/well_files/"
+DEFAULT_MANIFEST_PATH = "data/raw/download_manifest.sqlite"
+DEFAULT_HEADER_CSV = "./data/raw/ndic_wellheader_data.csv"
+CHUNK_SIZE = 256 * 1024
+
+def get_pdf_url(file_number, base_url=BWFILES_URL):
     """
     Constructs the URL for a given well file number.
     """
     prefix = str(file_number)[:2]  # First two digits of the file number
-    return f"https://www.dmr.nd.gov/oilgas/basic/bwfiles/{prefix}/W{file_number}.pdf"
+    return f"{base_url}/{prefix}/W{file_number}.pdf"
+
+def sha256_file(path, chunk_size=CHUNK_SIZE):
+    """Returns the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class DownloadManifest:
+    """SQLite record of downloaded and failed well files."""
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Only used from the thread that collects results
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                file_number TEXT PRIMARY KEY,
+                path TEXT,
+                size INTEGER,
+                etag TEXT,
+                sha256 TEXT,
+                downloaded TEXT,
+                status TEXT,
+                error TEXT
+            )
+            """
+        )
+        self.conn.commit()
+
+    def files(self):
+        """Returns a dict of file number -> manifest record."""
+        cursor = self.conn.execute("SELECT * FROM files")
+        columns = [col[0] for col in cursor.description]
+        return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    def failed(self):
+        """Returns the file numbers whose last download failed."""
+        return [row[0] for row in self.conn.execute("SELECT file_number FROM files WHERE status = 'failed'")]
+
+    def record_success(self, file_number, path, size, etag, sha256):
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO files (file_number, path, size, etag, sha256, downloaded, status, error)
+            VALUES (?, ?, ?, ?, ?, ?, 'ok', NULL)
+            """,
+            (str(file_number), path, size, etag, sha256, datetime.datetime.now().isoformat(timespec="seconds")),
+        )
+        self.conn.commit()
+
+    def record_failure(self, file_number, error, etag=None):
+        """Marks a file as failed, keeping the ETag of a partial download so it can be resumed safely."""
+        self.conn.execute(
+            """
+            INSERT INTO files (file_number, etag, status, error) VALUES (?, ?, 'failed', ?)
+            ON CONFLICT (file_number) DO UPDATE SET
+                etag = COALESCE(excluded.etag, files.etag), status = 'failed', error = excluded.error
+            """,
+            (str(file_number), etag, str(error)),
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def is_complete(output_path, record, session=None, url=None, verify=False, timeout=30):
+    """
+    Checks whether a PDF already on disk is a finished download.
+
+    Files recorded in the manifest are checked by size (and SHA-256 with `verify`).
+    Files without a record, e.g. from the old sequential downloader, are checked
+    against the server's Content-Length with a HEAD request.
+
+    Returns:
+        bool: True if the file can be skipped.
+    """
+    if not os.path.exists(output_path):
+        return False
+    size = os.path.getsize(output_path)
+    if record and record.get("status") == "ok":
+        if record.get("size") != size:
+            return False
+        return not verify or record.get("sha256") == sha256_file(output_path)
+    if session is None or url is None:
+        return False
+    try:
+        response = session.head(url, timeout=timeout, allow_redirects=True)
+    except requests.RequestException:
+        return False
+    if response.status_code != 200:
+        return False
+    length = response.headers.get("Content-Length")
+    return length is not None and int(length) == size
 
-def download_pdf(file_number, output_dir):
+@timed()
+def download_pdf(file_number, output_dir, session=None, base_url=BWFILES_URL, record=None, bucket=None,
+                 retries=3, backoff=1.0, timeout=60, verify=False):
     """
     Downloads the PDF for a given well file number and saves it to the output directory.
+
+    The response is streamed to `<name>.part`, resumed with a Range request if a
+    partial file is already there, and renamed into place when complete.
+
+    Parameters:
+        file_number: NDIC file number.
+        output_dir (str): Directory for the PDFs.
+        session (requests.Session, optional): Shared session, a new one is made if None.
+        base_url (str): URL of the bwfiles directory, override to point at a local stand-in server.
+        record (dict, optional): Manifest record of this file from an earlier run.
+        bucket (TokenBucket, optional): Shared rate limiter.
+        retries (int): Retries after the first attempt, each resuming from the partial file.
+        backoff (float): Base delay in seconds, doubled after each failed attempt.
+        timeout (float): Request timeout in seconds.
+        verify (bool): Re-hash existing files instead of trusting the recorded size.
+
+    Returns:
+        dict: status ("downloaded" or "skipped"), path, size, etag, sha256 and resumed bytes.
     """
-    url = get_pdf_url(file_number)
-    response = requests.get(url, stream=True)
+    session = session or make_session()
+    url = get_pdf_url(file_number, base_url)
+    output_path = os.path.join(output_dir, f"W{file_number}.pdf")
+    part_path = output_path + ".part"
 
-    if response.status_code == 200:
-        output_path = os.path.join(output_dir, f"W{file_number}.pdf")
-        with open(output_path, "wb") as pdf_file:
-            pdf_file.write(response.content)
-        print(f"Downloaded: {output_path}")
-    else:
-        print(f"Failed to download {file_number}: HTTP {response.status_code}")
+    if is_complete(output_path, record, session, url, verify, timeout):
+        sha256 = record.get("sha256") if record and record.get("sha256") else sha256_file(output_path)
+        return {"status": "skipped", "path": output_path, "size": os.path.getsize(output_path),
+                "etag": record.get("etag") if record else None, "sha256": sha256, "resumed": 0}
+
+    etag = record.get("etag") if record else None
+    error = None
+    resumed = 0
+    for attempt in range(retries + 1):
+        if bucket is not None:
+            bucket.acquire()
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            # Only resume if the file has not changed since the partial download
+            if etag:
+                headers["If-Range"] = etag
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+                count("http_requests")
+                if response.status_code == 416:
+                    # The partial file is no longer valid for this resource, start over
+                    os.remove(part_path)
+                    error = "HTTP 416"
+                    continue
+                if response.status_code not in (200, 206):
+                    error = f"HTTP {response.status_code}"
+                    if response.status_code not in RETRY_STATUSES:
+                        break
+                else:
+                    etag = response.headers.get("ETag", etag)
+                    if response.status_code == 206:
+                        resumed += offset
+                        expected = int(response.headers["Content-Range"].rsplit("/", 1)[1])
+                        mode = "ab"
+                    else:
+                        # The server ignored the Range header and sent the whole file
+                        length = response.headers.get("Content-Length")
+                        expected = int(length) if length is not None else None
+                        mode = "wb"
+                    with open(part_path, mode) as pdf_file:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            pdf_file.write(chunk)
+                            count("bytes_received", len(chunk))
 
-def main(file_numbers, output_dir="data/raw/well_files/"):
+                    size = os.path.getsize(part_path)
+                    if expected is not None and size != expected:
+                        error = f"Incomplete download ({size} of {expected} bytes)"
+                    else:
+                        with open(part_path, "rb") as f:
+                            if f.read(5) != b"%PDF-":
+                                os.remove(part_path)
+                                raise ValueError("Downloaded file is not a PDF")
+                        sha256 = sha256_file(part_path)
+                        os.replace(part_path, output_path)
+                        print(f"Downloaded: {output_path}")
+                        return {"status": "downloaded", "path": output_path, "size": size,
+                                "etag": etag, "sha256": sha256, "resumed": resumed}
+        except requests.RequestException as e:
+            error = str(e)
+        if attempt < retries:
+            time.sleep(backoff * 2 ** attempt * (1 + random.random() / 2))
+
+    exception = Exception(f"Failed to download {file_number}: {error}")
+    exception.etag = etag
+    raise exception
+
+def download_wellfiles(file_numbers, output_dir=DEFAULT_OUTPUT_DIR, workers=4, rate=2.0, retries=3,
+                       base_url=BWFILES_URL, manifest=None, verify=False):
     """
-    Main function to automate PDF downloads for multiple well file numbers.
+    Downloads many well files concurrently, skipping the ones already on disk.
+
+    Parameters:
+        file_numbers (list): NDIC file numbers.
+        output_dir (str): Directory for the PDFs.
+        workers (int): Maximum number of downloads in flight.
+        rate (float): Maximum requests per second across all workers.
+        retries (int): Retries per file, each resuming from the partial file.
+        base_url (str): URL of the bwfiles directory.
+        manifest (DownloadManifest, optional): Records results, defaults to DEFAULT_MANIFEST_PATH.
+        verify (bool): Re-hash existing files before skipping them.
+
+    Returns:
+        dict: Counts of downloaded, skipped and failed files and bytes resumed.
     """
-    # Ensure output directory exists
     os.makedirs(output_dir, exist_ok=True)
+    manifest = manifest or DownloadManifest()
+    records = manifest.files()
+    session = make_session(workers)
+    bucket = TokenBucket(rate)
+
+    summary = {"downloaded": 0, "skipped": 0, "failed": 0, "resumed_bytes": 0}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(download_pdf, file_number, output_dir, session, base_url,
+                            records.get(str(file_number)), bucket, retries, verify=verify): file_number
+            for file_number in file_numbers
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            file_number = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(e)
+                manifest.record_failure(file_number, e, getattr(e, "etag", None))
+                summary["failed"] += 1
+            else:
+                manifest.record_success(file_number, result["path"], result["size"], result["etag"], result["sha256"])
+                summary[result["status"]] += 1
+                summary["resumed_bytes"] += result["resumed"]
+            if done % 100 == 0:
+                print(f"Processed {done} of {len(futures)} well files")
+
+    print(f"Downloaded {summary['downloaded']}, skipped {summary['skipped']}, failed {summary['failed']} well files.")
+    return summary
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download NDIC well file PDFs.")
+    parser.add_argument("--header-csv", default=DEFAULT_HEADER_CSV, help="Well header CSV with 'NDIC File No'.")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent downloads.")
+    parser.add_argument("--rate", type=float, default=2.0, help="Maximum requests per second.")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per file.")
+    parser.add_argument("--base-url", default=BWFILES_URL, help="Well files URL, e.g. a local stand-in server.")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH, help="SQLite download manifest.")
+    parser.add_argument("--retry-failed", action="store_true", help="Only retry files that failed last time.")
+    parser.add_argument("--verify", action="store_true", help="Re-hash existing files before skipping them.")
+    return parser.parse_args()
 
-    # Download PDFs for all file numbers
-    for file_number in file_numbers:
-        download_pdf(file_number, output_dir)
+def main():
+    """
+    Main function to automate PDF downloads for multiple well file numbers.
+    """
+    args = parse_args()
+    manifest = DownloadManifest(args.manifest)
+    if args.retry_failed:
+        file_numbers = manifest.failed()
+    else:
+        well_header_df = pd.read_csv(args.header_csv)
+        file_numbers = sorted(well_header_df['NDIC File No'].unique())
+    try:
+        download_wellfiles(file_numbers, args.output_dir, args.workers, args.rate, args.retries,
+                           args.base_url, manifest, args.verify)
+    finally:
+        manifest.close()
 
-# usage
-well_header_df = pd.read_csv('./data/raw/ndic_wellheader_data.csv')
-file_numbers = sorted(well_header_df['NDIC File No'].unique())  
-main(file_numbers)
+if __name__ == "__main__":
+    with profile("download_wellfiles"):
+        main()
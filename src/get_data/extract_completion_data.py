@@ -19,119 +19,194 @@ Considerations for improving performance in future iterations:
 Despite these challenges, this script is designed to give an idea of how some complicated it can be to enrich the
 dataset with completion data from well files.
 """
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 import pytesseract
-from pytesseract import Output
 from pytesseract import image_to_string
-from PIL import Image
+try:
+    from pypdf import PdfReader
+except ImportError:  # without pypdf every page goes through OCR
+    PdfReader = None
 
 import pandas as pd
+import argparse
 import os
-import re
 import glob
 import random 
+from multiprocessing import Pool
 
-def convert_pdf_to_images(pdf_path, output_folder=None):
+from completion_parser import extract_file_number, parse_completion_record, parse_completions
+from instrumentation import count, profile, timed, timer
+from ocr_cache import DEFAULT_CACHE_PATH, OcrCache, file_hash
+
+# Pages are rasterized at pdf2image's default resolution
+DEFAULT_DPI = 200
+
+# Words that all appear on the completion ("Bakken / Sand Frac / Stages / Proppant") page
+TARGET_KEYWORDS = ["Bakken", "Sand Frac", "Stages", "Proppant"]
+
+# Pages with less embedded text than this are treated as scanned images and OCR'd
+MIN_TEXT_LAYER_CHARS = 50
+
+def get_page_count(pdf_path):
     """
-    Converts all pages of a PDF to images.
+    Returns the number of pages in a PDF without rasterizing it.
     
     Parameters:
         pdf_path (str): Path to the PDF file.
-        output_folder (str, optional): Folder to save images (optional).
         
     Returns:
-        list: List of PIL Image objects for each page.
+        int: Page count.
+    """
+    return int(pdfinfo_from_path(pdf_path)["Pages"])
+
+def iter_pdf_pages(pdf_path, dpi=DEFAULT_DPI, page_numbers=None):
+    """
+    Rasterizes a PDF lazily, one page at a time.
+    
+    Only the current page image is held in memory, so callers that stop early
+    never rasterize the remaining pages.
+    
+    Parameters:
+        pdf_path (str): Path to the PDF file.
+        dpi (int): Rasterization resolution.
+        page_numbers (list of int, optional): Pages to rasterize (starting at 1), defaults to all.
+        
+    Yields:
+        tuple: (page number starting at 1, PIL Image of the page)
     """
-    images = convert_from_path(pdf_path, fmt='png', output_folder=output_folder)
-    return images
+    if page_numbers is None:
+        page_numbers = range(1, get_page_count(pdf_path) + 1)
+    for page_number in page_numbers:
+        with timer("rasterize_page"):
+            images = convert_from_path(pdf_path, dpi=dpi, fmt='png', first_page=page_number, last_page=page_number)
+        if images:
+            yield page_number, images[0]
 
 # Python virtual env was having a difficult time finding it in my path
-os.environ["PATH"] += os.pathsep + r"C:\Program Files\poppler-24.08.0\Library\bin"
-# Set the path to Tesseract OCR executable 
-pytesseract.pytesseract.tesseract_cmd = r'C:\Users\alley\AppData\Local\Programs\Tesseract-OCR\tesseract.exe'
+if os.name == "nt":
+    os.environ["PATH"] += os.pathsep + r"C:\Program Files\poppler-24.08.0\Library\bin"
+    # Set the path to Tesseract OCR executable 
+    pytesseract.pytesseract.tesseract_cmd = r'C:\Users\alley\AppData\Local\Programs\Tesseract-OCR\tesseract.exe'
 
-def extract_file_number(file_path):
+@timed()
+def extract_text_layer(pdf_path):
     """
-    Extracts the file number from the PDF file path.
-
+    Pulls the embedded text of each page, without rasterizing or OCR.
+    
     Parameters:
-        file_path (str): Path to the PDF file.
-
+        pdf_path (str): Path to the PDF file.
+        
     Returns:
-        str: Extracted file number.
+        list of str: Text per page (empty for scanned pages), or an empty list
+        if pypdf is not installed or the PDF cannot be read.
     """
-    base_name = os.path.basename(file_path)  # Get the file name (e.g., W10450.pdf)
-    return base_name.lstrip("W").rstrip(".pdf")  # Extract the number after 'W' and before '.pdf'
+    if PdfReader is None:
+        return []
+    try:
+        reader = PdfReader(pdf_path)
+        page_texts = []
+        for page in reader.pages:
+            try:
+                page_texts.append(page.extract_text() or "")
+            except Exception:
+                page_texts.append("")
+        return page_texts
+    except Exception as e:
+        print(f"Could not read text layer of {pdf_path}: {e}")
+        return []
 
-def ocr_image(image):
+@timed()
+def ocr_image(image, config=""):
     """
     Performs OCR on the given image.
     
     Parameters:
         image (PIL.Image): Image object to process with OCR.
+        config (str): Extra Tesseract options, e.g. "--psm 6".
 
     Returns:
         str: OCR result as text.
     """
-    return image_to_string(image)
+    count("pages_ocred")
+    return image_to_string(image, config=config)
 
-def clean_row(row):
+def is_target_page(ocr_text):
     """
-    Cleans a row of text to remove unwanted characters and normalize the format.
+    Checks whether page text looks like the completion data page.
     
     Parameters:
-        row (str): Raw OCR text row.
+        ocr_text (str): Text of the page.
         
     Returns:
-        str: Cleaned row.
+        bool: True if all of TARGET_KEYWORDS appear in the text.
     """
-    # Remove non-alphanumeric characters except spaces and numbers
-    row = re.sub(r"[^\w\s./]", "", row)
-
-    # Remove standalone dots or periods (but keep valid decimals)
-    row = re.sub(r"\s\.\s", " ", row)
-    # Remove underscores
-    row = row.replace("_", "")
-
-    # Strip leading/trailing spaces
-    return row.strip()
+    return all(keyword in ocr_text for keyword in TARGET_KEYWORDS)
 
-# find the target page
-def find_target_page(images, keywords):
+@timed()
+def locate_target_page(pdf_path, dpi=DEFAULT_DPI, cache=None, config=""):
     """
-    Finds the target page containing specified keywords.
+    Finds the completion page, reading the embedded text layer before falling back to OCR.
     
-    Parameters:
-        images (list): List of PIL Image objects.
-        keywords (list of str): Keywords to search for in OCR text.
-        
-    Returns:
-        PIL.Image: Image of the identified page.
-    """
-    for index, image in enumerate(images):       
-
-        ocr_text = ocr_image(image)
-        #if any(keyword in ocr_text for keyword in keywords):
-        if "Bakken" in ocr_text and "Sand Frac" in ocr_text and "Stages" in ocr_text and "Proppant" in ocr_text:
-            print(f"Target page found: Page {index + 1}")            
-            return image, ocr_text
-        
-    raise ValueError("No target page found with the specified keywords.")
-def is_numeric(value):
-    """
-    Checks if a value is numeric.
+    Digital PDFs are matched on their text layer without any OCR. Only pages with
+    (almost) no embedded text, i.e. scanned pages, are rasterized and OCR'd, one at a time.
+    With a cache, a PDF whose target page was found before is not opened at all, and
+    pages OCR'd on an earlier run are not OCR'd again.
     
     Parameters:
-        value (str): The value to check.
-    
+        pdf_path (str): Path to the PDF file.
+        dpi (int): Rasterization resolution for OCR.
+        cache (OcrCache, optional): Cache of OCR text and target pages.
+        config (str): Tesseract options, part of the cache key.
+        
     Returns:
-        bool: True if the value is numeric, False otherwise.
+        tuple: (page number starting at 1, page text, path taken ("text", "ocr" or "cache"), pages OCR'd)
     """
-    try:
-        float(value)
-        return True
-    except ValueError:
-        return False
+    pdf_hash = None
+    if cache is not None:
+        pdf_hash = file_hash(pdf_path)
+        hit = cache.get_target(pdf_hash, dpi, config)
+        if hit is not None:
+            page_number, text, _ = hit
+            print(f"Target page found in cache: Page {page_number}")
+            return page_number, text, "cache", 0
+
+    page_texts = extract_text_layer(pdf_path)
+    for page_number, text in enumerate(page_texts, start=1):
+        if is_target_page(text):
+            print(f"Target page found in text layer: Page {page_number}")
+            if cache is not None:
+                cache.put_target(pdf_hash, dpi, config, os.path.basename(pdf_path), page_number, "text", text)
+            return page_number, text, "text", 0
+
+    # Without a text layer every page is a candidate, otherwise only the scanned ones
+    candidates = None
+    if page_texts:
+        candidates = [page_number for page_number, text in enumerate(page_texts, start=1)
+                      if len(text.strip()) < MIN_TEXT_LAYER_CHARS]
+
+    if candidates is None:
+        candidates = list(range(1, get_page_count(pdf_path) + 1))
+
+    pages_ocred = 0
+    for page_number in candidates:
+        ocr_text = cache.get_text(pdf_hash, page_number, dpi, config) if cache is not None else None
+        if ocr_text is None:
+            # Rasterize only the pages that are not cached yet
+            for _, image in iter_pdf_pages(pdf_path, dpi, [page_number]):
+                ocr_text = ocr_image(image, config)
+                image.close()
+            if ocr_text is None:
+                continue
+            pages_ocred += 1
+            if cache is not None:
+                cache.put_text(pdf_hash, page_number, dpi, config, ocr_text)
+        if is_target_page(ocr_text):
+            print(f"Target page found with OCR: Page {page_number}")
+            if cache is not None:
+                cache.put_target(pdf_hash, dpi, config, os.path.basename(pdf_path), page_number, "ocr", ocr_text)
+            return page_number, ocr_text, "ocr", pages_ocred
+
+    raise ValueError(f"No target page found with the specified keywords ({pages_ocred} pages OCR'd).")
 
 # parse the ocr text
 
@@ -145,132 +220,125 @@ def parse_completion_data(ocr_text, verbose=False):
     Returns:
         pd.DataFrame: Parsed data in a structured format.
     """
-    # Split OCR text into lines
-    lines = ocr_text.split("\n")
-    # Filter rows that contain relevant keywords
-    filtered_rows = [line for line in lines if "Bakken" in line or "Sand Frac" in line]
-    parsed_data = []
-
-    # Define a dictionary to hold field names and values
-    current_record = {}
-
-    # Loop through lines, pairing header lines with value lines
-    for i, row in enumerate(filtered_rows):
-        line = row.strip()  # Clean up whitespace
-        line = clean_row(line)
-        
-        # Detect if this line is a header line
-        if "Bakken"in line:
-            
-            tokens = line.split()            
-            if len(tokens) >= 7:
-                current_record = {}
-                if len(tokens) > 0:
-                    current_record["Date"] = tokens[0] if "/" in tokens[0] else None                     
-                    current_record["Formation"] = tokens[1] if tokens[1].isalpha() else None                        
-                    current_record["Top (Ft)"] = tokens[2] if tokens[2].isdigit() else None                        
-                    current_record["Bottom (Ft)"] = tokens[3] if tokens[3].isdigit() else None                       
-                    current_record["Stages"] = tokens[4].strip("()") if tokens[4].isdigit() and int(tokens[4]) < 100 else None                      
-                    current_record["Volume"] = tokens[5] if tokens[5].replace(".", "").isdigit() and float(tokens[5]) > 30000 else None                       
-                    current_record["Volume Units"] = tokens[6] if tokens[6].isalpha() else None
-
-            else: 
-                current_record = {}
-
-                current_record["Volume Units"] = tokens[len(tokens)-1] if tokens[len(tokens)-1].isalpha() else None
-                if len(tokens) > 0:
-                    current_record["Date"] = tokens[0] if "/" in tokens[0] else None
-
-                if len(tokens) > 1:
-                    current_record["Formation"] = tokens[1] if tokens[1].isalpha() else None                                                
-
-                if len(tokens) >= 4:
-                    if(
-                        (tokens[4].isdigit())
-                        and (int(tokens[4]) < 100) 
-                    ):
-                        current_record["Stages"] = (min(int(tokens[4].strip("()")),int(tokens[3],int(tokens[2]))))
-                    else:
-                        None
-                if len(tokens) > 2:
-                    current_record["Top (Ft)"] = tokens[2] if int(tokens[3]) > int(tokens[2])  else None
-                if len(tokens) >= 3:
-                    if (
-                        tokens[3].isdigit() 
-                        and (current_record.get("Top (Ft)") is None or int(current_record.get("Top (Ft)")) < int(tokens[3]))
-                        and int(tokens[3]) < 30000
-                    ):
-                        current_record["Bottom (Ft)"] = tokens[3]    
-                    else:
-                        current_record["Bottom (Ft)"] = tokens[2]
-                
-                
-                
-                if len(tokens) >= 5:
-                    current_record["Volume"] = tokens[len(tokens)-2] if  float(tokens[len(tokens)-2]) > 30000 else None                   
-
-        elif "Sand Frac" in line:
-            tokens = line.split()
-            current_record.update ({
-                "Type Treatment": "Sand Frac",
-                "Lbs Proppant": tokens[2] if len(tokens) > 1 and tokens[2].replace(".", "").isdigit() else None,
-                "Max Pressure (PSI)": tokens[3] if len(tokens) > 2 and tokens[3].replace(".", "").isdigit() else None,
-                "Max Rate (BBLS/Min)": tokens[4] if len(tokens) > 3 and tokens[4].replace(".", "").isdigit() else None,
-            })
-        
-    if current_record:
-        parsed_data.append(current_record)
-                    
-    return pd.DataFrame(parsed_data)
+    # Many pages at once are parsed with completion_parser.parse_completions
+    current_record = parse_completion_record(ocr_text)
+    return pd.DataFrame([current_record] if current_record else [])
 
 # pipeline 
-def extract_completion_data_from_pdf(pdf_path):
+def extract_completion_data_from_pdf(pdf_path, dpi=DEFAULT_DPI, report=None, cache=None, config=""):
     """
-    Extracts completion data from a PDF file.
+    Finds the completion page of a PDF and returns its text for parsing.
     
     Parameters:
         pdf_path (str): Path to the PDF file.
+        dpi (int): Rasterization resolution.
+        report (dict, optional): Filled with the extraction path, target page and pages OCR'd.
+        cache (OcrCache, optional): Cache of OCR text and target pages.
+        config (str): Tesseract options, part of the cache key.
 
     Returns:
-        pd.DataFrame: Structured completion data.
+        str or None: Text of the completion page, None if it could not be found.
     """
     try:
-        # Extract file number 
-        file_number = extract_file_number(pdf_path)
-
-        # Step 1: Convert PDF to images
-        images = convert_pdf_to_images(pdf_path)
-
-        # Step 2: Find the target page
-        keywords = ["Proppant"]
-        target_image, ocr_text = find_target_page(images, keywords)
-
-        # Step 3: Parse OCR text into structured data
-        completion_data = parse_completion_data(ocr_text)
-        print(completion_data.head())
-        completion_data["File_Number"] = file_number
-
-        return completion_data
+        # Steps 1 and 2: Find the target page, from the text layer or by OCR of scanned pages
+        page_number, page_text, extraction_path, pages_ocred = locate_target_page(pdf_path, dpi, cache, config)
+        if report is not None:
+            report.update({"Extraction_Path": extraction_path, "Target_Page": page_number, "OCR_Pages": pages_ocred})
+        return page_text
     except Exception as e:
         print(f"Error processing {pdf_path}: {e}")
-        return pd.DataFrame()  # Return an empty DataFrame in case of failure
-
-
-
-files = glob.glob("data/raw/well_files/*.pdf",recursive=True)
-files_dev = random.sample(files,10)
+        if report is not None:
+            report["Error"] = str(e)
+        return None
 
-all_data = []
+def process_pdf(pdf_path):
+    """
+    Pool task: locates the completion page of one PDF and reports which path was taken.
     
-for file in files:
-    try:
-        # Extract data from the current PDF
-        df = extract_completion_data_from_pdf(file)
+    Returns:
+        tuple: (file number, completion page text or None, report dict)
+    """
+    file_number = extract_file_number(pdf_path)
+    report = {"File_Number": file_number, "Extraction_Path": "failed",
+              "Target_Page": None, "OCR_Pages": 0, "Error": None}
+    page_text = extract_completion_data_from_pdf(pdf_path, _worker_dpi, report, _worker_cache, _worker_config)
+    return file_number, page_text, report
+
+# OCR cache and settings of each pool worker, see init_worker
+_worker_cache = None
+_worker_dpi = DEFAULT_DPI
+_worker_config = ""
+
+def init_worker(cache_path=None, dpi=DEFAULT_DPI, config=""):
+    """
+    Keeps each Tesseract call single-threaded so worker processes do not oversubscribe the cores,
+    opens the worker's connection to the OCR cache and sets the DPI and Tesseract config.
+    """
+    global _worker_cache, _worker_dpi, _worker_config
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    if cache_path:
+        _worker_cache = OcrCache(cache_path)
+    _worker_dpi = dpi
+    _worker_config = config
+
+def process_files_in_parallel(files, workers=None, maxtasksperchild=50, cache_path=None, dpi=DEFAULT_DPI, config=""):
+    """
+    Extracts completion data from many PDFs with a process pool.
+    
+    Parameters:
+        files (list of str): PDF paths.
+        workers (int, optional): Worker processes, defaults to the number of cores.
+        maxtasksperchild (int): Files a worker handles before it is replaced, which
+            returns any memory held by poppler/Tesseract to the system.
+        cache_path (str, optional): OCR cache file, no caching when None.
+        dpi (int): Rasterization resolution.
+        config (str): Tesseract options, e.g. "--psm 6".
         
-        # Append the DataFrame to the list
-        all_data.append(df)
-    except Exception as e:
-        print(f"Error processing {file}: {e}")
-
-# Combine all DataFrames into a single DataFrame
-combined_df = pd.concat(all_data, ignore_index=True)
\ No newline at end of file
+    Returns:
+        tuple: (completion data with one row and Parse_Status per file, per-file report of the
+        extraction path taken)
+    """
+    items = []
+    reports = []
+    with Pool(processes=workers, initializer=init_worker, initargs=(cache_path, dpi, config), maxtasksperchild=maxtasksperchild) as pool:
+        for file_number, page_text, report in pool.imap_unordered(process_pdf, files, chunksize=1):
+            items.append((file_number, page_text))
+            reports.append(report)
+
+    # One typed table for all files, the same schema completion_parser.py and ocr_cache.py write
+    with timer("parse_completions"):
+        combined_df = parse_completions(items)
+    combined_df["Extraction_Path"] = pd.Series([report["Extraction_Path"] for report in reports], dtype="string")
+    return combined_df, pd.DataFrame(reports)
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract completion data from NDIC well file PDFs.")
+    parser.add_argument("--input", default="data/raw/well_files/*.pdf", help="Glob of PDF files to process.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to all cores.")
+    parser.add_argument("--sample", type=int, default=None, help="Only process a random sample of files.")
+    parser.add_argument("--out", default="data/processed/completion_data.csv", help="Output CSV.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="OCR cache file.")
+    parser.add_argument("--no-cache", action="store_true", help="OCR every PDF without reading or writing the cache.")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help="Rasterization resolution.")
+    parser.add_argument("--config", default="", help="Tesseract config string used for OCR.")
+    args = parser.parse_args()
+
+    files = glob.glob(args.input, recursive=True)
+    if args.sample:
+        files = random.sample(files, min(args.sample, len(files)))
+
+    combined_df, report_df = process_files_in_parallel(
+        files, workers=args.workers, cache_path=None if args.no_cache else args.cache, dpi=args.dpi, config=args.config)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    combined_df.to_csv(args.out, index=False)
+    report_path = os.path.splitext(args.out)[0] + "_report.csv"
+    report_df.to_csv(report_path, index=False)
+    print(f"Saved completion data for {len(files)} files to {args.out}")
+    if not report_df.empty:
+        print(f"Extraction paths: {report_df['Extraction_Path'].value_counts().to_dict()}, "
+              f"pages OCR'd: {int(report_df['OCR_Pages'].sum())} (details in {report_path})")
+
+if __name__ == "__main__":
+    with profile("extract_completion_data"):
+        main()
@@ -0,0 +1,160 @@
+"""
+lxml/XPath parsing of NDIC pages.
+
+`parse_production_page_lxml` is a drop-in replacement for the BeautifulSoup based
+`parse_production_page`. It returns the same (header dict, production rows) result
+while building the tree in C and jumping straight to the "Well data content table"
+rows with XPath. `parse_operators_lxml` does the same for the operator dropdown.
+Scraped rows are written to the production CSV as text and typed once when it is
+read, see `read_production_csv` in schema.py.
+
+Benchmark and parity check against the BeautifulSoup path, on synthetic pages or the
+saved getwellprod.asp pages in data/fixtures/ndic (tests/test_fast_parse.py checks
+the same parity with pytest):
+    python src/get_data/fast_parse.py --pages 500
+    python src/get_data/fast_parse.py --fixtures data/fixtures/ndic
+"""
+import argparse
+import glob
+import os
+import time
+
+from lxml import etree, html as lxml_html
+
+from scrape_production_data import NDIC_REGEX, parse_production_page
+
+
+def _inner_html(element):
+    """Serialises the children of an element, like BeautifulSoup's decode_contents()."""
+    parts = [element.text or ""]
+    for child in element:
+        parts.append(etree.tostring(child, encoding=str, method="html", with_tail=True))
+    return "".join(parts)
+
+
+def parse_well_metadata_lxml(metadata_cell):
+    """
+    Parse well header metadata from the first cell of the production table.
+    Args:
+        metadata_cell: lxml element of the cell containing the metadata.
+    Returns:
+        dict: Parsed metadata as key-value pairs.
+    """
+    if metadata_cell is None or not metadata_cell.xpath(".//div"):
+        return {}
+    matches = NDIC_REGEX.findall(_inner_html(metadata_cell))
+    return {key.strip(): value.strip() for key, value in matches}
+
+
+def parse_production_page_lxml(page, file_number):
+    """
+    Parse a getwellprod.asp response into well header metadata and production rows.
+    Args:
+        page (str or bytes): HTML of the production page.
+        file_number: NDIC file number the page was requested for.
+    Returns:
+        tuple: (well header dict, list of production rows), same as `parse_production_page`.
+    """
+    # lxml raises on an empty document where BeautifulSoup finds no table
+    if not page or not page.strip():
+        print(f"No production data found for File No: {file_number}")
+        return {}, []
+    tree = lxml_html.fromstring(page)
+    tables = tree.xpath('//table[@summary="Well data content table"]')
+    if not tables:
+        print(f"No production data found for File No: {file_number}")
+        return {}, []
+
+    rows = tables[0].xpath(".//tr")
+    first_row = rows[0].xpath(".//td")
+    # Without a metadata cell there is no header record, as with `parse_production_page`
+    well_header_data = {}
+    if first_row:
+        try:
+            well_header_data = parse_well_metadata_lxml(first_row[0])
+            well_header_data["FileNumber"] = file_number
+        except Exception as e:
+            print(f"Error parsing file: {file_number}, error: {e}")
+
+    production_data = [
+        [file_number] + [cell.text_content().strip() for cell in row.xpath(".//td")]
+        for row in rows[1:]
+    ]
+    return well_header_data, production_data
+
+
+def parse_operators_lxml(page):
+    """Parse the operator dropdown of findwellsvw.asp into a name -> value dict."""
+    tree = lxml_html.fromstring(page)
+    options = tree.xpath('//select[@name="ddmOperator"]/option')
+    return {
+        option.text_content().strip(): option.get("value").strip()
+        for option in options if option.get("value")
+    }
+
+
+def benchmark(pages, repeat=3):
+    """
+    Times the BeautifulSoup and lxml page parsers on the same pages and checks parity.
+
+    Parameters:
+        pages (list of tuple): (file_number, html) pairs.
+        repeat (int): Timing repetitions, the best run is reported.
+
+    Returns:
+        dict: Best seconds per parser, speedup and the file numbers whose outputs differ.
+    """
+    mismatches = [
+        file_number for file_number, page in pages
+        if parse_production_page(page, file_number) != parse_production_page_lxml(page, file_number)
+    ]
+
+    timings = {}
+    for name, parser in (("bs4", parse_production_page), ("lxml", parse_production_page_lxml)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for file_number, page in pages:
+                parser(page, file_number)
+            best = min(best, time.perf_counter() - start)
+        timings[name] = best
+
+    return {**timings, "speedup": timings["bs4"] / timings["lxml"], "mismatches": mismatches}
+
+
+def load_fixture_pages(fixture_dir):
+    """Reads saved `<file_number>.html` pages from a directory."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages.append((os.path.splitext(os.path.basename(path))[0], f.read()))
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lxml page parser against BeautifulSoup.")
+    parser.add_argument("--fixtures", default=None, help="Directory of saved <file_number>.html pages.")
+    parser.add_argument("--pages", type=int, default=300, help="Synthetic pages to generate without fixtures.")
+    parser.add_argument("--months", type=int, default=120, help="Months of production per synthetic page.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.fixtures:
+        pages = load_fixture_pages(args.fixtures)
+    else:
+        from ndic_stub_server import render_production_page
+        pages = [(str(10000 + i), render_production_page(10000 + i, args.months)) for i in range(args.pages)]
+
+    result = benchmark(pages, args.repeat)
+    print(f"Parsed {len(pages)} pages")
+    print(f"BeautifulSoup: {result['bs4']:.3f} s ({result['bs4'] / len(pages) * 1000:.2f} ms/page)")
+    print(f"lxml:          {result['lxml']:.3f} s ({result['lxml'] / len(pages) * 1000:.2f} ms/page)")
+    print(f"Speedup:       {result['speedup']:.1f}x")
+    if result["mismatches"]:
+        print(f"Parity FAILED for File Nos: {', '.join(result['mismatches'])}")
+        raise SystemExit(1)
+    print("Parity OK: both parsers return identical header and production rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Stage timers, counters and profiling for the data pipeline and dashboard.
+
+Stages are timed with `timer("stage")` blocks or the `@timed("stage")` decorator, and
+`count("name", n)` adds to counters such as HTTP requests, bytes downloaded, pages
+OCR'd and curve fits. Every `Metrics` keeps the durations of each stage for a
+histogram and summary. When `PIPELINE_METRICS` is set to a file path, every timing
+and count is also appended to it as one JSON line, from any process or thread, and
+`python src/get_data/instrumentation.py summarize <file>` shows where the time went.
+
+Setting `PIPELINE_PROFILE=cprofile` (or `pyinstrument`, if installed) makes the
+`profile("name")` blocks around each script's main work write a profile to
+`data/profiles/`.
+
+Usage:
+    PIPELINE_METRICS=data/metrics.jsonl python src/get_data/scrape_production_data.py
+    PIPELINE_PROFILE=cprofile python src/get_data/download_wellfiles.py
+    python src/get_data/instrumentation.py summarize data/metrics.jsonl
+"""
+import argparse
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+try:
+    import pyinstrument
+except ImportError:  # only needed for PIPELINE_PROFILE=pyinstrument
+    pyinstrument = None
+
+METRICS_PATH_ENV = "PIPELINE_METRICS"
+PROFILE_ENV = "PIPELINE_PROFILE"
+DEFAULT_PROFILE_DIR = "data/profiles"
+# Histogram bucket upper edges in seconds, the last bucket is everything slower
+HISTOGRAM_EDGES = [0.001, 0.01, 0.1, 1.0, 10.0, 60.0]
+
+
+class Metrics:
+    """Thread-safe stage timings and counters, optionally streamed to a JSON-lines file."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.timings = defaultdict(list)
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_pid = None
+
+    def _write(self, event):
+        if not self.path:
+            return
+        event.update({"ts": time.time(), "pid": os.getpid()})
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            # Forked pool workers open their own handle, lines are appended whole
+            if self._file is None or self._file_pid != os.getpid():
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a", buffering=1)
+                self._file_pid = os.getpid()
+            self._file.write(line)
+
+    def record(self, stage, seconds):
+        """Adds one duration of a stage."""
+        with self._lock:
+            self.timings[stage].append(seconds)
+        self._write({"type": "timer", "name": stage, "value": seconds})
+
+    def count(self, name, n=1):
+        """Adds `n` to a counter."""
+        with self._lock:
+            self.counters[name] += n
+        self._write({"type": "counter", "name": name, "value": n})
+
+    @contextlib.contextmanager
+    def timer(self, stage):
+        """Times the block as one call of `stage`, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def timed(self, stage=None):
+        """Decorator timing every call of a function, as `stage` or the function's name."""
+        def decorator(func):
+            name = stage or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def histogram(self, stage, edges=HISTOGRAM_EDGES):
+        """Number of calls of a stage per duration bucket, keyed by the bucket's upper edge."""
+        durations = np.asarray(self.timings.get(stage, []), dtype=float)
+        counts = np.bincount(np.searchsorted(edges, durations, side="left"), minlength=len(edges) + 1)
+        labels = [f"<={edge:g}s" for edge in edges] + [f">{edges[-1]:g}s"]
+        return dict(zip(labels, counts.tolist()))
+
+    def summary(self):
+        """
+        Per-stage timing statistics.
+
+        Returns:
+            list of dict: stage, calls, total, mean, p50, p90 and max seconds, slowest total first.
+        """
+        with self._lock:
+            timings = {stage: list(durations) for stage, durations in self.timings.items()}
+        return summarize_timings(timings)
+
+    def reset(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def summarize_timings(timings):
+    """Statistics of {stage: [seconds, ...]}, see `Metrics.summary`."""
+    rows = []
+    for stage, durations in timings.items():
+        durations = np.asarray(durations, dtype=float)
+        if len(durations) == 0:
+            continue
+        rows.append({"stage": stage, "calls": len(durations), "total": float(durations.sum()),
+                     "mean": float(durations.mean()), "p50": float(np.percentile(durations, 50)),
+                     "p90": float(np.percentile(durations, 90)), "max": float(durations.max())})
+    return sorted(rows, key=lambda row: row["total"], reverse=True)
+
+
+# Process-wide metrics used by the pipeline scripts
+metrics = Metrics(os.environ.get(METRICS_PATH_ENV) or None)
+timer = metrics.timer
+timed = metrics.timed
+count = metrics.count
+
+
+def count_response(response, metrics=metrics):
+    """Counts an HTTP request and the bytes of its (already read) response body."""
+    metrics.count("http_requests")
+    metrics.count("bytes_received", len(response.content))
+
+
+@contextlib.contextmanager
+def profile(name, profiler=None, out_dir=DEFAULT_PROFILE_DIR):
+    """
+    Profiles the block when PIPELINE_PROFILE (or `profiler`) is "cprofile" or "pyinstrument".
+
+    cProfile stats are written to `<out_dir>/<name>-<pid>.prof` (open them with pstats or
+    snakeviz) and the 20 slowest functions printed, pyinstrument writes an HTML report.
+    Without a profiler the block just runs.
+    """
+    profiler = (profiler or os.environ.get(PROFILE_ENV) or "").lower()
+    if profiler not in ("cprofile", "pyinstrument"):
+        yield
+        return
+    if profiler == "pyinstrument" and pyinstrument is None:
+        print("pyinstrument is not installed, profiling with cProfile instead")
+        profiler = "cprofile"
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{name}-{os.getpid()}")
+    if profiler == "cprofile":
+        import cProfile
+        import pstats
+
+        prof = cProfile.Profile()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            prof.dump_stats(path + ".prof")
+            pstats.Stats(prof).sort_stats("cumulative").print_stats(20)
+            print(f"Profile written to {path}.prof")
+    else:
+        prof = pyinstrument.Profiler()
+        prof.start()
+        try:
+            yield
+        finally:
+            prof.stop()
+            with open(path + ".html", "w") as f:
+                f.write(prof.output_html())
+            print(f"Profile written to {path}.html")
+
+
+def read_metrics(path):
+    """
+    Reads a JSON-lines metrics file.
+
+    Returns:
+        tuple: ({stage: [seconds, ...]}, {counter: total})
+    """
+    timings = defaultdict(list)
+    counters = Counter()
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == "timer":
+                timings[event["name"]].append(event["value"])
+            elif event["type"] == "counter":
+                counters[event["name"]] += event["value"]
+    return timings, counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a JSON-lines metrics file.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summarize_parser = subparsers.add_parser("summarize", help="Per-stage timings, histograms and counters.")
+    summarize_parser.add_argument("path", help="Metrics file written with PIPELINE_METRICS set.")
+    args = parser.parse_args()
+
+    timings, counters = read_metrics(args.path)
+    print(f"{'stage':<32}{'calls':>8}{'total s':>12}{'mean s':>10}{'p50 s':>10}{'p90 s':>10}{'max s':>10}")
+    for row in summarize_timings(timings):
+        print(f"{row['stage']:<32}{row['calls']:>8}{row['total']:>12.3f}{row['mean']:>10.4f}"
+              f"{row['p50']:>10.4f}{row['p90']:>10.4f}{row['max']:>10.4f}")
+    histograms = Metrics()
+    histograms.timings = timings
+    for stage in timings:
+        print(f"{stage}: {histograms.histogram(stage)}")
+    for name, total in sorted(counters.items()):
+        print(f"{name}: {total:g}")
+
+
+if __name__ == "__main__":
+    main()
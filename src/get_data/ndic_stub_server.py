@@ -0,0 +1,297 @@
+"""
+Local stand-in for the NDIC website, used to exercise the scrapers without
+hitting the state server.
+
+It answers POSTs to `getwellprod.asp` with production pages in the same layout the
+scraper parses. Pages come from `<fixture_dir>/<file_number>.html` when present,
+otherwise a synthetic page is rendered. File numbers listed in `fail_numbers`
+return HTTP 500 a set number of times first, to exercise retries.
+
+GETs to `bwfiles/<prefix>/W<file_number>.pdf` return well file PDFs, from
+`<fixture_dir>/W<file_number>.pdf` or synthetic, with ETag and Range support. File
+numbers listed in `truncate_numbers` drop the connection halfway through the body a
+set number of times, to exercise resumed downloads.
+
+Usage:
+    python src/get_data/ndic_stub_server.py --port 8765 --fixtures data/fixtures/ndic
+"""
+import argparse
+import os
+import random
+import hashlib
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+def render_production_page(file_number, n_months=24, seed=None):
+    """
+    Renders a synthetic getwellprod.asp page for one well.
+
+    Parameters:
+        file_number (int or str): NDIC file number.
+        n_months (int): Number of monthly production rows.
+        seed (int, optional): Seed for the random rates, defaults to the file number.
+
+    Returns:
+        str: HTML of the page.
+    """
+    rng = random.Random(seed if seed is not None else int(file_number))
+    qi = rng.uniform(300, 1500)
+    di = rng.uniform(0.05, 0.2)
+    b = rng.uniform(0.3, 1.2)
+    header = (
+        f"NDIC File No: <b>{file_number}</b> &nbsp;&nbsp; API No: <b>33-053-{int(file_number) % 100000:05d}-00-00</b>"
+        f" &nbsp;&nbsp; Well Type: <b>OG</b> &nbsp;&nbsp; Well Status: <b>A</b> &nbsp;&nbsp; Status Date: <b>1/1/2015</b><br>"
+        f"Location: <b>SESE 24-153-101</b> &nbsp;&nbsp; Latitude: <b>{rng.uniform(47, 48.5):.6f}</b>"
+        f" &nbsp;&nbsp; Longitude: <b>{rng.uniform(-104, -102):.6f}</b><br>"
+        f"Current Operator: <b><span style=\"color:#000080\">STUB OPERATOR {int(file_number) % 7}</span></b><br>"
+        f"Current Well Name: <b>STUB WELL {file_number}H</b><br>"
+        f"Total Depth: <b>{rng.randint(15000, 22000)}</b> &nbsp;&nbsp; Field: <b>STUB FIELD {int(file_number) % 3}</b><br>"
+        f"Perfs: <b>{rng.randint(10000, 11000)}-{rng.randint(19000, 21000)}</b>"
+    )
+    rows = []
+    # NDIC lists the most recent month first
+    for month in reversed(range(n_months)):
+        year = 2015 + month // 12
+        rate = qi / (1 + b * di * month) ** (1 / b)
+        days = rng.choice([28, 30, 31]) if rng.random() > 0.03 else 0
+        oil = int(rate * days)
+        cells = ["BAKKEN", f"{month % 12 + 1}-{year}", days, oil, oil, int(oil * 0.8),
+                 int(oil * 1.5), int(oil * 1.4), int(oil * 0.1)]
+        rows.append("<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+
+    columns = ["Pool", "Date", "Days", "BBLS Oil", "Runs", "BBLS Water", "MCF Prod", "MCF Sold", "Vent/Flare"]
+    return (
+        "<html><head><title>Well Production</title></head><body>"
+        "<table summary=\"Well data content table\" border=\"1\">"
+        f"<tr><td colspan=\"9\"><div class=\"wellheader\">Well Information</div>{header}</td></tr>"
+        "<tr>" + "".join(f"<th>{col}</th>" for col in columns) + "</tr>"
+        + "".join(rows)
+        + "</table></body></html>"
+    )
+
+
+def completion_page_lines(file_number):
+    """
+    Lines of a synthetic completion data page, the same for a file number every time.
+
+    Parameters:
+        file_number (int or str): NDIC file number.
+
+    Returns:
+        list of str: Text lines of the page.
+    """
+    rng = random.Random(int(file_number))
+    return [
+        f"Well File No. {file_number}",
+        "Date Stimulated Stimulated Formation Top (Ft) Bottom (Ft) Stimulation Stages Volume Volume Units",
+        f"09/01/2014 Bakken {rng.randint(10000, 11000)} {rng.randint(19000, 21000)} {rng.randint(20, 50)} "
+        f"{rng.randint(40000, 120000)} Barrels",
+        "Type Treatment Acid % Lbs Proppant Maximum Treatment Pressure (PSI) Maximum Treatment Rate (BBLS/Min)",
+        f"Sand Frac 0 {rng.randint(2000000, 9000000)} {rng.randint(7000, 9500)} {rng.randint(30, 80)}.0",
+    ]
+
+
+def render_well_file(file_number, size_kb=64):
+    """
+    Renders a synthetic one-page well file PDF with a completion data text layer.
+
+    Parameters:
+        file_number (int or str): NDIC file number.
+        size_kb (int): Approximate file size, padded with a PDF comment.
+
+    Returns:
+        bytes: PDF file contents.
+    """
+    rng = random.Random(int(file_number))
+    lines = completion_page_lines(file_number)
+    text = "BT /F1 10 Tf 40 750 Td 14 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(text)} >>\nstream\n{text}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    body = "%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{obj}\nendobj\n"
+    # Pad to a realistic size so downloads span many chunks
+    padding = max(0, size_kb * 1024 - len(body) - 200)
+    for start in range(0, padding, 64):
+        body += "%" + "".join(rng.choice("0123456789abcdef") for _ in range(min(62, padding - start))) + "\n"
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    body += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return body.encode("latin-1")
+
+
+class StubNDICHandler(BaseHTTPRequestHandler):
+    """Request handler serving NDIC-style pages from fixtures or synthetic data."""
+
+    # HTTP/1.1 so clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="text/html"):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _well_file(self):
+        """Returns (file_number, PDF bytes) for a bwfiles request, or (None, None)."""
+        match = re.search(r"/bwfiles/\d+/W(\d+)\.pdf$", self.path)
+        if not match:
+            return None, None
+        file_number = match.group(1)
+        fixture = os.path.join(self.server.fixture_dir or "", f"W{file_number}.pdf")
+        if self.server.fixture_dir and os.path.exists(fixture):
+            with open(fixture, "rb") as f:
+                return file_number, f.read()
+        return file_number, render_well_file(file_number, self.server.pdf_size_kb)
+
+    def do_HEAD(self):
+        self.do_GET(head_only=True)
+
+    def do_GET(self, head_only=False):
+        file_number, data = self._well_file()
+        if file_number is None:
+            self._send(404, "Not found")
+            return
+        with self.server.lock:
+            self.server.request_counts[file_number] = self.server.request_counts.get(file_number, 0) + 1
+            remaining_failures = self.server.fail_numbers.get(file_number, 0)
+            if remaining_failures:
+                self.server.fail_numbers[file_number] = remaining_failures - 1
+            truncate = not head_only and self.server.truncate_numbers.get(file_number, 0) > 0
+            if truncate:
+                self.server.truncate_numbers[file_number] -= 1
+        if remaining_failures:
+            self._send(500, "Internal Server Error")
+            return
+
+        etag = '"' + hashlib.md5(data).hexdigest() + '"'
+        start, status = 0, 200
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (if_range is None or if_range == etag):
+            match = re.match(r"bytes=(\d+)-$", range_header)
+            if match:
+                start = int(match.group(1))
+                if start >= len(data):
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(data)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                status = 206
+        body = data[start:]
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        if truncate:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        if head_only:
+            return
+        if truncate:
+            # Send half the body, then drop the connection
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        if not self.path.endswith("getwellprod.asp"):
+            self._send(404, "Not found")
+            return
+
+        file_number = form.get("FileNumber", [""])[0]
+        with self.server.lock:
+            self.server.request_counts[file_number] = self.server.request_counts.get(file_number, 0) + 1
+            remaining_failures = self.server.fail_numbers.get(file_number, 0)
+            if remaining_failures:
+                self.server.fail_numbers[file_number] = remaining_failures - 1
+        if remaining_failures:
+            self._send(500, "Internal Server Error")
+            return
+
+        fixture = os.path.join(self.server.fixture_dir or "", f"{file_number}.html")
+        if self.server.fixture_dir and os.path.exists(fixture):
+            with open(fixture, encoding="utf-8") as f:
+                self._send(200, f.read())
+        elif file_number.isdigit():
+            self._send(200, render_production_page(file_number, self.server.n_months))
+        else:
+            self._send(200, "<html><body>No well found</body></html>")
+
+
+def serve(port=0, fixture_dir=None, fail_numbers=None, n_months=24, verbose=False,
+          truncate_numbers=None, pdf_size_kb=64):
+    """
+    Starts the stub server on a background thread.
+
+    Parameters:
+        port (int): Port to listen on, 0 picks a free port.
+        fixture_dir (str, optional): Directory of saved `<file_number>.html` pages and `W<file_number>.pdf` files.
+        fail_numbers (dict, optional): File number -> number of HTTP 500 responses before succeeding.
+        n_months (int): Months of production in synthetic pages.
+        verbose (bool): Log every request.
+        truncate_numbers (dict, optional): File number -> number of PDF downloads cut off halfway.
+        pdf_size_kb (int): Size of synthetic well file PDFs.
+
+    Returns:
+        tuple: (server, base_url). Call `server.shutdown()` when done.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubNDICHandler)
+    server.daemon_threads = True
+    server.fixture_dir = fixture_dir
+    server.fail_numbers = dict(fail_numbers or {})
+    server.request_counts = {}
+    server.truncate_numbers = dict(truncate_numbers or {})
+    server.n_months = n_months
+    server.pdf_size_kb = pdf_size_kb
+    server.verbose = verbose
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve NDIC-style pages locally.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=None, help="Directory of saved <file_number>.html pages.")
+    parser.add_argument("--months", type=int, default=24, help="Months of production in synthetic pages.")
+    args = parser.parse_args()
+
+    server, base_url = serve(args.port, args.fixtures, n_months=args.months, verbose=True)
+    print(f"Serving NDIC stand-in at {base_url}/oilgas/basic/getwellprod.asp "
+          f"and {base_url}/oilgas/basic/bwfiles/ (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Persistent cache of OCR results for NDIC well file PDFs.
+
+Page text is keyed by the PDF's content hash, page number, DPI and Tesseract
+config, and the located completion page is stored per PDF. Re-running the
+extraction after changing the parser in completion_parser.py then reads text
+from the cache instead of OCRing every PDF again. Least recently used page text and
+target pages are evicted once the cache grows past `max_bytes`.
+
+Usage:
+    python src/get_data/ocr_cache.py warm "data/raw/well_files/*.pdf" --workers 8
+    python src/get_data/ocr_cache.py --dpi 300 --config "--psm 6" warm "data/raw/well_files/*.pdf"
+    python src/get_data/ocr_cache.py stats
+    python src/get_data/ocr_cache.py show data/raw/well_files/W18406.pdf
+    python src/get_data/ocr_cache.py reparse "data/raw/well_files/*.pdf" --out data/processed/completion_data.csv
+"""
+import argparse
+import glob
+import hashlib
+import os
+import sqlite3
+import time
+
+DEFAULT_CACHE_PATH = "data/cache/ocr_cache.sqlite"
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """Returns the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class OcrCache:
+    """SQLite cache of per-page OCR text and located target pages."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._puts = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One connection per process, pool workers each open their own
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS page_text (
+                pdf_hash TEXT, page INTEGER, dpi INTEGER, config TEXT,
+                text TEXT, size INTEGER, last_used REAL,
+                PRIMARY KEY (pdf_hash, page, dpi, config)
+            );
+            CREATE INDEX IF NOT EXISTS idx_page_text_last_used ON page_text (last_used);
+            CREATE TABLE IF NOT EXISTS target_page (
+                pdf_hash TEXT, dpi INTEGER, config TEXT,
+                file_name TEXT, page INTEGER, path TEXT, text TEXT, last_used REAL,
+                PRIMARY KEY (pdf_hash, dpi, config)
+            );
+            """
+        )
+        self.conn.commit()
+
+    def get_text(self, pdf_hash, page, dpi, config):
+        """Returns cached OCR text for one page, or None."""
+        row = self.conn.execute(
+            "SELECT text FROM page_text WHERE pdf_hash = ? AND page = ? AND dpi = ? AND config = ?",
+            (pdf_hash, page, dpi, config),
+        ).fetchone()
+        if row is None:
+            return None
+        self.conn.execute(
+            "UPDATE page_text SET last_used = ? WHERE pdf_hash = ? AND page = ? AND dpi = ? AND config = ?",
+            (time.time(), pdf_hash, page, dpi, config),
+        )
+        self.conn.commit()
+        return row[0]
+
+    def put_text(self, pdf_hash, page, dpi, config, text):
+        """Stores OCR text for one page."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO page_text VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (pdf_hash, page, dpi, config, text, len(text.encode()), time.time()),
+        )
+        self.conn.commit()
+        self._count_put()
+
+    def _count_put(self):
+        self._puts += 1
+        if self._puts % 100 == 0:
+            self.evict()
+
+    def get_target(self, pdf_hash, dpi, config):
+        """
+        Returns the located completion page for a PDF.
+
+        Returns:
+            tuple or None: (page number, page text, path taken), or None if not cached.
+        """
+        row = self.conn.execute(
+            "SELECT page, text, path FROM target_page WHERE pdf_hash = ? AND dpi = ? AND config = ?",
+            (pdf_hash, dpi, config),
+        ).fetchone()
+        if row is not None:
+            self.conn.execute(
+                "UPDATE target_page SET last_used = ? WHERE pdf_hash = ? AND dpi = ? AND config = ?",
+                (time.time(), pdf_hash, dpi, config),
+            )
+            self.conn.commit()
+        return row
+
+    def put_target(self, pdf_hash, dpi, config, file_name, page, path, text):
+        """Stores the located completion page and its text for a PDF."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO target_page VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (pdf_hash, dpi, config, file_name, page, path, text, time.time()),
+        )
+        self.conn.commit()
+        self._count_put()
+
+    def total_bytes(self):
+        (page_bytes,) = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM page_text").fetchone()
+        (target_bytes,) = self.conn.execute("SELECT COALESCE(SUM(LENGTH(text)), 0) FROM target_page").fetchone()
+        return page_bytes + target_bytes
+
+    def evict(self):
+        """Drops the least recently used page text and target pages until the cache fits in `max_bytes`."""
+        excess = self.total_bytes() - self.max_bytes
+        while excess > 0:
+            rows = self.conn.execute(
+                """
+                SELECT 'page_text', rowid, size, last_used FROM page_text
+                UNION ALL
+                SELECT 'target_page', rowid, COALESCE(LENGTH(text), 0), last_used FROM target_page
+                ORDER BY last_used ASC LIMIT 500
+                """
+            ).fetchall()
+            if not rows:
+                break
+            dropped = {"page_text": [], "target_page": []}
+            for table, rowid, size, _ in rows:
+                dropped[table].append((rowid,))
+                excess -= size
+                if excess <= 0:
+                    break
+            for table, rowids in dropped.items():
+                self.conn.executemany(f"DELETE FROM {table} WHERE rowid = ?", rowids)
+            self.conn.commit()
+
+    def stats(self):
+        """Returns counts and sizes of the cached entries."""
+        (pages, page_bytes) = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM page_text").fetchone()
+        (pdfs,) = self.conn.execute("SELECT COUNT(DISTINCT pdf_hash) FROM page_text").fetchone()
+        targets = dict(self.conn.execute("SELECT path, COUNT(*) FROM target_page GROUP BY path").fetchall())
+        return {"pages": pages, "page_bytes": page_bytes, "pdfs_with_ocr_pages": pdfs,
+                "target_pages": targets, "total_bytes": self.total_bytes(), "max_bytes": self.max_bytes}
+
+    def close(self):
+        self.conn.close()
+
+
+def warm(files, cache_path, workers=None, dpi=200, config=""):
+    """Runs the extraction over `files` so every located page and OCR'd page is cached under `dpi` and `config`."""
+    from extract_completion_data import process_files_in_parallel
+
+    combined_df, report_df = process_files_in_parallel(files, workers=workers, cache_path=cache_path,
+                                                       dpi=dpi, config=config)
+    print(f"Warmed cache for {len(files)} files: {report_df['Extraction_Path'].value_counts().to_dict()}")
+    return combined_df
+
+
+def reparse(files, cache_path, dpi, config):
+    """
+    Re-runs the completion parser on cached target pages only, without any OCR.
+
+    Returns:
+        tuple: (completion data DataFrame with one row and Parse_Status per cached
+        file, list of files with no cached target page)
+    """
+    import pandas as pd
+    from completion_parser import extract_file_number, parse_completions
+
+    cache = OcrCache(cache_path)
+    items = []
+    extraction_paths = []
+    missing = []
+    for path in files:
+        hit = cache.get_target(file_hash(path), dpi, config)
+        if hit is None:
+            missing.append(path)
+            continue
+        page, text, extraction_path = hit
+        items.append((extract_file_number(path), text))
+        extraction_paths.append(extraction_path)
+    cache.close()
+    # One typed table for all files instead of a DataFrame per file
+    combined_df = parse_completions(items)
+    combined_df["Extraction_Path"] = pd.Series(extraction_paths, dtype="string")
+    return combined_df, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm, inspect or reuse the OCR cache.")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH, help="SQLite cache file.")
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--config", default="", help="Tesseract config string used for OCR.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    warm_parser = subparsers.add_parser("warm", help="OCR PDFs and cache the results.")
+    warm_parser.add_argument("input", help="Glob of PDF files.")
+    warm_parser.add_argument("--workers", type=int, default=None)
+
+    subparsers.add_parser("stats", help="Show cache size and contents.")
+
+    show_parser = subparsers.add_parser("show", help="Show cached entries for one PDF.")
+    show_parser.add_argument("pdf")
+
+    reparse_parser = subparsers.add_parser("reparse", help="Parse cached target pages without OCR.")
+    reparse_parser.add_argument("input", help="Glob of PDF files.")
+    reparse_parser.add_argument("--out", default="data/processed/completion_data.csv")
+
+    args = parser.parse_args()
+
+    if args.command == "warm":
+        warm(glob.glob(args.input, recursive=True), args.cache, args.workers, args.dpi, args.config)
+    elif args.command == "stats":
+        cache = OcrCache(args.cache)
+        for key, value in cache.stats().items():
+            print(f"{key}: {value}")
+        cache.close()
+    elif args.command == "show":
+        cache = OcrCache(args.cache)
+        pdf_hash = file_hash(args.pdf)
+        pages = cache.conn.execute(
+            "SELECT page, dpi, config, size FROM page_text WHERE pdf_hash = ? ORDER BY page", (pdf_hash,)
+        ).fetchall()
+        target = cache.get_target(pdf_hash, args.dpi, args.config)
+        print(f"{args.pdf} ({pdf_hash[:12]}): {len(pages)} OCR'd pages cached")
+        for page, dpi, config, size in pages:
+            print(f"  page {page} dpi={dpi} config='{config}' {size} bytes")
+        if target:
+            print(f"Target page {target[0]} via {target[2]}:\n{target[1]}")
+        else:
+            print("No target page cached.")
+        cache.close()
+    elif args.command == "reparse":
+        combined_df, missing = reparse(glob.glob(args.input, recursive=True), args.cache, args.dpi, args.config)
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        combined_df.to_csv(args.out, index=False)
+        print(f"Parsed {len(combined_df)} records to {args.out} ({combined_df['Parse_Status'].value_counts().to_dict()}), "
+              f"{len(missing)} files have no cached target page.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Checkpointing for the NDIC production scraper.
+
+A SQLite manifest records, for every file number, when it was last scraped, its
+well status and the last production month seen. Production rows are appended to
+the output CSV as each well completes, so an interrupted run can be resumed, and a
+monthly refresh only needs to revisit wells that are due for a new month.
+"""
+import csv
+import datetime
+import json
+import os
+import sqlite3
+
+import pandas as pd
+
+DEFAULT_MANIFEST_PATH = "data/raw/scrape_manifest.sqlite"
+
+# NDIC usually publishes a month of production about two months after it ends
+DEFAULT_REPORTING_LAG_MONTHS = 2
+
+
+def production_month(date_text):
+    """
+    Converts an NDIC production date ("M-YYYY") to a sortable "YYYY-MM" string.
+
+    Parameters:
+        date_text (str): Date as shown on the production page.
+
+    Returns:
+        str or None: Month as "YYYY-MM", or None if the text is not a month.
+    """
+    try:
+        month, year = str(date_text).strip().split("-")
+        return f"{int(year):04d}-{int(month):02d}"
+    except ValueError:
+        return None
+
+
+def last_production_month(production_data):
+    """Returns the latest "YYYY-MM" month in a well's production rows, or None."""
+    months = [production_month(row[2]) for row in production_data if len(row) > 2]
+    months = [month for month in months if month]
+    return max(months) if months else None
+
+
+def expected_latest_month(today=None, lag_months=DEFAULT_REPORTING_LAG_MONTHS):
+    """Returns the most recent "YYYY-MM" month expected to be published by `today`."""
+    today = today or datetime.date.today()
+    index = today.year * 12 + (today.month - 1) - lag_months
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class ScrapeManifest:
+    """SQLite record of scrape progress per file number."""
+
+    def __init__(self, path=DEFAULT_MANIFEST_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS wells (
+                file_number TEXT PRIMARY KEY,
+                well_status TEXT,
+                last_scraped TEXT,
+                last_production_month TEXT,
+                row_count INTEGER,
+                status TEXT,
+                error TEXT
+            )
+            """
+        )
+        self.conn.commit()
+
+    def reset(self):
+        """Forgets all progress, used when starting a full scrape."""
+        self.conn.execute("DELETE FROM wells")
+        self.conn.commit()
+
+    def wells(self):
+        """Returns a dict of file number -> manifest record."""
+        cursor = self.conn.execute("SELECT * FROM wells")
+        columns = [col[0] for col in cursor.description]
+        return {row[0]: dict(zip(columns, row)) for row in cursor.fetchall()}
+
+    def record_success(self, file_number, well_status, last_month, row_count):
+        """Marks a well as scraped. The last production month never moves backwards."""
+        self.conn.execute(
+            """
+            INSERT INTO wells (file_number, well_status, last_scraped, last_production_month, row_count, status, error)
+            VALUES (?, ?, ?, ?, ?, 'ok', NULL)
+            ON CONFLICT (file_number) DO UPDATE SET
+                well_status = excluded.well_status,
+                last_scraped = excluded.last_scraped,
+                last_production_month = MAX(COALESCE(wells.last_production_month, ''),
+                                            COALESCE(excluded.last_production_month, '')),
+                row_count = COALESCE(wells.row_count, 0) + excluded.row_count,
+                status = 'ok',
+                error = NULL
+            """,
+            (str(file_number), well_status, datetime.datetime.now().isoformat(timespec="seconds"),
+             last_month, row_count),
+        )
+        self.conn.commit()
+
+    def record_failure(self, file_number, error):
+        """Marks a well as failed so the next resume or incremental run retries it."""
+        self.conn.execute(
+            """
+            INSERT INTO wells (file_number, status, error) VALUES (?, 'failed', ?)
+            ON CONFLICT (file_number) DO UPDATE SET status = 'failed', error = excluded.error
+            """,
+            (str(file_number), str(error)),
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def select_wells(file_numbers, manifest, mode, well_statuses=None, today=None,
+                 lag_months=DEFAULT_REPORTING_LAG_MONTHS):
+    """
+    Chooses which wells to fetch for a resumed or incremental run.
+
+    Parameters:
+        file_numbers (list): All file numbers for the operator.
+        manifest (ScrapeManifest): Progress recorded by earlier runs.
+        mode (str): "full", "resume" (skip wells already scraped) or
+            "incremental" (only wells that are new, failed, changed status or are due a new month).
+        well_statuses (dict, optional): File number -> current status from the search results.
+        today (datetime.date, optional): Reference date for the incremental check.
+        lag_months (int): Reporting lag used to decide when a new month is due.
+
+    Returns:
+        list: File numbers to fetch, in the original order.
+    """
+    if mode == "full":
+        return list(file_numbers)
+
+    records = manifest.wells()
+    due_month = expected_latest_month(today, lag_months)
+    selected = []
+    for file_number in file_numbers:
+        record = records.get(str(file_number))
+        if record is None or record["status"] != "ok":
+            selected.append(file_number)
+        elif mode == "incremental":
+            listed_status = (well_statuses or {}).get(file_number)
+            status_changed = listed_status is not None and listed_status != record["well_status"]
+            month_due = record["well_status"] == "A" and (record["last_production_month"] or "") < due_month
+            if status_changed or month_due:
+                selected.append(file_number)
+    return selected
+
+
+class ScrapeOutputWriter:
+    """
+    Streams scraped wells to disk as they arrive.
+
+    Production rows are appended to the production CSV. Well headers have a different
+    set of keys per well, so they are appended to a JSON-lines file and turned into the
+    header CSV by `finalize`.
+    """
+
+    def __init__(self, production_path, header_path, production_columns, append=False):
+        self.production_path = production_path
+        self.header_path = header_path
+        self.header_log_path = os.path.splitext(header_path)[0] + ".jsonl"
+
+        write_columns = not (append and os.path.exists(production_path))
+        mode = "a" if append else "w"
+        self.production_file = open(production_path, mode, newline="", encoding="utf-8")
+        self.production_writer = csv.writer(self.production_file)
+        if write_columns:
+            self.production_writer.writerow(production_columns)
+        self.header_file = open(self.header_log_path, mode, encoding="utf-8")
+
+    def write(self, well_data, production_data):
+        """Appends one well's header and production rows and flushes them to disk."""
+        if well_data:
+            self.header_file.write(json.dumps(well_data) + "\n")
+            self.header_file.flush()
+        self.production_writer.writerows(production_data)
+        self.production_file.flush()
+
+    def finalize(self):
+        """Closes the files and writes the header CSV, keeping the latest header per well."""
+        self.production_file.close()
+        self.header_file.close()
+        with open(self.header_log_path, encoding="utf-8") as f:
+            headers = [json.loads(line) for line in f if line.strip()]
+        welldata_df = pd.DataFrame(headers)
+        if "FileNumber" in welldata_df.columns:
+            welldata_df = welldata_df.drop_duplicates(subset="FileNumber", keep="last")
+        welldata_df.to_csv(self.header_path, index=False)
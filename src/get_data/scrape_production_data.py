@@ -1,32 +1,55 @@
-
+import argparse
 import os
 import re
 import requests
 from bs4 import BeautifulSoup
-import pandas as pd
+
+from instrumentation import count_response, profile, timed
+from scrape_manifest import (DEFAULT_MANIFEST_PATH, ScrapeManifest, ScrapeOutputWriter,
+                             last_production_month, production_month, select_wells)
 
 # URLs
 BASE_URL = "https://www.dmr.nd.gov/oilgas/findwellsvw.asp"
 PRODUCTION_URL = "https://www.dmr.nd.gov/oilgas/basic/getwellprod.asp"
 
-def get_operators():
-    """Fetch the list of operators from the dropdown menu."""
-    response = requests.get(BASE_URL)
-    if response.status_code != 200:
-        raise Exception(f"Failed to access {BASE_URL}, status code {response.status_code}")
+# Well header metadata is a run of "Label: <b>value</b>" pairs
+NDIC_REGEX = re.compile(r"'?([\w\s]+):\s*'?\s*,?\s*<b>(?:<span.*?>)?(.*?)(?:</span>)?</b>", re.VERBOSE)
 
-    soup = BeautifulSoup(response.text, "html.parser")
+# Output files and columns
+PRODUCTION_OUTPUT = "data/raw/ndic_production_data.csv"
+HEADER_OUTPUT = "data/raw/ndic_wellheader_data.csv"
+PRODUCTION_COLUMNS = ["File Number", "Pool", "Date", "Days", "BBLS Oil", "Runs", "BBLS Water", "MCF Prod", "MCF Sold", "Vent/Flare"]
+
+def parse_operators(html):
+    """Parse the operator dropdown of findwellsvw.asp into a name -> value dict."""
+    soup = BeautifulSoup(html, "html.parser")
     operator_dropdown = soup.find("select", {"name": "ddmOperator"})
     options = operator_dropdown.find_all("option")
 
-    operators = {option.text.strip(): option["value"].strip() for option in options if option["value"]}
+    return {option.text.strip(): option["value"].strip() for option in options if option["value"]}
+
+@timed()
+def get_operators(parse_page=None):
+    """
+    Fetch the list of operators from the dropdown menu.
+    Args:
+        parse_page (callable, optional): Dropdown parser, defaults to `parse_operators`.
+    """
+    response = requests.get(BASE_URL)
+    count_response(response)
+    if response.status_code != 200:
+        raise Exception(f"Failed to access {BASE_URL}, status code {response.status_code}")
+
+    operators = (parse_page or parse_operators)(response.text)
     print(f"Found {len(operators)} operators.")
     return operators
 
+@timed()
 def get_file_numbers(operator_value):
     """Fetch file numbers for a specific operator."""
     payload = {"ddmOperator": operator_value}
     response = requests.post(BASE_URL, data=payload)
+    count_response(response)
     if response.status_code != 200:
         raise Exception(f"Failed to fetch file numbers for operator {operator_value}")
 
@@ -44,6 +67,35 @@ def get_file_numbers(operator_value):
     print(f"Found {len(file_numbers)} file numbers for operator.")
     return file_numbers
 
+@timed()
+def get_well_statuses(operator_value):
+    """
+    Fetch file numbers with their well status from the operator search results.
+    Returns:
+        dict: file number -> well status, or None where the results table has no status column.
+    """
+    payload = {"ddmOperator": operator_value}
+    response = requests.post(BASE_URL, data=payload)
+    count_response(response)
+    if response.status_code != 200:
+        raise Exception(f"Failed to fetch file numbers for operator {operator_value}")
+
+    soup = BeautifulSoup(response.text, "html.parser")
+    table = soup.find("table", {"summary": "Well Log search results table"})
+    rows = table.find_all("tr")
+    header = [cell.text.strip().lower() for cell in rows[0].find_all(["th", "td"])]
+    status_index = next((i for i, name in enumerate(header) if "status" in name), None)
+
+    well_statuses = {}
+    for row in rows[1:]:
+        cols = row.find_all("td")
+        if cols:
+            status = cols[status_index].text.strip() if status_index is not None and status_index < len(cols) else None
+            well_statuses[cols[0].text.strip()] = status
+
+    print(f"Found {len(well_statuses)} file numbers for operator.")
+    return well_statuses
+
 def parse_well_metadata(metadata_tag):
     """
     Parse metadata directly from a BeautifulSoup Tag object.
@@ -59,39 +111,40 @@ def parse_well_metadata(metadata_tag):
     if not div:
         return metadata  # Return empty if no metadata is found
     inner_html = metadata_tag.decode_contents()
-    NDIC_regex = re.compile(r"'?([\w\s]+):\s*'?\s*,?\s*<b>(?:<span.*?>)?(.*?)(?:</span>)?</b>", re.VERBOSE)     
     # Apply the regex
-    matches = NDIC_regex.findall(inner_html)
+    matches = NDIC_REGEX.findall(inner_html)
     # Convert matches to dictionary
     result = {key.strip(): value.strip() for key, value in matches}
 
     return result
 
-def get_production_data(file_number):
+def parse_production_page(html, file_number):
     """
-    Submit file number and scrape production data.
+    Parse a getwellprod.asp response into well header metadata and production rows.
+    Args:
+        html (str): HTML of the production page.
+        file_number: NDIC file number the page was requested for.
+    Returns:
+        tuple: (well header dict, list of production rows)
     """
-    payload = {"FileNumber": file_number}
-    response = requests.post(PRODUCTION_URL, data=payload)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch production data for File No: {file_number}")
-
-    soup = BeautifulSoup(response.text, "html.parser")
+    soup = BeautifulSoup(html, "html.parser")
     # Locate production data rows
     table = soup.find("table", {"summary": "Well data content table"})  # Find production table
     if not table:
         print(f"No production data found for File No: {file_number}")
-        return []
+        return {}, []
     
     rows = table.find_all("tr")
     first_row = rows[0].find_all("td")    
     metadata_tag = first_row[0] if len(first_row) >= 1 else None    
-    #parse well header metadata
-    try:
-        well_header_data = parse_well_metadata(metadata_tag)
-        well_header_data["FileNumber"] = file_number
-    except Exception as e:
-         print(f"Error parsing file: {file_number}, error: {e}")
+    #parse well header metadata, none without a metadata cell
+    well_header_data = {}
+    if metadata_tag is not None:
+        try:
+            well_header_data = parse_well_metadata(metadata_tag)
+            well_header_data["FileNumber"] = file_number
+        except Exception as e:
+            print(f"Error parsing file: {file_number}, error: {e}")
     # Extract production data    
     production_data = []
     for row in rows[1:]:
@@ -100,11 +153,52 @@ def get_production_data(file_number):
 
     return well_header_data, production_data
 
+@timed()
+def get_production_data(file_number, session=None, url=PRODUCTION_URL, parse_page=None):
+    """
+    Submit file number and scrape production data.
+    Args:
+        file_number: NDIC file number.
+        session (requests.Session, optional): Session to reuse connections, defaults to a one-off request.
+        url (str): Production page URL.
+        parse_page (callable, optional): Page parser, defaults to `parse_production_page`.
+    """
+    payload = {"FileNumber": file_number}
+    response = (session or requests).post(url, data=payload)
+    count_response(response)
+    if response.status_code != 200:
+        raise Exception(f"Failed to fetch production data for File No: {file_number}")
+
+    return (parse_page or parse_production_page)(response.text, file_number)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape NDIC well header and production data for an operator.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Concurrent requests. 1 fetches wells one at a time.")
+    parser.add_argument("--rate", type=float, default=5.0, help="Maximum requests per second in concurrent mode.")
+    parser.add_argument("--retries", type=int, default=3, help="Retries per well in concurrent mode.")
+    parser.add_argument("--production-url", default=PRODUCTION_URL,
+                        help="Production page URL, e.g. a local stand-in server for testing.")
+    parser.add_argument("--parser", choices=["bs4", "lxml"], default="bs4",
+                        help="HTML parser backend for operator and production pages, lxml is several times faster (see fast_parse.py).")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--resume", action="store_true",
+                      help="Continue an interrupted scrape, skipping wells already saved.")
+    mode.add_argument("--incremental", action="store_true",
+                      help="Only fetch wells that are new, failed, changed status or are due a new production month.")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH, help="Checkpoint manifest (SQLite).")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     # Ensure output directory exists     
     os.makedirs("data/raw", exist_ok=True)    
+    parse_page, parse_operator_list = parse_production_page, parse_operators
+    if args.parser == "lxml":
+        from fast_parse import parse_operators_lxml as parse_operator_list
+        from fast_parse import parse_production_page_lxml as parse_page
     # Get available operators
-    operators = get_operators()
+    operators = get_operators(parse_operator_list)
     print("Available Operators:")
     for name in operators.keys():
         print(f"- {name}")
@@ -119,29 +213,65 @@ def main():
     if not operator_value:
         raise Exception(f"Operator {operator_name} not found.")
     print(f"Fetching data for operator: {operator_name}")
-    # Get all file numbers
-    file_numbers = get_file_numbers(operator_value)    
-    # Initialize a list to store all data
-    all_well_header_data = []
-    all_production_data = []
-    
-    for file_number in file_numbers:
-        print(f"Fetching production data for File No: {file_number}")
-        well_data,production_data = get_production_data(file_number)
-        if well_data:
-            all_well_header_data.append(well_data)
-        all_production_data.extend(production_data)
-
-    # Convert to DataFrame    
-    welldata_df = pd.DataFrame(all_well_header_data)
-    production_columns = ["File Number", "Pool", "Date", "Days", "BBLS Oil", "Runs", "BBLS Water", "MCF Prod", "MCF Sold", "Vent/Flare"]
-    production_df = pd.DataFrame(all_production_data, columns=production_columns)
-    
-    # Save to CSV
-    output_file = "data/raw/ndic_production_data.csv"
-    production_df.to_csv("data/raw/ndic_production_data.csv", index=False)
-    welldata_df.to_csv("data/raw/ndic_wellheader_data.csv", index=False)
-    print(f"Data saved to {output_file}")
+    # Get all file numbers, with their current status when refreshing incrementally
+    well_statuses = None
+    if args.incremental:
+        well_statuses = get_well_statuses(operator_value)
+        file_numbers = list(well_statuses)
+    else:
+        file_numbers = get_file_numbers(operator_value)    
+
+    # Pick up where earlier runs left off, a full scrape starts from scratch
+    mode = "resume" if args.resume else "incremental" if args.incremental else "full"
+    manifest = ScrapeManifest(args.manifest)
+    if mode == "full":
+        manifest.reset()
+    previous = manifest.wells()
+    file_numbers = select_wells(file_numbers, manifest, mode, well_statuses)
+    print(f"{len(file_numbers)} wells to fetch ({mode} scrape).")
+
+    # Stream each well to disk as soon as it is scraped
+    writer = ScrapeOutputWriter(PRODUCTION_OUTPUT, HEADER_OUTPUT, PRODUCTION_COLUMNS, append=mode != "full")
+
+    def save_well(file_number, well_data, production_data):
+        # On a refresh only months newer than the last saved one are appended
+        last_saved = (previous.get(str(file_number)) or {}).get("last_production_month") if mode == "incremental" else None
+        if last_saved:
+            production_data = [row for row in production_data
+                               if len(row) > 2 and (production_month(row[2]) or "") > last_saved]
+        writer.write(well_data, production_data)
+        manifest.record_success(file_number, (well_data or {}).get("Well Status"),
+                                last_production_month(production_data), len(production_data))
+
+    def save_failure(file_number, error):
+        manifest.record_failure(file_number, error)
+
+    try:
+        if args.workers > 1:
+            # Pooled sessions, rate limiting and retries, see concurrent_scraper.py
+            from concurrent_scraper import scrape_wells_concurrently
+            _, _, failures = scrape_wells_concurrently(
+                file_numbers, workers=args.workers, rate=args.rate, retries=args.retries, url=args.production_url,
+                parse_page=parse_page, on_result=save_well, on_failure=save_failure
+            )
+            if failures:
+                print(f"Failed File Nos (rerun with --resume to retry): {', '.join(map(str, failures))}")
+        else:
+            for file_number in file_numbers:
+                print(f"Fetching production data for File No: {file_number}")
+                try:
+                    well_data,production_data = get_production_data(file_number, url=args.production_url, parse_page=parse_page)
+                except Exception as e:
+                    print(f"Error scraping File No: {file_number}, error: {e}")
+                    save_failure(file_number, e)
+                    continue
+                save_well(file_number, well_data, production_data)
+    finally:
+        writer.finalize()
+        manifest.close()
+
+    print(f"Data saved to {PRODUCTION_OUTPUT} and {HEADER_OUTPUT}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with profile("scrape_production_data"):
+        main()
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Synthetic NDIC well header, production and completion data at basin scale.
+
+Writes `ndic_wellheader_data.csv` and `ndic_production_data.csv` in the layout the
+scrapers produce, plus `completion_pages.jsonl` with one completion page of text per
+well (the page the OCR step locates). Each well follows a hyperbolic Arps decline
+from a random first-production month with multiplicative noise, partial-month
+outages, shut-ins with a flush when the well comes back, and rising water cut and
+GOR. Wells are generated and written in chunks, so 100k wells fit in memory.
+
+Usage:
+    python src/get_data/synthetic_ndic.py --wells 1000 --out-dir data/synthetic
+"""
+import argparse
+import json
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+from ndic_stub_server import completion_page_lines
+from scrape_production_data import PRODUCTION_COLUMNS
+
+DEFAULT_OUTPUT_DIR = "data/synthetic"
+DEFAULT_WELLS = 1000
+DEFAULT_CHUNK_WELLS = 5000
+FIRST_FILE_NUMBER = 15000
+FIRST_MONTH = pd.Period("2008-01", freq="M")
+LAST_MONTH = pd.Period("2024-12", freq="M")
+FIELDS = ["SANISH", "PARSHALL", "ALGER", "BLUE BUTTES", "MURPHY CREEK", "SIVERSTON", "BAKER", "BANKS",
+          "ALKALI CREEK", "ANTELOPE", "CHARLSON", "CLEAR CREEK", "ELM TREE", "GROS VENTRE", "HEART BUTTE"]
+WELL_STATUSES = ["A", "IA", "PA"]
+HEADER_COLUMNS = ["NDIC File No", "API No", "Well Type", "Well Status", "Status Date", "Wellbore type", "Location",
+                  "Footages", "Latitude", "Longitude", "Current Operator", "Current Well Name", "Total Depth",
+                  "Field", "Pool", "Perfs", "Status", "Date", "FileNumber", "Cum Oil", "Cum MCF Gas", "Cum Water",
+                  "IP Oil", "IP MCF", "IP Water"]
+
+
+def well_parameters(n_wells, rng, first_file_number=FIRST_FILE_NUMBER):
+    """
+    Random decline parameters and production history span of each well.
+
+    Returns:
+        pd.DataFrame: file_number, qi (bbl/d), Di (per month), b, first_month and
+        n_months (offsets from FIRST_MONTH), status, field, operator, shut-in start
+        and length (months), noise level and pool.
+    """
+    total_months = LAST_MONTH.ordinal - FIRST_MONTH.ordinal + 1
+    first_month = rng.integers(0, total_months - 6, n_wells)
+    n_months = total_months - first_month
+    # Inactive and plugged wells stopped producing before the last month
+    status = rng.choice(WELL_STATUSES, n_wells, p=[0.8, 0.12, 0.08])
+    stopped = status != "A"
+    n_months = np.where(stopped, np.maximum(3, (n_months * rng.uniform(0.3, 0.95, n_wells)).astype(int)), n_months)
+
+    n_fields = max(1, min(len(FIELDS) * 20, n_wells // 50))
+    fields = np.array(FIELDS + [f"{name} {i}" for i in range(2, n_fields // len(FIELDS) + 2) for name in FIELDS])
+    n_operators = max(1, min(200, n_wells // 100))
+
+    has_shut_in = rng.random(n_wells) < 0.3
+    return pd.DataFrame({
+        "file_number": first_file_number + np.arange(n_wells),
+        "qi": rng.lognormal(np.log(600), 0.5, n_wells),
+        "Di": rng.uniform(0.05, 0.35, n_wells),
+        "b": rng.uniform(0.3, 1.4, n_wells),
+        "first_month": first_month,
+        "n_months": n_months,
+        "status": status,
+        "field": fields[rng.integers(0, n_fields, n_wells)],
+        "operator": [f"SYNTHETIC OPERATOR {i}" for i in rng.integers(0, n_operators, n_wells)],
+        "shut_in_start": np.where(has_shut_in, (n_months * rng.uniform(0.2, 0.9, n_wells)).astype(int), -1),
+        "shut_in_months": rng.integers(1, 7, n_wells),
+        "noise": rng.uniform(0.05, 0.25, n_wells),
+        "pool": rng.choice(["BAKKEN", "THREE FORKS"], n_wells, p=[0.85, 0.15]),
+    })
+
+
+def production_rows(wells, rng):
+    """
+    Monthly production rows of the given wells, most recent month first per well as on NDIC.
+
+    Parameters:
+        wells (pd.DataFrame): Output of `well_parameters`.
+        rng (np.random.Generator): Random generator.
+
+    Returns:
+        pd.DataFrame: Rows with PRODUCTION_COLUMNS.
+    """
+    n_months = wells["n_months"].to_numpy()
+    row_well = np.repeat(np.arange(len(wells)), n_months)
+    starts = np.concatenate([[0], np.cumsum(n_months)[:-1]])
+    k = np.arange(len(row_well)) - starts[row_well]
+    qi, Di, b = (wells[col].to_numpy()[row_well] for col in ("qi", "Di", "b"))
+
+    rate = qi / (1 + b * Di * k) ** (1 / b) * rng.lognormal(0, wells["noise"].to_numpy()[row_well])
+    months = wells["first_month"].to_numpy()[row_well] + k
+    period = pd.PeriodIndex.from_ordinals(FIRST_MONTH.ordinal + months, freq="M")
+    days = period.days_in_month.to_numpy().astype(float)
+
+    # First month is a partial month, and about 5% of months lose days to outages
+    days = np.where(k == 0, rng.integers(1, 29, len(k)), days)
+    outage = rng.random(len(k)) < 0.05
+    days = np.where(outage, np.floor(days * rng.uniform(0.1, 0.9, len(k))), days)
+    # Shut-ins produce nothing, and the well flushes when it comes back on
+    shut_start = wells["shut_in_start"].to_numpy()[row_well]
+    shut_end = shut_start + wells["shut_in_months"].to_numpy()[row_well]
+    shut_in = (shut_start >= 0) & (k >= shut_start) & (k < shut_end)
+    days = np.where(shut_in, 0, days)
+    rate = np.where((shut_start >= 0) & (k == shut_end), rate * 1.3, rate)
+
+    oil = np.round(rate * days)
+    # Water cut and gas-oil ratio rise as the well depletes
+    water_cut = np.clip(0.3 + 0.004 * k + rng.normal(0, 0.03, len(k)), 0.05, 0.95)
+    gor = np.clip(1.0 + 0.01 * k + rng.normal(0, 0.1, len(k)), 0.3, None)
+    water = np.round(oil * water_cut / (1 - water_cut))
+    gas = np.round(oil * gor)
+    sold = np.round(gas * rng.uniform(0.8, 1.0, len(k)))
+
+    production_df = pd.DataFrame({
+        "File Number": wells["file_number"].to_numpy()[row_well],
+        "Pool": wells["pool"].to_numpy()[row_well],
+        "Date": period.strftime("%m-%Y"),
+        "Days": days.astype(int),
+        "BBLS Oil": oil.astype(int),
+        "Runs": np.round(oil * 0.98).astype(int),
+        "BBLS Water": water.astype(int),
+        "MCF Prod": gas.astype(int),
+        "MCF Sold": sold.astype(int),
+        "Vent/Flare": (gas - sold).astype(int),
+    }, columns=PRODUCTION_COLUMNS)
+    # NDIC lists the most recent month first
+    order = np.lexsort((-k, row_well))
+    return production_df.iloc[order].reset_index(drop=True)
+
+
+def _month_start(periods):
+    """Periods as M/1/YYYY dates like the header CSV."""
+    return [f"{period.month}/1/{period.year}" for period in periods]
+
+
+def header_rows(wells, production_df, rng):
+    """
+    Well header rows matching the scraped header CSV, with cumulatives and IPs from the production rows.
+    """
+    totals = production_df.groupby("File Number").agg(
+        cum_oil=("BBLS Oil", "sum"), cum_gas=("MCF Prod", "sum"), cum_water=("BBLS Water", "sum"))
+    # IP is the best month, as a daily rate over the month's producing days
+    daily = production_df.assign(ip=production_df["BBLS Oil"] / production_df["Days"].where(production_df["Days"] > 0))
+    best = daily.loc[daily.groupby("File Number")["ip"].idxmax().dropna()]
+    best = best.set_index("File Number")
+    file_numbers = wells["file_number"].to_numpy()
+    n = len(wells)
+    first = pd.PeriodIndex.from_ordinals(FIRST_MONTH.ordinal + wells["first_month"].to_numpy(), freq="M")
+    last = pd.PeriodIndex.from_ordinals(
+        FIRST_MONTH.ordinal + wells["first_month"].to_numpy() + wells["n_months"].to_numpy() - 1, freq="M")
+
+    header_df = pd.DataFrame({
+        "NDIC File No": file_numbers,
+        "API No": [f"33-053-{number % 100000:05d}-00-00" for number in file_numbers],
+        "Well Type": "OG",
+        "Well Status": wells["status"].to_numpy(),
+        "Status Date": _month_start(last),
+        "Wellbore type": "Horizontal",
+        "Location": [f"SESE {rng.integers(1, 37)}-{rng.integers(140, 164)}-{rng.integers(90, 105)}" for _ in range(n)],
+        "Footages": "250 FSL 400 FEL",
+        "Latitude": np.round(rng.uniform(47.0, 48.9, n), 6),
+        "Longitude": np.round(rng.uniform(-104.0, -102.0, n), 6),
+        "Current Operator": wells["operator"].to_numpy(),
+        "Current Well Name": [f"SYNTHETIC {number} {rng.integers(1, 40)}-{rng.integers(1, 36)}H" for number in file_numbers],
+        "Total Depth": rng.integers(15000, 22000, n),
+        "Field": wells["field"].to_numpy(),
+        "Pool": wells["pool"].to_numpy(),
+        "Perfs": [f"{rng.integers(10000, 11000)}-{rng.integers(19000, 21000)}" for _ in range(n)],
+        "Status": wells["status"].to_numpy(),
+        "Date": _month_start(first),
+        "FileNumber": file_numbers,
+        "Cum Oil": totals["cum_oil"].reindex(file_numbers).to_numpy(),
+        "Cum MCF Gas": totals["cum_gas"].reindex(file_numbers).to_numpy(),
+        "Cum Water": totals["cum_water"].reindex(file_numbers).to_numpy(),
+        "IP Oil": np.round(best["ip"].reindex(file_numbers).to_numpy()),
+        "IP MCF": best["MCF Prod"].reindex(file_numbers).to_numpy(),
+        "IP Water": best["BBLS Water"].reindex(file_numbers).to_numpy(),
+    }, columns=HEADER_COLUMNS)
+    return header_df
+
+
+def completion_page_text(file_number, ocr_noise=0.0, rng=None):
+    """
+    Text of a well's completion page, optionally with OCR-like character errors.
+
+    Parameters:
+        file_number (int): NDIC file number.
+        ocr_noise (float): Probability of each character being dropped, doubled or swapped
+            for a look-alike.
+        rng (random.Random, optional): Random generator for the noise.
+
+    Returns:
+        str: Page text.
+    """
+    text = "\n".join(completion_page_lines(file_number))
+    if not ocr_noise:
+        return text
+    rng = rng or random.Random(file_number)
+    lookalike = {"0": "O", "1": "l", "5": "S", "8": "B", "O": "0", "l": "1", ".": ",", " ": "  "}
+    chars = []
+    for char in text:
+        roll = rng.random()
+        if roll < ocr_noise / 3:
+            continue
+        if roll < 2 * ocr_noise / 3:
+            chars.append(char * 2)
+        elif roll < ocr_noise:
+            chars.append(lookalike.get(char, char))
+        else:
+            chars.append(char)
+    return "".join(chars)
+
+
+def generate(n_wells=DEFAULT_WELLS, out_dir=DEFAULT_OUTPUT_DIR, seed=0, chunk_wells=DEFAULT_CHUNK_WELLS,
+             ocr_noise=0.02):
+    """
+    Writes the synthetic header, production and completion files.
+
+    Parameters:
+        n_wells (int): Number of wells.
+        out_dir (str): Output directory.
+        seed (int): Random seed, the same seed gives the same files.
+        chunk_wells (int): Wells generated and written at a time.
+        ocr_noise (float): Character error rate of the completion pages.
+
+    Returns:
+        dict: Paths of the header, production and completion files and the row counts.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {
+        "header": os.path.join(out_dir, "ndic_wellheader_data.csv"),
+        "production": os.path.join(out_dir, "ndic_production_data.csv"),
+        "completion": os.path.join(out_dir, "completion_pages.jsonl"),
+    }
+    rng = np.random.default_rng(seed)
+    text_rng = random.Random(seed)
+    wells = well_parameters(n_wells, rng)
+    production_count = 0
+    with open(paths["completion"], "w", encoding="utf-8") as completion_file:
+        for start in range(0, n_wells, chunk_wells):
+            chunk = wells.iloc[start:start + chunk_wells]
+            production_df = production_rows(chunk, rng)
+            header_df = header_rows(chunk, production_df, rng)
+            first = start == 0
+            production_df.to_csv(paths["production"], mode="w" if first else "a", header=first, index=False)
+            header_df.to_csv(paths["header"], mode="w" if first else "a", header=first, index=False)
+            for file_number in chunk["file_number"]:
+                text = completion_page_text(int(file_number), ocr_noise, text_rng)
+                completion_file.write(json.dumps({"file_number": int(file_number), "text": text}) + "\n")
+            production_count += len(production_df)
+            print(f"Generated {start + len(chunk)} of {n_wells} wells, {production_count} production rows")
+    return {**paths, "wells": n_wells, "production_rows": production_count}
+
+
+def read_completion_pages(path):
+    """Reads completion_pages.jsonl as (file number, text) pairs."""
+    with open(path, encoding="utf-8") as f:
+        return [(record["file_number"], record["text"]) for record in map(json.loads, f)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic NDIC header, production and completion data.")
+    parser.add_argument("--wells", type=int, default=DEFAULT_WELLS, help="Number of wells (100 to 100k).")
+    parser.add_argument("--out-dir", default=DEFAULT_OUTPUT_DIR, help="Output directory.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--ocr-noise", type=float, default=0.02, help="Character error rate of completion pages.")
+    args = parser.parse_args()
+
+    result = generate(args.wells, args.out_dir, args.seed, ocr_noise=args.ocr_noise)
+    print(f"Wrote {result['wells']} wells and {result['production_rows']} production rows to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
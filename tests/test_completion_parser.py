@@ -0,0 +1,67 @@
+"""
+Completion page parsing on full and OCR-damaged lines.
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "src", "get_data"))
+
+from completion_parser import parse_completions
+
+# Layout of the completion page of W18406 (src/get_data/page_29.png), where Acid % is blank
+PAGE = """Well Specific Stimulations
+Date Stimulated Stimulated Formation Top (Ft) Bottom (Ft) Stimulation Stages Volume Volume Units
+8/21/2010 Bakken 10858 20880 22 65257 Barrels
+Type Treatment Acid % Lbs Proppant Maximum Treatment Pressure (PSI) Maximum Treatment Rate (BBLS/Min)
+Sand Frac 1,627,924 7500 47.7
+Details
+"""
+
+
+def parse_one(text):
+    return parse_completions([(18406, text)]).iloc[0]
+
+
+def test_full_page():
+    row = parse_one(PAGE)
+    assert row["Parse_Status"] == "ok"
+    assert (row["Date"], row["Formation"], row["Volume Units"]) == ("8/21/2010", "Bakken", "Barrels")
+    assert (row["Top (Ft)"], row["Bottom (Ft)"], row["Stages"], row["Volume"]) == (10858, 20880, 22, 65257.0)
+    assert (row["Lbs Proppant"], row["Max Pressure (PSI)"], row["Max Rate (BBLS/Min)"]) == (1627924.0, 7500.0, 47.7)
+
+
+def test_acid_percent_is_skipped():
+    row = parse_one("8/21/2010 Bakken 10858 20880 22 65257 Barrels\nSand Frac 0 1627924 7500 47.7")
+    assert (row["Lbs Proppant"], row["Max Pressure (PSI)"], row["Max Rate (BBLS/Min)"]) == (1627924.0, 7500.0, 47.7)
+
+
+def test_short_header_line():
+    # OCR dropped the volume cell
+    row = parse_one("09/01/2014 Bakken 10328 19671 33 Barrels")
+    assert row["Parse_Status"] == "partial"
+    assert (row["Top (Ft)"], row["Bottom (Ft)"], row["Stages"]) == (10328, 19671, 33)
+    assert row["Volume Units"] == "Barrels"
+
+
+def test_merged_and_doubled_characters():
+    row = parse_one("09/01/2014 BBakken 10755 20133 35 84833Barrels\nSand Fracc 2555120 8371 53.0")
+    assert row["Parse_Status"] == "ok"
+    assert (row["Volume"], row["Volume Units"]) == (84833.0, "Barrels")
+    assert row["Max Rate (BBLS/Min)"] == 53.0
+
+
+def test_treatment_without_values():
+    row = parse_one("8/21/2010 Middle Bakken 10858 20880\nSand Frac")
+    assert row["Parse_Status"] == "ok"
+    assert row["Formation"] == "Middle Bakken"
+    assert pd.isna(row["Stages"]) and pd.isna(row["Lbs Proppant"])
+
+
+def test_no_completion_lines():
+    assert parse_completions([(1, "Page 3"), (2, None)])["Parse_Status"].tolist() == ["no_match", "no_match"]
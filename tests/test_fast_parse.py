@@ -0,0 +1,78 @@
+"""
+Parity of the lxml and BeautifulSoup NDIC page parsers on the saved getwellprod.asp
+pages in data/fixtures/ndic:
+
+    15000.html  production page with well header metadata
+    15001.html  page without a production table
+    15002.html  empty response
+    15003.html  production table whose first row is column headings, without a <td>
+
+Usage:
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "src", "get_data"))
+
+from fast_parse import load_fixture_pages, parse_operators_lxml, parse_production_page_lxml
+from scrape_production_data import parse_operators, parse_production_page
+
+FIXTURE_DIR = os.path.join(ROOT, "data", "fixtures", "ndic")
+PAGES = dict(load_fixture_pages(FIXTURE_DIR))
+
+OPERATOR_PAGE = """
+<html><body><form method="post" action="findwellsvw.asp">
+<select name="ddmOperator">
+  <option value="">Select an operator</option>
+  <option value="CONTINENTAL RESOURCES, INC."> CONTINENTAL RESOURCES, INC. </option>
+  <option value="WHITING OIL AND GAS CORPORATION">WHITING OIL AND GAS CORPORATION</option>
+</select>
+</form></body></html>
+"""
+
+
+@pytest.mark.parametrize("file_number", sorted(PAGES))
+def test_production_page_parity(file_number):
+    page = PAGES[file_number]
+    assert parse_production_page_lxml(page, file_number) == parse_production_page(page, file_number)
+    assert parse_production_page_lxml(page.encode(), file_number) == parse_production_page(page, file_number)
+
+
+def test_production_page_with_header():
+    well_header_data, production_data = parse_production_page_lxml(PAGES["15000"], "15000")
+    assert well_header_data["FileNumber"] == "15000"
+    assert well_header_data["Well Status"] == "A"
+    assert well_header_data["Current Operator"] == "STUB OPERATOR 6"
+    # Column headings row, then one row per month with the most recent first
+    assert production_data[0] == ["15000"]
+    assert len(production_data) == 13
+    assert production_data[1][:3] == ["15000", "BAKKEN", "12-2015"]
+
+
+@pytest.mark.parametrize("file_number", ["15001", "15002"])
+def test_page_without_production_table(file_number):
+    assert parse_production_page_lxml(PAGES[file_number], file_number) == ({}, [])
+    assert parse_production_page_lxml("  \n", file_number) == ({}, [])
+
+
+def test_first_row_without_metadata_cell():
+    # No metadata cell means no header record, the production rows are still read
+    well_header_data, production_data = parse_production_page_lxml(PAGES["15003"], "15003")
+    assert well_header_data == {}
+    assert production_data == [
+        ["15003", "BAKKEN", "2-2016", "29", "8211", "8103", "6570", "12316", "11495", "821"],
+        ["15003", "BAKKEN", "1-2016", "31", "9402", "9511", "7521", "14103", "13163", "940"],
+    ]
+
+
+def test_operator_dropdown_parity():
+    operators = parse_operators_lxml(OPERATOR_PAGE)
+    assert operators == parse_operators(OPERATOR_PAGE)
+    assert operators == {
+        "CONTINENTAL RESOURCES, INC.": "CONTINENTAL RESOURCES, INC.",
+        "WHITING OIL AND GAS CORPORATION": "WHITING OIL AND GAS CORPORATION",
+    }